@@ -0,0 +1,109 @@
+"""
+benchmarks/bench_dates.py
+
+Compares Jalali/Gregorian date parsing strategies:
+  - the previous parse_date(): hand-split string, then jdatetime.date(...)
+    .togregorian() for every Jalali input
+  - the table-driven conversion in modules/date_conversion.py, uncached
+  - parse_date() with its LRU cache (repeated inputs, as in chat traffic)
+  - the batch API, parse_dates(), over the whole input list
+
+Before timing, every Jalali day of 1300..1500 is checked against jdatetime.
+
+Usage:
+    python benchmarks/bench_dates.py [--dates 10000] [--distinct 500]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+import jdatetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules import date_conversion  # noqa: E402
+from modules.date_conversion import (  # noqa: E402
+    JALALI_MAX_YEAR, JALALI_MIN_YEAR, jalali_to_gregorian, parse_date, parse_dates)
+
+
+def jdatetime_parse_date(date_str):
+    """The previous parse_date(), kept here as the baseline."""
+    parts = date_str.strip().split()
+    date_part = parts[0].replace("-", "/")
+    time_part = parts[1] if len(parts) > 1 else "00:00"
+    year, month, day = (int(c) for c in date_part.split("/")[:3])
+    hour, minute = (int(c) for c in time_part.split(":")[:2])
+    if 1300 <= year <= 1500:
+        gregorian_date = jdatetime.date(year, month, day).togregorian()
+        return datetime.datetime(gregorian_date.year, gregorian_date.month, gregorian_date.day, hour, minute)
+    return datetime.datetime(year, month, day, hour, minute)
+
+
+def table_parse_date(date_str):
+    """parse_date() without its LRU cache."""
+    return date_conversion._parse_date.__wrapped__(date_str.strip())
+
+
+def check_table():
+    days = mismatches = 0
+    for year in range(JALALI_MIN_YEAR, JALALI_MAX_YEAR + 1):
+        for month in range(1, 13):
+            for day in range(1, 32):
+                try:
+                    expected = jdatetime.date(year, month, day).togregorian()
+                except ValueError:
+                    expected = None
+                try:
+                    got = jalali_to_gregorian(year, month, day)
+                    days += 1
+                except ValueError:
+                    got = None
+                mismatches += expected != got
+    print(f"table check: {days} Jalali days of {JALALI_MIN_YEAR}..{JALALI_MAX_YEAR}, {mismatches} mismatches vs jdatetime")
+
+
+def make_inputs(count, distinct):
+    rng = random.Random(42)
+    pool = []
+    for _ in range(distinct):
+        if rng.random() < 0.7:
+            date = f"{rng.randint(1400, 1410)}/{rng.randint(1, 12):02d}/{rng.randint(1, 29):02d}"
+        else:
+            date = f"{rng.randint(2024, 2030)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        pool.append(f"{date} {rng.randint(0, 23):02d}:{rng.choice(('00', '15', '30', '45'))}")
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def measure(name, func, inputs):
+    start = time.perf_counter()
+    func(inputs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<26} {elapsed * 1000:8.2f} ms   {elapsed / len(inputs) * 1e6:6.2f} us/date")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dates", type=int, default=10_000)
+    parser.add_argument("--distinct", type=int, default=500)
+    args = parser.parse_args()
+
+    check_table()
+    inputs = make_inputs(args.dates, args.distinct)
+    assert [jdatetime_parse_date(d) for d in inputs] == parse_dates(inputs)
+    date_conversion._parse_date.cache_clear()
+
+    print(f"{args.dates} dates ({args.distinct} distinct, ~70% Jalali)")
+    baseline = measure("jdatetime (previous)", lambda ds: [jdatetime_parse_date(d) for d in ds], inputs)
+    table = measure("table, uncached", lambda ds: [table_parse_date(d) for d in ds], inputs)
+    cached = measure("parse_date (LRU)", lambda ds: [parse_date(d) for d in ds], inputs)
+    measure("parse_dates (batch, LRU)", parse_dates, inputs)
+    print(f"speedup over jdatetime: table {baseline / table:.1f}x, with LRU {baseline / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+benchmarks/bench_metrics.py
+
+Measures what the instrumentation in metrics.py adds to the hot paths:
+  - one Histogram.observe() / Counter.inc()
+  - a primary-key SELECT on a PooledConnection vs. a TimedConnection
+  - calling a trivial handler directly vs. through timed_handler()
+  - rendering /metrics once the histograms hold --series label sets
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations 200000] [--series 200]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import metrics  # noqa: E402
+from database import PooledConnection, TimedConnection  # noqa: E402
+
+
+def per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def report(name, base, instrumented):
+    print(f"{name:<26} {base:7.2f} us -> {instrumented:7.2f} us   (+{instrumented - base:.2f} us)")
+
+
+def open_connection(path, factory):
+    conn = sqlite3.connect(path, factory=factory, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL;")
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--series", type=int, default=200, help="label sets per histogram for the render test")
+    args = parser.parse_args()
+    iterations = args.iterations
+
+    histogram = metrics.Histogram('bench_seconds', "bench", ('name',))
+    counter = metrics.Counter('bench_total', "bench", ('name',))
+    print(f"observe()                  {per_call(lambda: histogram.observe(0.003, 'x'), iterations):7.2f} us")
+    print(f"inc()                      {per_call(lambda: counter.inc('x'), iterations):7.2f} us")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="remindino_bench_"), "bench.db")
+    plain = open_connection(path, PooledConnection)
+    plain.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, language TEXT)")
+    plain.executemany("INSERT INTO users VALUES (?, 'en')", [(i,) for i in range(10_000)])
+    plain.commit()
+    timed = open_connection(path, TimedConnection)
+    query = "SELECT language FROM users WHERE user_id = ?"
+    sql_iterations = iterations // 4
+    report("SELECT by primary key",
+           per_call(lambda: plain.execute(query, (42,)).fetchone(), sql_iterations),
+           per_call(lambda: timed.execute(query, (42,)).fetchone(), sql_iterations))
+
+    def handler(message):
+        return message
+
+    wrapped = metrics.timed_handler(handler)
+    report("handler call", per_call(lambda: handler(1), iterations), per_call(lambda: wrapped(1), iterations))
+
+    for i in range(args.series):
+        metrics.HANDLER_SECONDS.observe(0.01, f"handler_{i}")
+        metrics.SQL_SECONDS.observe(0.0001, "SELECT", f"table_{i}")
+    metrics.render_metrics()  # first scrape also imports the stats sources
+    start = time.perf_counter()
+    body = metrics.render_metrics()
+    elapsed = time.perf_counter() - start
+    print(f"render /metrics            {elapsed * 1000:7.2f} ms   ({len(body.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
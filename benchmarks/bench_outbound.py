@@ -0,0 +1,107 @@
+"""
+benchmarks/bench_outbound.py
+
+Floods the local fake Bot API (benchmarks/fake_bot_api.py) with a nightly-style
+bulk fan-out while a few interactive replies arrive, and compares:
+
+  - direct:   scheduler threads calling TeleBot.send_message with no throttling
+              (the old behaviour), and
+  - outbound: the same traffic through outbound.OutboundDispatcher.
+
+Reports delivered/lost messages, 429s seen, and the latency of interactive
+replies (one per user, sent while the bulk queue is still draining).
+
+Usage:
+    python benchmarks/bench_outbound.py [--bulk 300] [--interactive 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import telebot  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+import outbound  # noqa: E402
+
+TOKEN = "123456:fake"
+
+
+def direct_run(bot, bulk, interactive):
+    lost = 0
+    lock = threading.Lock()
+
+    def send(chat_id, text):
+        nonlocal lost
+        try:
+            bot.send_message(chat_id, text)
+        except Exception:
+            with lock:
+                lost += 1
+
+    latencies = []
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        for chat_id in range(1000, 1000 + bulk):
+            pool.submit(send, chat_id, "Your nightly summary")
+        for i in range(interactive):
+            started = time.perf_counter()
+            send(i + 1, f"reply {i}")
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.1)
+    return lost, latencies
+
+
+def outbound_run(bot, bulk, interactive):
+    dispatcher = outbound.dispatcher
+    dispatcher.start()
+    bulk_sender = outbound.BulkSender(bot)
+    futures = [bulk_sender.send_message(chat_id, "Your nightly summary")
+               for chat_id in range(1000, 1000 + bulk)]
+    latencies = []
+    lost = 0
+    for i in range(interactive):
+        started = time.perf_counter()
+        try:
+            bot.send_message(i + 1, f"reply {i}").result()
+        except Exception:
+            lost += 1
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.1)
+    for future in futures:
+        if future.exception() is not None:
+            lost += 1
+    dispatcher.stop()
+    return lost, latencies
+
+
+def report(name, api, total, lost, latencies, elapsed):
+    print(f"{name:>9}: {api.delivered_count}/{total} delivered, {lost} lost, {api.rejected} x 429, "
+          f"interactive p50 {statistics.median(latencies) * 1000:.0f} ms / max {max(latencies) * 1000:.0f} ms, "
+          f"{elapsed:.1f}s total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bulk", type=int, default=300)
+    parser.add_argument("--interactive", type=int, default=10)
+    args = parser.parse_args()
+    total = args.bulk + args.interactive
+
+    for name, run, bot_class in (("direct", direct_run, telebot.TeleBot),
+                                 ("outbound", outbound_run, outbound.QueuedTeleBot)):
+        api = FakeBotAPI().start().use()
+        bot = bot_class(TOKEN, threaded=False)
+        started = time.perf_counter()
+        lost, latencies = run(bot, args.bulk, args.interactive)
+        report(name, api, total, lost, latencies, time.perf_counter() - started)
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
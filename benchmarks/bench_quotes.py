@@ -0,0 +1,110 @@
+"""
+benchmarks/bench_quotes.py
+
+Compares random quote selection strategies for a user with many quotes:
+  - ORDER BY RANDOM() LIMIT 1 (sorts every quote of the user)
+  - COUNT(*) + LIMIT 1 OFFSET random (walks the index up to the offset)
+  - the quote sampler in modules/quotes.py: a random position below the
+    stored count, then one (user_id, seq) index lookup
+  - the sampler's no-repeat shuffle deck (one small write per draw)
+
+Usage:
+    python benchmarks/bench_quotes.py [--quotes 10000] [--iterations 1000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+DB_DIR = tempfile.mkdtemp(prefix="remindino_bench_")
+os.environ['DB_PATH'] = os.path.join(DB_DIR, "bench.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database  # noqa: E402
+from modules.quotes import get_random_quote, reindex_quotes  # noqa: E402
+
+USER_ID = 1
+
+
+def seed(quotes):
+    now = datetime.now()
+    database.init_db()
+    with database.db_connection() as conn:
+        conn.execute("INSERT INTO users (user_id, timezone) VALUES (?, 'UTC')", (USER_ID,))
+        conn.executemany(
+            "INSERT INTO quotes (user_id, quote_text, created_at) VALUES (?, ?, ?)",
+            [(USER_ID, f"Quote number {i}", now) for i in range(quotes)])
+        reindex_quotes(conn)
+
+
+def order_by_random(user_id):
+    with database.db_connection() as conn:
+        return conn.execute("SELECT quote_text FROM quotes WHERE user_id = ? ORDER BY RANDOM() LIMIT 1",
+                            (user_id,)).fetchone()[0]
+
+
+def count_offset(user_id):
+    with database.db_connection() as conn:
+        return conn.execute("""
+            SELECT quote_text FROM quotes WHERE id = (
+                SELECT id FROM quotes WHERE user_id = :user_id
+                LIMIT 1 OFFSET (SELECT ABS(RANDOM()) % MAX(COUNT(*), 1) FROM quotes WHERE user_id = :user_id))
+        """, {'user_id': user_id}).fetchone()[0]
+
+
+def sampler(user_id):
+    return get_random_quote(user_id)
+
+
+def sampler_deck(user_id):
+    return get_random_quote(user_id, no_repeat=True)
+
+
+def measure(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(USER_ID)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<24} mean {statistics.mean(timings):7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    return p50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quotes", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    seed(args.quotes)
+    for func in (order_by_random, count_offset, sampler, sampler_deck):
+        func(USER_ID)
+
+    print(f"{args.quotes} quotes for one user, {args.iterations} draws each")
+    baseline = report("ORDER BY RANDOM()", measure(order_by_random, args.iterations))
+    report("COUNT + OFFSET", measure(count_offset, args.iterations))
+    draw = report("sampler (random)", measure(sampler, args.iterations))
+    report("sampler (no-repeat deck)", measure(sampler_deck, args.iterations))
+    print(f"speedup (p50) over ORDER BY RANDOM(): {baseline / draw:.0f}x")
+
+    # A full deck cycle deals every quote exactly once.
+    with database.db_connection() as conn:
+        conn.execute("UPDATE quote_decks SET deck_size = NULL WHERE user_id = ?", (USER_ID,))
+    dealt = Counter(sampler_deck(USER_ID) for _ in range(args.quotes))
+    print(f"no-repeat cycle of {args.quotes} draws: {len(dealt)} distinct quotes, max repeats {max(dealt.values())}")
+
+
+if __name__ == "__main__":
+    main()
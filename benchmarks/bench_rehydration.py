@@ -0,0 +1,109 @@
+"""
+benchmarks/bench_rehydration.py
+
+Measures how long startup rehydration of the persistent schedule takes
+(scheduler.rehydrate_jobs) for 10k and 100k users, and compares the batched
+insert with adding the same bucket jobs one scheduler.add_job() call at a time.
+
+Usage:
+    python benchmarks/bench_rehydration.py [--users 10000 100000]
+
+Users get a random timezone, summary setting, check-in count and 0-3 weekly events.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix="remindino_bench_")
+os.environ['DB_PATH'] = os.path.join(DB_DIR, "bench.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database  # noqa: E402
+import scheduler  # noqa: E402
+from modules.weekly_schedule import WEEKDAY_NUMBERS  # noqa: E402
+
+TIMEZONES = ["UTC", "Asia/Tehran", "Europe/Berlin", "Europe/London", "America/New_York",
+             "America/Los_Angeles", "Asia/Tokyo", "Asia/Dubai", "Asia/Kolkata", "Australia/Sydney",
+             "Europe/Istanbul", "Europe/Moscow", "America/Sao_Paulo", "Africa/Cairo", "Asia/Singapore"]
+DAYS = list(WEEKDAY_NUMBERS)
+
+
+def random_time(step=15):
+    minutes = random.randrange(0, 24 * 60, step)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def seed(users):
+    with database.db_connection() as conn:
+        conn.execute("DELETE FROM weekly_schedule")
+        conn.execute("DELETE FROM users")
+        conn.execute("DELETE FROM scheduler_jobs")
+        user_rows = []
+        event_rows = []
+        for user_id in range(1, users + 1):
+            if random.random() < 0.8:
+                summary_schedule, summary_time = 'daily', random_time()
+            else:
+                summary_schedule, summary_time = 'custom', str(random.choice([2, 3, 4, 6, 8, 12]))
+            user_rows.append((user_id, random.choice(['en', 'fa']), random.choice(TIMEZONES),
+                              summary_schedule, summary_time, random.randint(0, 3)))
+            for _ in range(random.randint(0, 3)):
+                event_rows.append((user_id, "Event", random.choice(DAYS), random_time(30)))
+        conn.executemany(
+            "INSERT INTO users (user_id, language, timezone, summary_schedule, summary_time, "
+            "random_checkin_max, onboarded) VALUES (?, ?, ?, ?, ?, ?, 1)", user_rows)
+        conn.executemany(
+            "INSERT INTO weekly_schedule (user_id, title, day_of_week, time_of_day, created_at) "
+            "VALUES (?, ?, ?, ?, datetime('now'))", event_rows)
+    return len(event_rows)
+
+
+def timed(func):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    return time.perf_counter() - started, result
+
+
+def add_one_by_one():
+    specs, _ = scheduler.bucket_job_specs()
+    for spec in specs:
+        scheduler._ensure_spec(spec)
+    return len(specs)
+
+
+def run(users):
+    events = seed(users)
+    cold, inserted = timed(scheduler.rehydrate_jobs)
+    warm, _ = timed(scheduler.rehydrate_jobs)
+    scheduler.job_store.remove_all_jobs()
+    one_by_one, specs = timed(add_one_by_one)
+    scheduler.scheduler.remove_all_jobs('volatile')
+    print(f"{users:>7} users, {events:>6} weekly events, {specs:>5} bucket jobs: "
+          f"cold {cold * 1000:8.1f} ms  warm {warm * 1000:8.1f} ms  "
+          f"one add_job per job {one_by_one * 1000:8.1f} ms  ({inserted} inserted)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    random.seed(42)
+    database.init_db()
+    scheduler.scheduler.start(paused=True)
+    try:
+        for users in args.users:
+            run(users)
+    finally:
+        scheduler.scheduler.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
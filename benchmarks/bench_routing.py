@@ -0,0 +1,111 @@
+"""
+benchmarks/bench_routing.py
+
+Measures the per-update dispatch cost of pyTelegramBotAPI's ordered predicate
+chain (one lambda per handler, as bot.py used to register them) against the
+dict-based router in src/router.py, as the number of handlers grows.
+
+For N handlers of each kind, the benchmark times TeleBot.process_new_updates
+(threaded=False, no-op handlers) for:
+  - a callback query matching the last registered handler (worst case), and
+  - a text message from a user whose flow is held by the last flow store.
+
+Usage:
+    python benchmarks/bench_routing.py [--updates 20000] [--handlers 10,25,50,100,200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import telebot  # noqa: E402
+from telebot import types  # noqa: E402
+from router import Router  # noqa: E402
+from state_store import StateStore  # noqa: E402
+
+TOKEN = "123456:fake"
+USER_ID = 42
+
+
+def callback_update(update_id, data):
+    return types.Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "1", "data": data,
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+            "message": {"message_id": 1, "date": 0, "chat": {"id": USER_ID, "type": "private"}, "text": "menu"},
+        },
+    })
+
+
+def message_update(update_id, text):
+    return types.Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": USER_ID, "type": "private"},
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+        },
+    })
+
+
+def noop(*args):
+    pass
+
+
+def predicate_bot(handlers):
+    """The old layout: startswith / membership lambdas evaluated in order."""
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+    for i in range(handlers):
+        prefix = f"ns{i}_"
+        bot.register_callback_query_handler(noop, func=lambda call, prefix=prefix: call.data.startswith(prefix))
+    stores = [{} for _ in range(handlers)]
+    for store in stores:
+        bot.register_message_handler(noop, func=lambda message, store=store: message.from_user.id in store)
+    stores[-1][USER_ID] = {'state': 'awaiting_title', 'data': {}}
+    return bot
+
+
+def router_bot(handlers):
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+    router = Router()
+    for i in range(handlers):
+        router.callback(f"ns{i}")(noop)
+    stores = [StateStore(f"bench{handlers}_{i}") for i in range(handlers)]
+    for store in stores:
+        router.flow(store)(noop)
+    stores[-1][USER_ID] = {'state': 'awaiting_title', 'data': {}}
+    router.attach(bot)
+    return bot
+
+
+def time_updates(bot, updates):
+    started = time.perf_counter()
+    for update in updates:
+        bot.process_new_updates([update])
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--handlers", default="10,25,50,100,200")
+    args = parser.parse_args()
+
+    print(f"{'handlers':>8} | {'callback: chain':>15} {'router':>8} | {'message: chain':>14} {'router':>8}   (us/update)")
+    for handlers in (int(n) for n in args.handlers.split(",")):
+        callbacks = [callback_update(i, f"ns{handlers - 1}_action_{i}") for i in range(args.updates)]
+        messages = [message_update(i, "hello") for i in range(args.updates)]
+        results = []
+        for build in (predicate_bot, router_bot):
+            bot = build(handlers)
+            results.append((time_updates(bot, callbacks), time_updates(bot, messages)))
+        (chain_cb, chain_msg), (router_cb, router_msg) = results
+        print(f"{handlers:>8} | {chain_cb:>15.1f} {router_cb:>8.1f} | {chain_msg:>14.1f} {router_msg:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
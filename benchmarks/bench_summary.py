@@ -0,0 +1,156 @@
+"""
+benchmarks/bench_summary.py
+
+Compares the legacy generate_summary (five SELECTs on a fresh connection, a second
+connection for an ORDER BY RANDOM() quote, strptime per row) with the single-query
+loader in modules/summaries.py.
+
+Usage:
+    python benchmarks/bench_summary.py [--iterations 200]
+
+Seeds a throwaway database with one user holding 1k tasks, 200 reminders and 500 quotes.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix="remindino_bench_")
+os.environ['DB_PATH'] = os.path.join(DB_DIR, "bench.db")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database  # noqa: E402
+from modules.quotes import reindex_quotes  # noqa: E402
+from modules.summaries import generate_summary  # noqa: E402
+
+USER_ID = 1
+
+
+def seed(tasks=1000, reminders=200, quotes=500, goals=50, countdowns=50, weekly=30):
+    now = datetime.now()
+    database.init_db()
+    with database.db_connection() as conn:
+        conn.execute("INSERT INTO users (user_id, timezone) VALUES (?, 'UTC')", (USER_ID,))
+        conn.executemany(
+            "INSERT INTO tasks (user_id, title, due_date, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(USER_ID, f"Task {i}", now + timedelta(hours=i), random.choice(['pending', 'done']),
+              now - timedelta(minutes=i)) for i in range(tasks)])
+        conn.executemany(
+            "INSERT INTO reminders (user_id, title, next_trigger_time, repeat_type, created_at) "
+            "VALUES (?, ?, ?, 'one_time', ?)",
+            [(USER_ID, f"Reminder {i}", now + timedelta(minutes=15 * i), now) for i in range(reminders)])
+        conn.executemany(
+            "INSERT INTO quotes (user_id, quote_text, created_at) VALUES (?, ?, ?)",
+            [(USER_ID, f"Quote number {i}", now) for i in range(quotes)])
+        conn.executemany(
+            "INSERT INTO goals (user_id, title, frequency, next_check_date, created_at) VALUES (?, ?, 'weekly', ?, ?)",
+            [(USER_ID, f"Goal {i}", now + timedelta(days=7), now) for i in range(goals)])
+        conn.executemany(
+            "INSERT INTO countdowns (user_id, title, event_datetime, notify_schedule, created_at) "
+            "VALUES (?, ?, ?, 'none', ?)",
+            [(USER_ID, f"Countdown {i}", now + timedelta(days=i), now) for i in range(countdowns)])
+        conn.executemany(
+            "INSERT INTO weekly_schedule (user_id, title, day_of_week, time_of_day, created_at) "
+            "VALUES (?, ?, 'Monday', '09:30', ?)",
+            [(USER_ID, f"Event {i}", now) for i in range(weekly)])
+        reindex_quotes(conn)
+
+
+def legacy_connection():
+    conn = sqlite3.connect(database.DATABASE_FILE,
+                           detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def legacy_format(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M")
+    except Exception:
+        return value
+
+
+def legacy_generate_summary(user_id):
+    """The pre-loader implementation, reduced to its queries and per-row parsing."""
+    lines = []
+    now = datetime.now()
+    conn = legacy_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT title, due_date FROM tasks WHERE user_id = ? AND status = 'pending' "
+                   "ORDER BY created_at DESC", (user_id,))
+    for task in cursor.fetchall():
+        lines.append(f"- {task['title']}\n  (Due: {legacy_format(task['due_date'])})")
+    cursor.execute("SELECT title, frequency, next_check_date FROM goals WHERE user_id = ? "
+                   "AND status = 'in_progress' ORDER BY created_at DESC", (user_id,))
+    for goal in cursor.fetchall():
+        lines.append(f"- {goal['title']}\n  ({goal['frequency'].capitalize()} | "
+                     f"Next: {legacy_format(goal['next_check_date'])})")
+    cursor.execute("SELECT title, next_trigger_time FROM reminders WHERE user_id = ? "
+                   "AND next_trigger_time BETWEEN ? AND ? ORDER BY next_trigger_time ASC",
+                   (user_id, now, now + timedelta(days=1)))
+    for rem in cursor.fetchall():
+        lines.append(f"- {rem['title']}\n  (At: {legacy_format(rem['next_trigger_time'])})")
+    cursor.execute("SELECT title, event_datetime FROM countdowns WHERE user_id = ? "
+                   "ORDER BY created_at DESC", (user_id,))
+    for cd in cursor.fetchall():
+        try:
+            delta = datetime.strptime(cd['event_datetime'], "%Y-%m-%d %H:%M:%S") - now
+            time_left = f"{delta.days}d left"
+        except Exception:
+            time_left = cd['event_datetime']
+        lines.append(f"- {cd['title']}\n  {time_left}")
+    cursor.execute("SELECT title, day_of_week, time_of_day FROM weekly_schedule WHERE user_id = ? "
+                   "ORDER BY created_at DESC", (user_id,))
+    for event in cursor.fetchall():
+        lines.append(f"- {event['title']}\n  on {event['day_of_week']} at {event['time_of_day']}")
+    conn.close()
+    conn = legacy_connection()
+    row = conn.execute("SELECT quote_text FROM quotes WHERE user_id = ? ORDER BY RANDOM() LIMIT 1",
+                       (user_id,)).fetchone()
+    conn.close()
+    if row:
+        lines.append(f"_{row['quote_text']}_")
+    return "\n".join(lines)
+
+
+def measure(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(USER_ID)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<22} mean {statistics.mean(timings):7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    return p50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    seed()
+    # Warm up both paths (page cache, pooled connection).
+    legacy_generate_summary(USER_ID)
+    generate_summary(USER_ID)
+
+    legacy = report("legacy (5+1 queries)", measure(legacy_generate_summary, args.iterations))
+    loader = report("loader (1 query)", measure(generate_summary, args.iterations))
+    print(f"speedup (p50): {legacy / loader:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
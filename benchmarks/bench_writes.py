@@ -0,0 +1,110 @@
+"""
+benchmarks/bench_writes.py
+
+Measures small-write throughput (writes/s) from many handler threads, all
+against the same database file:
+  - direct: every write commits on its own (the previous save_*_in_db path)
+  - write-behind: database.queue_write(), fire and forget (the handler path)
+  - write-behind + wait: queue_write(...).result(), i.e. read-your-writes;
+    callers still share commits with each other
+
+Run with --synchronous FULL to see the effect when every commit syncs to disk
+(the bot runs WAL with synchronous=NORMAL, where commits only sync at
+checkpoints).
+
+Usage:
+    python benchmarks/bench_writes.py [--threads 8] [--writes 500] [--synchronous NORMAL|FULL]
+                                      [--flush-ms 0] [--dir PATH]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--threads", type=int, default=8)
+parser.add_argument("--writes", type=int, default=500, help="writes per thread")
+parser.add_argument("--synchronous", default="NORMAL", choices=("OFF", "NORMAL", "FULL"))
+parser.add_argument("--dir", default=None, help="directory for the database (default: system temp dir)")
+parser.add_argument("--flush-ms", default=None, help="DB_WRITE_FLUSH_MS for the write-behind queue")
+args = parser.parse_args()
+
+DB_DIR = tempfile.mkdtemp(prefix="remindino_bench_", dir=args.dir)
+os.environ['DB_PATH'] = os.path.join(DB_DIR, "bench.db")
+if args.flush_ms is not None:
+    os.environ['DB_WRITE_FLUSH_MS'] = args.flush_ms
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database  # noqa: E402
+
+_open = database.ConnectionPool._open
+
+
+def _open_with_synchronous(self):
+    conn = _open(self)
+    conn.execute(f"PRAGMA synchronous = {args.synchronous};")
+    return conn
+
+
+database.ConnectionPool._open = _open_with_synchronous
+
+INSERT_TASK = """
+    INSERT INTO tasks (user_id, title, description, due_date, status, created_at)
+    VALUES (?, ?, ?, ?, 'pending', ?)
+"""
+
+
+def direct_write(user_id, i):
+    with database.db_connection() as conn:
+        conn.execute(INSERT_TASK, (user_id, f"Task {i}", None, None, datetime.now()))
+
+
+def queued_write(user_id, i):
+    database.queue_write(INSERT_TASK, (user_id, f"Task {i}", None, None, datetime.now()))
+
+
+def queued_write_wait(user_id, i):
+    database.queue_write(INSERT_TASK, (user_id, f"Task {i}", None, None, datetime.now())).result()
+
+
+def run(name, write):
+    def worker(user_id):
+        for i in range(args.writes):
+            write(user_id, i)
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in range(1, args.threads + 1)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    database.flush_writes()
+    elapsed = time.perf_counter() - start
+    total = args.threads * args.writes
+    print(f"{name:<22} {total} writes in {elapsed:6.2f} s   {total / elapsed:9.0f} writes/s")
+    return total / elapsed
+
+
+def main():
+    database.init_db()
+    with database.db_connection() as conn:
+        conn.executemany("INSERT INTO users (user_id, timezone) VALUES (?, 'UTC')",
+                         [(user_id,) for user_id in range(1, args.threads + 1)])
+
+    print(f"{args.threads} threads x {args.writes} writes, synchronous={args.synchronous}, "
+          f"flush {database.DB_WRITE_FLUSH_MS} ms, db in {DB_DIR}")
+    before = run("direct (commit each)", direct_write)
+    after = run("write-behind", queued_write)
+    waited = run("write-behind + wait", queued_write_wait)
+    stats = database.write_queue_stats()
+    print(f"writer: {stats['writes']} writes in {stats['batches']} commits "
+          f"({stats['writes'] / max(stats['batches'], 1):.1f} writes/commit)")
+    print(f"speedup: {after / before:.1f}x fire-and-forget, {waited / before:.1f}x waiting for the commit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+benchmarks/fake_bot_api.py
+
+A local stand-in for the Telegram Bot API that enforces Telegram-like flood
+limits, so outbound traffic can be exercised without a real token.
+
+  - sendMessage and editMessageText return a Message, getMe a bot User;
+    getUpdates long-polls (up to its `timeout`) for the updates queued with
+    push_update(), at most `limit` per call; any other method
+    (deleteMessage, answerCallbackQuery, ...) returns `true`;
+  - more than `global_rate` sendMessage calls in one second, or more than
+    `chat_rate` in one second to the same chat, get a 429 with retry_after.
+
+Usage:
+    python benchmarks/fake_bot_api.py [--port 8081]
+
+or from Python:
+    api = FakeBotAPI().start()
+    api.use()          # points telebot's apihelper.API_URL at the fake server
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def _message(chat_id, message_id, text):
+    return {"ok": True, "result": {
+        "message_id": message_id, "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"}, "text": text}}
+
+
+class FakeBotAPI:
+    """Threaded fake Bot API server; counts delivered and rejected messages."""
+
+    def __init__(self, host="127.0.0.1", port=0, global_rate=30, chat_rate=1, chat_burst=3,
+                 retry_after=1, latency=0.0, keep_messages=True):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retry_after = retry_after
+        self.latency = latency
+        # Load tests turn this off so the recorded texts and requests do not grow with the run.
+        self.keep_messages = keep_messages
+        self.lock = threading.Lock()
+        self.delivered = defaultdict(list)   # { chat_id: [text, ...] }
+        self.sent = 0
+        self.rejected = 0
+        self.calls = Counter()               # { method: requests answered }
+        self.requests = []                   # [(method, params), ...] for non-sendMessage calls
+        self.pending_updates = deque()       # served by getUpdates
+        self._updates_ready = threading.Condition(self.lock)
+        self._global_window = deque()
+        self._chat_windows = defaultdict(deque)
+        self._message_id = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def use(self):
+        """Routes telebot's API calls (sync and, if aiohttp is installed, asyncio) to this server."""
+        from telebot import apihelper
+        apihelper.API_URL = self.url + "/bot{0}/{1}"
+        try:
+            from telebot import asyncio_helper
+            asyncio_helper.API_URL = self.url + "/bot{0}/{1}"
+        except ImportError:
+            pass
+        return self
+
+    def push_update(self, update):
+        """Queues an update (a dict) for the next getUpdates call."""
+        with self.lock:
+            self.pending_updates.append(update)
+            self._updates_ready.notify()
+
+    def get_updates(self, params):
+        """Returns up to `limit` queued updates, waiting up to `timeout` seconds for the first one."""
+        limit = min(int(params.get("limit") or 100), 100)
+        deadline = time.monotonic() + float(params.get("timeout") or 0.05)
+        with self.lock:
+            while not self.pending_updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._updates_ready.wait(remaining)
+            updates = [self.pending_updates.popleft() for _ in range(min(limit, len(self.pending_updates)))]
+        return 200, {"ok": True, "result": updates}
+
+    @property
+    def delivered_count(self):
+        with self.lock:
+            return self.sent
+
+    def _over_limit(self, window, limit, now):
+        while window and window[0] <= now - 1.0:
+            window.popleft()
+        return len(window) >= limit
+
+    def send_message(self, params):
+        chat_id = int(params["chat_id"])
+        now = time.monotonic()
+        with self.lock:
+            chat_window = self._chat_windows[chat_id]
+            if (self._over_limit(self._global_window, self.global_rate, now)
+                    or self._over_limit(chat_window, max(self.chat_rate, self.chat_burst), now)):
+                self.rejected += 1
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {self.retry_after}",
+                             "parameters": {"retry_after": self.retry_after}}
+            self._global_window.append(now)
+            chat_window.append(now)
+            self._message_id += 1
+            self.sent += 1
+            if self.keep_messages:
+                self.delivered[chat_id].append(params.get("text"))
+            message_id = self._message_id
+        return 200, _message(chat_id, message_id, params.get("text", ""))
+
+    def edit_message_text(self, params):
+        return 200, _message(int(params.get("chat_id") or 0), int(params.get("message_id") or 0),
+                             params.get("text", ""))
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self._handle()
+
+            def do_GET(self):
+                self._handle()
+
+            def _handle(self):
+                method = self.path.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                if "?" in self.path:
+                    body = self.path.split("?", 1)[1] + ("&" + body if body else "")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(body or "{}")
+                else:
+                    params = {k: v[0] for k, v in parse_qs(body).items()}
+                if api.latency:
+                    time.sleep(api.latency)
+                with api.lock:
+                    api.calls[method] += 1
+                if method == "sendMessage":
+                    status, payload = api.send_message(params)
+                elif method == "editMessageText":
+                    status, payload = api.edit_message_text(params)
+                elif method == "getMe":
+                    status, payload = 200, {"ok": True, "result": {
+                        "id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+                elif method == "getUpdates":
+                    status, payload = api.get_updates(params)
+                else:
+                    if api.keep_messages:
+                        with api.lock:
+                            api.requests.append((method, params))
+                    status, payload = 200, {"ok": True, "result": True}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=int, default=30)
+    parser.add_argument("--chat-rate", type=int, default=1)
+    args = parser.parse_args()
+    api = FakeBotAPI(port=args.port, global_rate=args.global_rate, chat_rate=args.chat_rate)
+    print(f"Fake Bot API listening on {api.url}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+benchmarks/load_test.py
+
+End-to-end load test of the bot against the local fake Bot API
+(benchmarks/fake_bot_api.py): no real token, no real Telegram.
+
+The script imports bot.py against a throwaway database, points telebot at the
+fake server through apihelper.API_URL and runs the bot the way `python
+src/bot.py` does in polling mode: getUpdates loop, per-user update lanes,
+outbound dispatcher and the scheduler. Then it simulates --users users, at
+most --concurrency of them at a time. Each user sends one update, waits until
+the bot has processed it, and sends the next one:
+
+  - onboarding: /start, language, continue, timezone, daily summary time and
+    random check-ins;
+  - adds a task, a reminder (in 1 hour) and a countdown with daily alerts;
+  - taps View Summary, Manage Items -> Manage Tasks, Back to Main Menu.
+
+Once every user is done, the scheduled summary jobs (daily summaries, the
+due/upcoming summary and the nightly weekly summary) are run once and the
+bulk fan-out is timed until the outbound queue has drained.
+
+Reported:
+  - update latency p50/p99/max: from the moment the update is queued on the
+    fake server until the bot has finished handling it (getUpdates wait, lane
+    queueing and the handler; its replies are queued on the outbound
+    dispatcher, which delivers them in order per chat);
+  - updates/s, Bot API calls and messages/s for the interactive phase, and
+    summaries and messages/s for the scheduled phase;
+  - peak RSS of the process (bot and fake server share it).
+
+Outbound rate limits are lifted by default so the run measures the bot, not
+Telegram's flood limits; --telegram-limits keeps the production limits on
+both sides. --json writes the results for CI, and --max-p99-ms makes the
+run exit non-zero when p99 update latency regresses past the budget.
+
+Usage:
+    python benchmarks/load_test.py [--users 1000] [--concurrency 200]
+    python benchmarks/load_test.py --users 5000 --json load.json --max-p99-ms 500
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TOKEN = "123456:fake"
+FIRST_USER_ID = 100000
+# Bucket jobs that fan out summaries; run once after the interactive phase.
+SUMMARY_JOB_FAMILIES = ('summary_daily', 'summary_custom', 'due_upcoming_summary', 'nightly_weekly')
+SUMMARY_TIMES = ("08:00", "08:30", "09:00", "21:00")
+
+
+def user_script(index, timezones):
+    """Returns the steps of one simulated user: ("text", str) or ("callback", data)."""
+    return [
+        ("text", "/start"),
+        ("callback", "set_lang_en"),
+        ("callback", "onboard_continue"),
+        ("callback", f"set_tz_{timezones[index % len(timezones)]}"),
+        ("callback", "set_summary_daily"),
+        ("text", SUMMARY_TIMES[index % len(SUMMARY_TIMES)]),
+        ("text", "2"),
+        ("callback", "menu_add_task"),
+        ("text", f"Task {index}"),
+        ("callback", "task_set_due_skip"),
+        ("callback", "menu_add_reminder"),
+        ("text", f"Reminder {index}"),
+        ("callback", "rem_time_1hr"),
+        ("callback", "rem_repeat_one_time"),
+        ("callback", "menu_add_countdown"),
+        ("text", f"Countdown {index}"),
+        ("text", "2030-01-01 10:00"),
+        ("callback", "countdown_notify_daily"),
+        ("callback", "menu_view_summary"),
+        ("callback", "menu_manage_items"),
+        ("callback", "manage_tasks"),
+        ("callback", "back_main"),
+    ]
+
+
+def make_update(update_id, user_id, step):
+    """Builds the Bot API update JSON for one script step."""
+    kind, value = step
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "en"}
+    chat = {"id": user_id, "type": "private"}
+    if kind == "callback":
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "chat_instance": str(user_id), "from": user, "data": value,
+            "message": {"message_id": update_id, "date": int(time.time()), "chat": chat, "text": "menu"}}}
+    message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user, "text": value}
+    if value.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(value.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+class LoadDriver:
+    """
+    Feeds the simulated users' updates to the fake Bot API, one outstanding
+    update per user, and records each update's latency when the bot is done
+    with it (completed() is called from the update lanes).
+    """
+
+    def __init__(self, api, scripts, concurrency):
+        self.api = api
+        self.scripts = scripts                  # { user_id: [step, ...] }
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.latencies = []
+        self.kinds = Counter()
+        self._waiting = list(reversed(scripts))  # users not started yet
+        self._progress = {}                     # { user_id: index of the step in flight }
+        self._in_flight = {}                    # { update_id: (user_id, queued_at) }
+        self._update_id = 0
+        self._finished = 0
+
+    def start(self):
+        with self.lock:
+            for _ in range(min(self.concurrency, len(self._waiting))):
+                self._start_user(self._waiting.pop())
+        if not self.scripts:
+            self.done.set()
+
+    def _start_user(self, user_id):
+        self._progress[user_id] = 0
+        self._push(user_id)
+
+    def _push(self, user_id):
+        self._update_id += 1
+        step = self.scripts[user_id][self._progress[user_id]]
+        self.kinds[step[0]] += 1
+        self._in_flight[self._update_id] = (user_id, time.perf_counter())
+        self.api.push_update(make_update(self._update_id, user_id, step))
+
+    def completed(self, update_id):
+        finished_at = time.perf_counter()
+        with self.lock:
+            entry = self._in_flight.pop(update_id, None)
+            if entry is None:
+                return
+            user_id, queued_at = entry
+            self.latencies.append(finished_at - queued_at)
+            self._progress[user_id] += 1
+            if self._progress[user_id] < len(self.scripts[user_id]):
+                self._push(user_id)
+                return
+            del self._progress[user_id]
+            self._finished += 1
+            if self._waiting:
+                self._start_user(self._waiting.pop())
+            elif self._finished == len(self.scripts):
+                self.done.set()
+
+    def progress(self):
+        with self.lock:
+            return self._finished, len(self.latencies)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[max(0, int(len(sorted_values) * fraction) - 1)]
+
+
+def start_bot(telegram_limits):
+    """
+    Imports bot.py against a temp DB and the fake Bot API and starts it like
+    `python src/bot.py` in polling mode, up to the update lanes and the
+    scheduler, which main() starts. Returns (bot module, api).
+    """
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="remindino_load_"), "load.db")
+    os.environ["TELEGRAM_BOT_TOKEN"] = TOKEN
+    os.environ["BOT_MODE"] = "polling"
+    if telegram_limits:
+        api_limits = {}
+    else:
+        # Measure the bot, not Telegram's flood limits.
+        os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "100000")
+        os.environ.setdefault("OUTBOUND_GLOBAL_BURST", "1000")
+        os.environ.setdefault("OUTBOUND_CHAT_RATE", "100000")
+        os.environ.setdefault("OUTBOUND_CHAT_BURST", "1000")
+        api_limits = {"global_rate": 10 ** 9, "chat_rate": 10 ** 9, "chat_burst": 10 ** 9}
+    from fake_bot_api import FakeBotAPI
+    api = FakeBotAPI(keep_messages=False, **api_limits).start().use()
+    import bot
+    # bot.py logs every update at INFO.
+    logging.getLogger().setLevel(logging.WARNING)
+    from database import init_db
+    from outbound import start_dispatcher
+    from state_store import attach_state_stores
+    from templates import load_templates
+    init_db()
+    load_templates()
+    attach_state_stores()
+    start_dispatcher()
+    return bot, api
+
+
+def run_summaries(api):
+    """Runs the summary bucket jobs once and waits for their messages; returns (jobs, messages, seconds)."""
+    import scheduler
+    from outbound import dispatcher
+    jobs = [job for job in scheduler.scheduler.get_jobs()
+            if scheduler.job_family(job.id) in SUMMARY_JOB_FAMILIES]
+    sent_before = api.calls["sendMessage"]
+    started = time.perf_counter()
+    for job in jobs:
+        job.func(*job.args, **job.kwargs)
+    wait_for_outbound(dispatcher)
+    return len(jobs), api.calls["sendMessage"] - sent_before, time.perf_counter() - started
+
+
+def wait_for_outbound(dispatcher):
+    """Waits until every queued outbound call has been sent or has failed."""
+    while dispatcher.stats()["pending"]:
+        time.sleep(0.02)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="users with an update in flight at once")
+    parser.add_argument("--telegram-limits", action="store_true",
+                        help="keep the outbound and fake-server flood limits at Telegram's values")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="exit with status 1 when p99 update latency exceeds this")
+    args = parser.parse_args()
+
+    bot, api = start_bot(args.telegram_limits)
+    from database import flush_writes
+    from lanes import lane_stats, use_update_lanes
+    from outbound import dispatcher
+    from scheduler import init_scheduler
+
+    timezones = [tz for _, tz in bot.TIMEZONE_CHOICES]
+    scripts = {FIRST_USER_ID + i: user_script(i, timezones) for i in range(args.users)}
+    driver = LoadDriver(api, scripts, args.concurrency)
+
+    # Completion hook under the lanes: each lane calls it with a single update.
+    process_updates = bot.bot.process_new_updates
+
+    def process_and_record(updates):
+        try:
+            process_updates(updates)
+        finally:
+            for update in updates:
+                driver.completed(update.update_id)
+
+    bot.bot.process_new_updates = process_and_record
+    use_update_lanes(bot.bot)
+    init_scheduler(bot.bot)
+    poller = threading.Thread(target=bot.bot.infinity_polling, kwargs={"timeout": 5, "long_polling_timeout": 1},
+                              name="load-test-polling", daemon=True)
+    poller.start()
+
+    rss_before = peak_rss_mb()
+    calls_before = sum(api.calls.values())
+    sent_before = api.calls["sendMessage"]
+    started = time.perf_counter()
+    driver.start()
+    while not driver.done.wait(5):
+        finished, updates = driver.progress()
+        print(f"  {finished}/{args.users} users done, {updates} updates "
+              f"({updates / (time.perf_counter() - started):.0f}/s)")
+    wait_for_outbound(dispatcher)
+    elapsed = time.perf_counter() - started
+    flush_writes()
+    api_calls = Counter(api.calls)
+    calls = sum(api_calls.values()) - calls_before - api_calls["getUpdates"]
+    messages = api_calls["sendMessage"] - sent_before
+
+    latencies = sorted(driver.latencies)
+    lanes = lane_stats()
+    summary_jobs, summary_messages, summary_elapsed = run_summaries(api)
+    bot.bot.stop_polling()
+
+    results = {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "telegram_limits": args.telegram_limits,
+        "updates": len(latencies),
+        "updates_by_kind": dict(driver.kinds),
+        "failed_updates": sum(lanes["failed"]),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "latency_max_ms": round(latencies[-1] * 1000, 2),
+        "api_calls": calls,
+        "messages": messages,
+        "messages_per_s": round(messages / elapsed, 1),
+        "rate_limited": api.rejected,
+        "summary_jobs": summary_jobs,
+        "summary_messages": summary_messages,
+        "summary_messages_per_s": round(summary_messages / summary_elapsed, 1) if summary_elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+    print(f"{args.users} users, {results['updates']} updates ({dict(driver.kinds)}) in {elapsed:.2f}s: "
+          f"{results['updates_per_s']:.0f} updates/s, {results['failed_updates']} failed")
+    print(f"Update latency p50 {results['latency_p50_ms']:.1f} ms, p99 {results['latency_p99_ms']:.1f} ms, "
+          f"max {results['latency_max_ms']:.1f} ms; peak lane depth {max(lanes['peak_depth'])}")
+    print(f"Bot API: {calls} calls ({dict(api_calls)}), {messages} messages, "
+          f"{results['messages_per_s']:.0f} messages/s, {api.rejected} x 429")
+    print(f"Scheduled summaries: {summary_jobs} jobs, {summary_messages} messages in {summary_elapsed:.2f}s "
+          f"({results['summary_messages_per_s']:.0f} messages/s)")
+    print(f"Peak RSS {results['peak_rss_mb']:.1f} MB (+{results['rss_growth_mb']:.1f} MB during the run)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    api.stop()
+    if args.max_p99_ms is not None and results["latency_p99_ms"] > args.max_p99_ms:
+        print(f"p99 update latency {results['latency_p99_ms']:.1f} ms exceeds --max-p99-ms {args.max_p99_ms}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+benchmarks/replay_updates.py
+
+Replays recorded Telegram update JSON against the webhook ingress (webhook.py)
+and reports ingress latency, throughput and how many updates were processed.
+
+Updates come from --file (a JSON array, or one update per line) or are
+generated with --generate N: /help commands and main-menu callbacks from N
+distinct users. --save writes the generated updates to a file for later runs.
+
+By default the script runs everything in-process: it imports bot.py in webhook
+mode against a throwaway database, points telebot at the local fake Bot API
+(benchmarks/fake_bot_api.py) and starts a WebhookServer on a free port. With
+--url it only POSTs to an already running webhook instead.
+
+Usage:
+    python benchmarks/replay_updates.py --generate 2000 [--concurrency 16]
+    python benchmarks/replay_updates.py --file updates.jsonl --url http://127.0.0.1:8443/telegram --secret s3cret
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SECRET = "replay-secret"
+
+
+def generate_updates(count):
+    updates = []
+    for i in range(count):
+        user = {"id": 100000 + i, "is_bot": False, "first_name": f"User{i}"}
+        chat = {"id": user["id"], "type": "private"}
+        if i % 2 == 0:
+            updates.append({"update_id": i + 1, "message": {
+                "message_id": i + 1, "date": int(time.time()), "chat": chat, "from": user, "text": "/help",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 5}]}})
+        else:
+            updates.append({"update_id": i + 1, "callback_query": {
+                "id": str(i + 1), "chat_instance": "1", "from": user, "data": "menu_settings",
+                "message": {"message_id": i + 1, "date": int(time.time()), "chat": chat, "text": "Main Menu:"}}})
+    return updates
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def post(url, secret, update):
+    request = urllib.request.Request(url, data=json.dumps(update).encode(), method="POST", headers={
+        "Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = "error"
+    return status, time.perf_counter() - started
+
+
+def replay(url, secret, updates, concurrency):
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def send(update):
+        status, latency = post(url, secret, update)
+        with lock:
+            statuses[status] += 1
+            latencies.append(latency)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, updates))
+    return statuses, latencies, time.perf_counter() - started
+
+
+def start_in_process(workers):
+    """Imports bot.py in webhook mode against a temp DB and the fake Bot API; returns (server, api)."""
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="remindino_replay_"), "replay.db")
+    os.environ["TELEGRAM_BOT_TOKEN"] = "123456:fake"
+    os.environ["BOT_MODE"] = "webhook"
+    # Measure the bot, not Telegram's flood limits.
+    os.environ.setdefault("OUTBOUND_GLOBAL_RATE", "100000")
+    os.environ.setdefault("OUTBOUND_CHAT_RATE", "100000")
+    from fake_bot_api import FakeBotAPI
+    api = FakeBotAPI(global_rate=100000, chat_rate=100000).start().use()
+    import bot
+    from database import init_db
+    from lanes import use_update_lanes
+    from outbound import start_dispatcher
+    from state_store import attach_state_stores
+    from webhook import WebhookServer
+    init_db()
+    attach_state_stores()
+    start_dispatcher()
+    use_update_lanes(bot.bot)
+    server = WebhookServer(bot.bot, host="127.0.0.1", port=0, secret=SECRET, workers=workers).start()
+    return server, api
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="recorded updates (JSON array or one update per line)")
+    parser.add_argument("--generate", type=int, default=1000, help="number of synthetic updates when no --file")
+    parser.add_argument("--save", help="write the generated updates to this file (one per line)")
+    parser.add_argument("--url", help="POST to a running webhook instead of starting one in-process")
+    parser.add_argument("--secret", default=SECRET)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=8, help="webhook workers for the in-process server")
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) if args.file else generate_updates(args.generate)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(update) + "\n" for update in updates)
+
+    server = api = None
+    url = args.url
+    if url is None:
+        server, api = start_in_process(args.workers)
+        url = server.url
+
+    started = time.perf_counter()
+    statuses, latencies, elapsed = replay(url, args.secret, updates, args.concurrency)
+    latencies.sort()
+    print(f"Replayed {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.0f} updates/s), "
+          f"statuses {dict(statuses)}")
+    print(f"Ingress latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+    if server is not None:
+        from lanes import lane_stats
+        while server.updates.unfinished_tasks:
+            time.sleep(0.05)
+        accepted = server.stats()['processed']
+        while sum(lane_stats()['processed']) + sum(lane_stats()['failed']) < accepted:
+            time.sleep(0.05)
+        lanes = lane_stats()
+        print(f"Processed {sum(lanes['processed'])} updates ({sum(lanes['failed'])} failed) "
+              f"{time.perf_counter() - started:.2f}s after the first POST; "
+              f"fake Bot API received {api.delivered_count} messages")
+        print(f"Per-lane processed {lanes['processed']}, peak queue depth {lanes['peak_depth']}")
+        server.stop()
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+async_runtime.py
+
+Optional asyncio runtime for bot.py (BOT_RUNTIME=async). Needs aiohttp:
+    pip install -r requirements-async.txt
+
+The handlers and modules/* are the same synchronous code in both runtimes.
+What moves onto a single asyncio event loop is everything that waits:
+  - update intake: AsyncTeleBot long polling, or an aiohttp webhook server in
+    webhook mode (same WEBHOOK_* settings and secret check as webhook.py);
+  - Bot API traffic: telebot's sync apihelper is pointed at the loop
+    (CUSTOM_REQUEST_SENDER), so every Bot API call goes over the runtime's
+    own aiohttp session with a pool of ASYNC_MAX_CONNECTIONS keep-alive
+    connections;
+  - scheduling: APScheduler's AsyncIOScheduler on the same loop.
+
+Blocking work never runs on the loop: handlers (and their database work) run
+on the per-user update lanes (lanes.py), scheduler jobs on a dedicated pool
+of ASYNC_DB_WORKERS threads, so the thread count stays fixed however many
+interactions are in flight. Handlers do not wait on the loop either: their
+sends, edits and callback answers are queued on the outbound dispatcher
+(outbound.QueuedTeleBot), whose worker threads are the ones that wait for
+the bridged responses.
+
+The bridge builds the requests itself from what apihelper hands
+CUSTOM_REQUEST_SENDER (method, URL, params, files) and reads back only
+status_code, reason, text and json() of the response. That hook and its
+arguments are telebot's, so requirements.txt pins pyTelegramBotAPI exactly;
+check _send_request() against apihelper._make_request before upgrading it.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from apscheduler.executors.pool import ThreadPoolExecutor as JobExecutor
+from dotenv import load_dotenv
+from telebot import apihelper, types
+
+try:
+    import aiohttp
+    from aiohttp import web
+    from telebot.async_telebot import AsyncTeleBot
+except ImportError:  # optional dependency, only needed for BOT_RUNTIME=async
+    aiohttp = None
+    AsyncTeleBot = object
+
+import webhook
+from scheduler import init_scheduler
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '100'))
+ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', '8'))
+
+
+class _BridgedResponse:
+    """The parts of a requests.Response that telebot.apihelper reads."""
+    __slots__ = ('status_code', 'reason', 'text')
+
+    def __init__(self, status_code, reason, text):
+        self.status_code = status_code
+        self.reason = reason
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _form_data(params, files):
+    """
+    Multipart body for a POST: params as text fields, files as uploads. Files
+    come from apihelper as (file_name, data) tuples, InputFile objects, or
+    bare file objects / bytes named after their path (or their key).
+    """
+    data = aiohttp.FormData(quote_fields=False)
+    for key, value in (params or {}).items():
+        data.add_field(key, str(value))
+    for key, value in (files or {}).items():
+        if isinstance(value, tuple):
+            file_name, value = value
+        elif isinstance(value, types.InputFile):
+            file_name, value = value.file_name, value.file
+        else:
+            name = getattr(value, 'name', None)
+            file_name = os.path.basename(name) if isinstance(name, str) and not name.startswith('<') else key
+        data.add_field(key, value, filename=file_name)
+    return data
+
+
+class _IntakeTeleBot(AsyncTeleBot):
+    """AsyncTeleBot that hands received updates to the sync handlers instead of its own."""
+
+    def __init__(self, token, runtime):
+        super().__init__(token)
+        self._runtime = runtime
+
+    async def process_new_updates(self, updates):
+        await self._runtime.submit(updates)
+
+
+class AsyncRuntime:
+    """Runs update intake, Bot API I/O and the scheduler of a sync QueuedTeleBot on one event loop."""
+
+    def __init__(self, bot, mode='polling'):
+        self.bot = bot
+        self.mode = mode
+        self.loop = None
+        self.session = None
+        self._loop_thread = None
+        # One thread feeds the lanes: keeps arrival order and takes the lanes'
+        # backpressure without ever blocking the loop.
+        self._intake = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-intake')
+
+    # -------------------------------
+    # Bot API bridge (called from worker threads)
+    # -------------------------------
+    def _send_request(self, method, url, params=None, files=None, timeout=None, proxies=None):
+        if threading.get_ident() == self._loop_thread:
+            raise RuntimeError("Blocking Bot API call made on the event loop thread")
+        return asyncio.run_coroutine_threadsafe(self._request(method, url, params, files, timeout), self.loop).result()
+
+    async def _request(self, method, url, params, files, timeout):
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        client_timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        if method.lower() == 'get' and not files:
+            payload = {'params': {key: str(value) for key, value in (params or {}).items()}}
+        else:
+            payload = {'data': _form_data(params, files)}
+        async with self.session.request(method, url, timeout=client_timeout, **payload) as response:
+            return _BridgedResponse(response.status, response.reason, await response.text())
+
+    # -------------------------------
+    # Intake
+    # -------------------------------
+    async def submit(self, updates):
+        """Queues updates on their users' lanes via the intake thread."""
+        await self.loop.run_in_executor(self._intake, self.bot.process_new_updates, updates)
+
+    async def _poll(self, intake):
+        await intake.remove_webhook()
+        print("Bot is running (asyncio)...")
+        await intake.infinity_polling(timeout=20)
+
+    async def _handle_webhook(self, request):
+        secret = webhook.WEBHOOK_SECRET
+        if secret and not hmac.compare_digest(request.headers.get(webhook.SECRET_HEADER, ''), secret):
+            return web.Response(status=403)
+        try:
+            update = types.Update.de_json(webhook.parse_update(await request.text()))
+        except (ValueError, KeyError):
+            return web.Response(status=400)
+        await self.submit([update])
+        return web.Response()
+
+    async def _serve_webhook(self, intake):
+        webhook.warn_if_unauthenticated()
+        app = web.Application(client_max_size=webhook.MAX_BODY_BYTES)
+        app.router.add_post(webhook.WEBHOOK_PATH, self._handle_webhook)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, webhook.WEBHOOK_HOST, webhook.WEBHOOK_PORT, backlog=256)
+        await site.start()
+        if webhook.WEBHOOK_URL:
+            await intake.remove_webhook()
+            await intake.set_webhook(url=webhook.WEBHOOK_URL.rstrip('/') + webhook.WEBHOOK_PATH,
+                                     secret_token=webhook.WEBHOOK_SECRET or None,
+                                     max_connections=webhook.WEBHOOK_MAX_CONNECTIONS)
+        print(f"Webhook listening on http://{webhook.WEBHOOK_HOST}:{webhook.WEBHOOK_PORT}{webhook.WEBHOOK_PATH} (asyncio)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=ASYNC_MAX_CONNECTIONS))
+        apihelper.CUSTOM_REQUEST_SENDER = self._send_request
+        intake = _IntakeTeleBot(self.bot.token, self)
+        try:
+            init_scheduler(self.bot, event_loop=self.loop, executor=JobExecutor(ASYNC_DB_WORKERS))
+            if self.mode == 'webhook':
+                await self._serve_webhook(intake)
+            else:
+                await self._poll(intake)
+        finally:
+            apihelper.CUSTOM_REQUEST_SENDER = None
+            await intake.close_session()
+            await self.session.close()
+
+
+def run_async(bot, mode='polling'):
+    """Runs the bot on the asyncio runtime until interrupted."""
+    if aiohttp is None:
+        raise RuntimeError("BOT_RUNTIME=async requires aiohttp: pip install -r requirements-async.txt")
+    try:
+        asyncio.run(AsyncRuntime(bot, mode).run())
+    except KeyboardInterrupt:
+        pass
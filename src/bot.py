@@ -12,10 +12,12 @@ This is the main entry point for the bot. It integrates:
   - Random Check-Ins Module
   - Summaries & Reports Module
   - Quotes Module
+  - Bulk Import / Export (/import and /export of CSV or JSON files)
   - Help Command (brief instructions with emojis)
   - Info Command (deep, detailed explanation of every action, button, and input)
   - Manage Items (view and delete tasks, reminders, goals, countdowns)
   - Settings (change language and timezone)
+  - Metrics (Prometheus /metrics endpoint, see metrics.py)
 
 Ensure that the following modules/files are available:
   - database.py
@@ -28,6 +30,7 @@ Ensure that the following modules/files are available:
   - modules/random_checkins.py
   - modules/summaries.py
   - modules/quotes.py
+  - modules/import_export.py
   - modules/date_conversion.py
 
 Replace "YOUR_TELEGRAM_BOT_TOKEN" with your actual bot token.
@@ -46,29 +49,32 @@ from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
-import telebot
 from telebot import types
 from datetime import datetime, timedelta
 import logging
 from messages import MESSAGES
+from templates import keyboard, keyboard_markup, label, load_templates, render
 
 # Setup basic logging for debugging flow cleanup.
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from database import get_db_connection, init_db
-from modules.weekly_schedule import start_add_weekly_event, weekly_states
+from database import init_db
+from user_cache import get_user_language, update_user, create_user
+from state_store import StateStore, attach_state_stores
+from modules.weekly_schedule import start_add_weekly_event, weekly_states, reschedule_weekly_events
+from outbound import QueuedTeleBot, start_dispatcher
+from router import Router
+from webhook import start_webhook
+from lanes import use_update_lanes
+from async_runtime import run_async
+from metrics import instrument_handlers, start_metrics_server
 from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_messages, set_bot
 
 # Import scheduler functions from scheduler.py
 from scheduler import (
     init_scheduler,
-    schedule_reminder,
-    schedule_summary,
-    schedule_random_checkins,
-    schedule_weekly_event_reminders,
-    schedule_nightly_tomorrow_summary,
-    schedule_due_and_upcoming_summary
+    schedule_user_jobs
 )
 
 # -------------------------------
@@ -79,64 +85,40 @@ STATE_TIMEZONE = "timezone"      # Handled via inline buttons
 STATE_SUMMARY_SCHEDULE = "summary_schedule"
 STATE_SUMMARY_TIME = "summary_time"   # For daily time (HH:MM) or custom interval (in hours)
 STATE_RANDOM_CHECKIN = "random_checkin"
-STATE_COMPLETED = "completed"
-user_states = {}  # Global dictionary to store onboarding conversation state per user.
+# Onboarding/settings conversation state per user; finished flows are removed (see state_store.py).
+user_states = StateStore('onboarding')
 
 # -------------------------------
 # Bot Initialization
 # -------------------------------
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")  # Replace with your actual token.
-bot = telebot.TeleBot(BOT_TOKEN)
+# "polling" (getUpdates loop) or "webhook" (HTTP ingress, see webhook.py).
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# "sync" (threads) or "async" (asyncio intake and Bot API I/O, see async_runtime.py).
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "sync")
+# send_message goes through the rate-limited outbound queue (see outbound.py).
+# Handlers run on per-user update lanes (see lanes.py), so TeleBot's own pool is off.
+bot = QueuedTeleBot(BOT_TOKEN, threaded=False)
 set_bot(bot)
-
-# Start the scheduler in the background.
-init_scheduler()
-
-# -------------------------------
-# Helper Function: Schedule All Jobs for a User
-# -------------------------------
-# ... [imports and other code above unchanged] ...
+# Callback queries and flow messages are dispatched by the router (see router.py).
+router = Router()
 
 # -------------------------------
 # Helper Function: Schedule All Jobs for a User
 # -------------------------------
 def schedule_all_jobs(bot, user_id, chat_id):
     """
-    Reads the user settings from the database and schedules:
+    Marks the user as onboarded and makes sure the shared scheduler buckets
+    serving their settings exist:
       - Summary messages (daily or custom)
       - Random check-ins (if set)
       - Due/upcoming summary (every 30 minutes)
       - Nightly summary at 21:00
       - Weekly event reminders
-    The user's timezone is also retrieved and passed to the scheduler functions.
+    Jobs are per (timezone, time slot), not per user; see scheduler.py.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT summary_schedule, summary_time, random_checkin_max, timezone FROM users WHERE user_id = ?",
-        (user_id,)
-    )
-    user_settings = cursor.fetchone()
-    conn.close()
-    if not user_settings:
-        return
-
-    # Convert the sqlite3.Row to a dict so that we can use .get()
-    user_settings = dict(user_settings)
-    summary_schedule = user_settings.get("summary_schedule")
-    summary_time = user_settings.get("summary_time")
-    random_checkin_max = user_settings.get("random_checkin_max")
-    user_tz = user_settings.get("timezone", "UTC")
-
-    if summary_schedule in ("daily", "custom"):
-        schedule_summary(bot, user_id, chat_id, summary_schedule, summary_time, user_tz)
-    if random_checkin_max and int(random_checkin_max) > 0:
-        schedule_random_checkins(bot, user_id, chat_id, int(random_checkin_max), user_tz)
-    schedule_due_and_upcoming_summary(bot, user_id, chat_id, user_tz)
-    schedule_nightly_tomorrow_summary(bot, user_id, chat_id, user_tz)
-    schedule_weekly_event_reminders(bot, user_id, chat_id, user_tz)
-
-# ... [rest of your bot.py remains unchanged] ...
+    update_user(user_id, onboarded=1)
+    schedule_user_jobs(user_id)
 
 # -------------------------------
 # Pre-defined Time Zone Choices
@@ -154,17 +136,52 @@ TIMEZONE_CHOICES = [
     ("Moscow", "Europe/Moscow")
 ]
 
+# -------------------------------
+# Static Keyboards (built once per language, see templates.py)
+# -------------------------------
+@keyboard('timezone_choices')
+def timezone_keyboard(lang):
+    tz_markup = types.InlineKeyboardMarkup(row_width=2)
+    for tz_label, tz_value in TIMEZONE_CHOICES:
+        tz_btn = types.InlineKeyboardButton(text=tz_label, callback_data=f"set_tz_{tz_value}")
+        tz_markup.add(tz_btn)
+    return tz_markup
+
+@keyboard('language_choice')
+def language_keyboard(lang):
+    markup = types.InlineKeyboardMarkup()
+    btn_english = types.InlineKeyboardButton(text="English", callback_data="set_lang_en")
+    btn_farsi = types.InlineKeyboardButton(text="فارسی", callback_data="set_lang_fa")
+    markup.add(btn_english, btn_farsi)
+    return markup
+
+@keyboard('onboard_continue')
+def onboard_continue_keyboard(lang):
+    markup = types.InlineKeyboardMarkup()
+    btn_continue = types.InlineKeyboardButton(text=MESSAGES[lang]['onboard_continue'], callback_data="onboard_continue")
+    markup.add(btn_continue)
+    return markup
+
+@keyboard('summary_schedule')
+def summary_schedule_keyboard(lang):
+    summary_markup = types.InlineKeyboardMarkup()
+    btn_daily = types.InlineKeyboardButton(text=label(lang, 'summary_daily', "Daily"), callback_data="set_summary_daily")
+    btn_custom = types.InlineKeyboardButton(text=label(lang, 'summary_custom', "Every X hours"), callback_data="set_summary_custom")
+    btn_none = types.InlineKeyboardButton(text=label(lang, 'summary_none', "None"), callback_data="set_summary_none")
+    summary_markup.add(btn_daily, btn_custom, btn_none)
+    return summary_markup
+
 # -------------------------------
 # Weekly Schedule Handlers
 # -------------------------------
-@bot.message_handler(func=lambda message: message.from_user.id in weekly_states)
+@router.flow(weekly_states)
 def message_weekly_handler(message):
     from modules.weekly_schedule import handle_weekly_event_messages
     user_lang = weekly_states.get(message.from_user.id, {}).get('data', {}).get('language', 'en')
     handle_weekly_event_messages(bot, message, user_lang=user_lang)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("week_day_"))
-def weekly_callback_handler(call):
+@router.callback("week", "day")
+def weekly_callback_handler(call, route):
     from modules.weekly_schedule import handle_weekly_event_callbacks
     handle_weekly_event_callbacks(bot, call)
 
@@ -174,24 +191,11 @@ def weekly_callback_handler(call):
 @bot.message_handler(commands=['start'])
 def handle_start(message):
     user_id = message.from_user.id
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    if row is None:
-        cursor.execute("""
-            INSERT INTO users (user_id, language, timezone, summary_schedule, summary_time, random_checkin_max)
-            VALUES (?, 'en', 'UTC', 'disabled', NULL, 0)
-        """, (user_id,))
-        conn.commit()
-    conn.close()
+    create_user(user_id)
     # (Optionally, you could schedule jobs for returning users here.)
     user_states[user_id] = {'state': STATE_LANGUAGE, 'data': {}}
-    markup = types.InlineKeyboardMarkup()
-    btn_english = types.InlineKeyboardButton(text="English", callback_data="set_lang_en")
-    btn_farsi = types.InlineKeyboardButton(text="فارسی", callback_data="set_lang_fa")
-    markup.add(btn_english, btn_farsi)
-    tracked_send_message(message.chat.id, user_id, MESSAGES['en']['welcome'], reply_markup=markup)
+    tracked_send_message(message.chat.id, user_id, render('en', 'welcome'),
+                         reply_markup=keyboard_markup('language_choice'))
 
 # -------------------------------
 # /help and /info Command Handlers
@@ -199,90 +203,76 @@ def handle_start(message):
 @bot.message_handler(commands=['help'])
 def handle_help(message):
     user_id = message.from_user.id
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
+    lang = get_user_language(user_id)
     bot.send_message(message.chat.id, MESSAGES[lang]['help'], parse_mode="Markdown")
 
 @bot.message_handler(commands=['info'])
 def handle_info(message):
     user_id = message.from_user.id
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
+    lang = get_user_language(user_id)
     bot.send_message(message.chat.id, MESSAGES[lang]['info'], parse_mode="Markdown")
 
 # -------------------------------
 # Language Selection Callback Handler
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("set_lang_"))
-def language_callback_handler(call):
+@router.callback("set", "lang")
+def language_callback_handler(call, route):
     user_id = call.from_user.id
     if user_id not in user_states:
         return
-    selected_lang = call.data.split("set_lang_")[1]  # "en" or "fa"
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET language = ? WHERE user_id = ?", (selected_lang, user_id))
-    conn.commit()
-    conn.close()
-    user_states[user_id]['data']['language'] = selected_lang
-    help_msg = MESSAGES[selected_lang]['onboard_info']
-    markup = types.InlineKeyboardMarkup()
-    btn_continue = types.InlineKeyboardButton(text=MESSAGES[selected_lang]['onboard_continue'], callback_data="onboard_continue")
-    markup.add(btn_continue)
-    tracked_send_message(call.message.chat.id, user_id, help_msg, reply_markup=markup)
+    selected_lang = route.args  # "en" or "fa"
+    update_user(user_id, language=selected_lang)
+    help_msg = render(selected_lang, 'onboard_info')
+    tracked_send_message(call.message.chat.id, user_id, help_msg,
+                         reply_markup=keyboard_markup('onboard_continue', selected_lang))
     bot.answer_callback_query(call.id, "Language set.")
 
 # -------------------------------
 # Onboard Continue Callback Handler
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data == "onboard_continue")
-def onboard_continue_handler(call):
+@router.callback("onboard", "continue")
+def onboard_continue_handler(call, route):
     user_id = call.from_user.id
-    lang = user_states[user_id]['data'].get('language', 'en')
+    lang = get_user_language(user_id)
     clear_flow_messages(call.message.chat.id, user_id)
-    user_states[user_id]['state'] = STATE_TIMEZONE
-    tz_markup = types.InlineKeyboardMarkup(row_width=2)
-    for label, tz_value in TIMEZONE_CHOICES:
-        tz_btn = types.InlineKeyboardButton(text=label, callback_data=f"set_tz_{tz_value}")
-        tz_markup.add(tz_btn)
-    tracked_send_message(call.message.chat.id, user_id, MESSAGES[lang]['select_timezone'], reply_markup=tz_markup)
+    user_states[user_id] = {'state': STATE_TIMEZONE, 'data': {}}
+    tracked_send_message(call.message.chat.id, user_id, render(lang, 'select_timezone'),
+                         reply_markup=keyboard_markup('timezone_choices', lang))
     bot.answer_callback_query(call.id, "")
 
 # -------------------------------
 # Time Zone Selection Callback Handler
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("set_tz_"))
-def timezone_callback_handler(call):
+@router.callback("set", "tz")
+def timezone_callback_handler(call, route):
     user_id = call.from_user.id
     if user_id not in user_states:
         return
-    tz_value = call.data.split("set_tz_")[1]
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET timezone = ? WHERE user_id = ?", (tz_value, user_id))
-    conn.commit()
-    conn.close()
+    tz_value = route.args
+    update_user(user_id, timezone=tz_value)
+    # Weekly events, countdown alerts and reminders are scheduled in UTC; move them to the new zone.
+    reschedule_weekly_events(user_id, tz_value)
+    reschedule_countdowns(user_id)
+    reschedule_reminders(user_id)
     user_states[user_id]['data']['timezone'] = tz_value
     user_states[user_id]['state'] = STATE_SUMMARY_SCHEDULE
-    lang = user_states[user_id]['data'].get('language', 'en')
+    lang = get_user_language(user_id)
     bot.answer_callback_query(call.id, MESSAGES[lang]['set_timezone'].format(tz_value))
-    summary_markup = types.InlineKeyboardMarkup()
-    btn_daily = types.InlineKeyboardButton(text=MESSAGES[lang].get('summary_daily', "Daily"), callback_data="set_summary_daily")
-    btn_custom = types.InlineKeyboardButton(text=MESSAGES[lang].get('summary_custom', "Every X hours"), callback_data="set_summary_custom")
-    btn_none = types.InlineKeyboardButton(text=MESSAGES[lang].get('summary_none', "None"), callback_data="set_summary_none")
-    summary_markup.add(btn_daily, btn_custom, btn_none)
-    tracked_send_message(call.message.chat.id, user_id, MESSAGES[lang]['select_summary'], reply_markup=summary_markup)
+    tracked_send_message(call.message.chat.id, user_id, render(lang, 'select_summary'),
+                         reply_markup=keyboard_markup('summary_schedule', lang))
 
 # -------------------------------
 # Summary Schedule Callback Handler
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("set_summary_"))
-def summary_callback_handler(call):
+@router.callback("set", "summary")
+def summary_callback_handler(call, route):
     user_id = call.from_user.id
     if user_id not in user_states:
         return
-    lang = user_states[user_id]['data'].get('language', 'en')
+    lang = get_user_language(user_id)
     if user_states[user_id]['state'] != STATE_SUMMARY_SCHEDULE:
         return
-    selection = call.data.split("set_summary_")[1]
+    selection = route.args
     if selection == "daily":
         user_states[user_id]['data']['summary_schedule'] = 'daily'
         user_states[user_id]['state'] = STATE_SUMMARY_TIME
@@ -295,11 +285,7 @@ def summary_callback_handler(call):
         tracked_send_message(call.message.chat.id, user_id, MESSAGES[lang]['enter_custom_interval'])
     elif selection == "none":
         user_states[user_id]['data']['summary_schedule'] = 'disabled'
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET summary_schedule = ? WHERE user_id = ?", ('disabled', user_id))
-        conn.commit()
-        conn.close()
+        update_user(user_id, summary_schedule='disabled')
         user_states[user_id]['state'] = STATE_RANDOM_CHECKIN
         bot.answer_callback_query(call.id, "No summary will be sent.")
         tracked_send_message(call.message.chat.id, user_id, MESSAGES[lang]['enter_random_checkins'])
@@ -309,23 +295,22 @@ def summary_callback_handler(call):
 # -------------------------------
 # Onboarding Text Message Handler (for summary time and random check-ins)
 # -------------------------------
-@bot.message_handler(func=lambda message: user_states.get(message.from_user.id, {}).get('state') in [STATE_SUMMARY_TIME, STATE_RANDOM_CHECKIN])
+@router.flow(user_states)
 def onboarding_message_handler(message):
     user_id = message.from_user.id
-    tracked_user_message(message)
     current_state = user_states[user_id]['state']
+    if current_state not in (STATE_SUMMARY_TIME, STATE_RANDOM_CHECKIN):
+        return   # the other onboarding steps are answered with buttons
+    tracked_user_message(message)
     text = message.text.strip()
-    lang = user_states[user_id]['data'].get('language', 'en')
+    lang = get_user_language(user_id)
     if current_state == STATE_SUMMARY_TIME:
         summary_schedule = user_states[user_id]['data'].get('summary_schedule')
         if summary_schedule == 'daily':
             try:
-                datetime.strptime(text, "%H:%M")
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("UPDATE users SET summary_schedule = ?, summary_time = ? WHERE user_id = ?", ('daily', text, user_id))
-                conn.commit()
-                conn.close()
+                # Store the time normalized to HH:MM; it keys the shared summary bucket.
+                text = datetime.strptime(text, "%H:%M").strftime("%H:%M")
+                update_user(user_id, summary_schedule='daily', summary_time=text)
                 user_states[user_id]['data']['summary_time'] = text
                 user_states[user_id]['state'] = STATE_RANDOM_CHECKIN
                 tracked_send_message(message.chat.id, user_id, MESSAGES[lang]['enter_random_checkins'])
@@ -333,11 +318,7 @@ def onboarding_message_handler(message):
                 tracked_send_message(message.chat.id, user_id, MESSAGES[lang]['enter_daily_time'])
         elif summary_schedule == 'custom':
             if text.isdigit():
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("UPDATE users SET summary_schedule = ?, summary_time = ? WHERE user_id = ?", ('custom', text, user_id))
-                conn.commit()
-                conn.close()
+                update_user(user_id, summary_schedule='custom', summary_time=text)
                 user_states[user_id]['data']['summary_time'] = text
                 user_states[user_id]['state'] = STATE_RANDOM_CHECKIN
                 tracked_send_message(message.chat.id, user_id, MESSAGES[lang]['enter_random_checkins'])
@@ -346,13 +327,8 @@ def onboarding_message_handler(message):
     elif current_state == STATE_RANDOM_CHECKIN:
         if text.isdigit():
             random_checkin = int(text)
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET random_checkin_max = ? WHERE user_id = ?", (random_checkin, user_id))
-            conn.commit()
-            conn.close()
-            user_states[user_id]['data']['random_checkin'] = random_checkin
-            user_states[user_id]['state'] = STATE_COMPLETED
+            update_user(user_id, random_checkin_max=random_checkin)
+            user_states.pop(user_id, None)
             clear_flow_messages(message.chat.id, user_id)
             bot.send_message(message.chat.id, MESSAGES[lang]['onboarding_complete'])
             # --- NEW: Schedule user-specific jobs based on onboarding settings ---
@@ -367,50 +343,55 @@ def onboarding_message_handler(message):
 # -------------------------------
 from modules.tasks import start_add_task, handle_task_callbacks, handle_task_messages, tasks_states
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("task_"))
-def callback_task_handler(call):
+@router.callback("task")
+def callback_task_handler(call, route):
     handle_task_callbacks(bot, call)
 
-@bot.message_handler(func=lambda message: message.from_user.id in tasks_states)
+@router.flow(tasks_states)
 def message_task_handler(message):
     handle_task_messages(bot, message)
 
 # -------------------------------
 # Integration: Goals Module
 # -------------------------------
-from modules.goals import start_add_goal, handle_goal_callbacks, handle_goal_messages, goals_states
+from modules.goals import start_add_goal, handle_goal_callbacks, handle_goal_messages, goals_states, handle_goal_checkin_callback
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("goal_freq_"))
-def callback_goal_handler(call):
+@router.callback("goal", "freq")
+def callback_goal_handler(call, route):
     handle_goal_callbacks(bot, call)
 
-@bot.message_handler(func=lambda message: message.from_user.id in goals_states)
+@router.callback("goal", "done")
+@router.callback("goal", "working")
+def callback_goal_checkin_handler(call, route):
+    handle_goal_checkin_callback(bot, call, route.action, int(route.args))
+
+@router.flow(goals_states)
 def message_goal_handler(message):
     handle_goal_messages(bot, message)
 
 # -------------------------------
 # Integration: Reminders Module
 # -------------------------------
-from modules.reminders import start_add_reminder, handle_reminder_callbacks, handle_reminder_messages, reminders_states
+from modules.reminders import start_add_reminder, handle_reminder_callbacks, handle_reminder_messages, reminders_states, reschedule_reminders
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("rem_"))
-def callback_reminder_handler(call):
+@router.callback("rem")
+def callback_reminder_handler(call, route):
     handle_reminder_callbacks(bot, call)
 
-@bot.message_handler(func=lambda message: message.from_user.id in reminders_states)
+@router.flow(reminders_states)
 def message_reminder_handler(message):
     handle_reminder_messages(bot, message)
 
 # -------------------------------
 # Integration: Countdowns Module
 # -------------------------------
-from modules.countdowns import start_add_countdown, handle_countdown_messages, handle_countdown_callbacks, countdowns_states
+from modules.countdowns import start_add_countdown, handle_countdown_messages, handle_countdown_callbacks, countdowns_states, reschedule_countdowns
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("countdown_notify_"))
-def callback_countdown_handler(call):
+@router.callback("countdown", "notify")
+def callback_countdown_handler(call, route):
     handle_countdown_callbacks(bot, call)
 
-@bot.message_handler(func=lambda message: message.from_user.id in countdowns_states)
+@router.flow(countdowns_states)
 def message_countdown_handler(message):
     handle_countdown_messages(bot, message)
 
@@ -419,8 +400,8 @@ def message_countdown_handler(message):
 # -------------------------------
 from modules.random_checkins import send_random_checkin, handle_random_checkin_callback, schedule_daily_checkins
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("random_"))
-def callback_random_handler(call):
+@router.callback("random")
+def callback_random_handler(call, route):
     handle_random_checkin_callback(bot, call)
 
 # -------------------------------
@@ -434,218 +415,211 @@ from modules.summaries import send_summary, generate_summary
 # -------------------------------
 from modules.quotes import start_add_quote, handle_quote_messages, quotes_states, get_random_quote
 
-@bot.message_handler(func=lambda message: message.from_user.id in quotes_states)
+@router.flow(quotes_states)
 def message_quote_handler(message):
     handle_quote_messages(bot, message)
 
+# -------------------------------
+# Integration: Bulk Import / Export
+# -------------------------------
+from modules.import_export import start_import, import_document, handle_import_messages, import_states, send_export
+
+@bot.message_handler(commands=['import'])
+def handle_import(message):
+    start_import(bot, message.chat.id, message.from_user.id)
+
+@bot.message_handler(content_types=['document'], func=lambda message: message.from_user.id in import_states)
+def handle_import_document(message):
+    import_document(bot, message)
+
+@router.flow(import_states)
+def message_import_handler(message):
+    handle_import_messages(bot, message)
+
+@bot.message_handler(commands=['export'])
+def handle_export(message):
+    # "/export json" exports JSON; anything else exports CSV.
+    file_format = 'json' if message.text.split()[1:2] == ['json'] else 'csv'
+    send_export(bot, message.chat.id, message.from_user.id, file_format)
+
 # -------------------------------
 # Additional Utility: Manage Items Menu
 # -------------------------------
-def manage_items_menu(bot, chat_id, user_id):
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
+from modules.manage_items import send_manage_page, edit_manage_page, handle_page_callback, parse_delete_args
+
+@keyboard('manage_items_menu')
+def manage_items_keyboard(lang):
     markup = types.InlineKeyboardMarkup()
-    btn_tasks = types.InlineKeyboardButton(text=MESSAGES[lang].get('manage_tasks', "Manage Tasks"), callback_data="manage_tasks")
-    btn_reminders = types.InlineKeyboardButton(text=MESSAGES[lang].get('manage_reminders', "Manage Reminders"), callback_data="manage_reminders")
-    btn_goals = types.InlineKeyboardButton(text=MESSAGES[lang].get('manage_goals', "Manage Goals"), callback_data="manage_goals")
-    btn_countdowns = types.InlineKeyboardButton(text=MESSAGES[lang].get('manage_countdowns', "Manage Countdowns"), callback_data="manage_countdowns")
-    btn_back = types.InlineKeyboardButton(text=MESSAGES[lang].get('back_to_main_menu', "Back to Main Menu"), callback_data="back_main")
+    btn_tasks = types.InlineKeyboardButton(text=label(lang, 'manage_tasks', "Manage Tasks"), callback_data="manage_tasks")
+    btn_reminders = types.InlineKeyboardButton(text=label(lang, 'manage_reminders', "Manage Reminders"), callback_data="manage_reminders")
+    btn_goals = types.InlineKeyboardButton(text=label(lang, 'manage_goals', "Manage Goals"), callback_data="manage_goals")
+    btn_countdowns = types.InlineKeyboardButton(text=label(lang, 'manage_countdowns', "Manage Countdowns"), callback_data="manage_countdowns")
+    btn_quotes = types.InlineKeyboardButton(text=label(lang, 'manage_quotes', "Manage Quotes"), callback_data="manage_quotes")
+    btn_back = types.InlineKeyboardButton(text=label(lang, 'back_to_main_menu', "Back to Main Menu"), callback_data="back_main")
     markup.row(btn_tasks, btn_reminders)
     markup.row(btn_goals, btn_countdowns)
+    markup.row(btn_quotes)
     markup.add(btn_back)
-    tracked_send_message(chat_id, user_id, MESSAGES[lang].get('manage_items_menu', "Manage Items:\nSelect a category to view and delete items:"), reply_markup=markup)
-
-def manage_tasks(bot, chat_id, user_id):
-    from modules.tasks import list_tasks, delete_task
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    tasks = list_tasks(user_id)
-    if not tasks:
-        bot.send_message(chat_id, MESSAGES[lang].get('no_tasks_found', "No tasks found."))
-        return
-    for task in tasks:
-        task_id = task["id"]
-        title = task["title"]
-        due = task["due_date"] if task["due_date"] else "No due date"
-        markup = types.InlineKeyboardMarkup()
-        btn_delete = types.InlineKeyboardButton(text="Delete 🗑", callback_data=f"delete_task_{task_id}")
-        markup.add(btn_delete)
-        bot.send_message(chat_id, f"Task: {title}\nDue: {due}", reply_markup=markup)
-
-def manage_reminders(bot, chat_id, user_id):
-    from modules.reminders import list_reminders, delete_reminder
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    reminders = list_reminders(user_id)
-    if not reminders:
-        bot.send_message(chat_id, MESSAGES[lang].get('no_reminders_found', "No reminders found."))
-        return
-    for rem in reminders:
-        rem_id = rem["id"]
-        title = rem["title"]
-        trigger = rem["next_trigger_time"]
-        markup = types.InlineKeyboardMarkup()
-        btn_delete = types.InlineKeyboardButton(text="Delete 🗑", callback_data=f"delete_reminder_{rem_id}")
-        markup.add(btn_delete)
-        bot.send_message(chat_id, f"Reminder: {title}\nNext: {trigger}", reply_markup=markup)
-
-def manage_goals(bot, chat_id, user_id):
-    from modules.goals import list_goals, delete_goal
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    goals = list_goals(user_id)
-    if not goals:
-        bot.send_message(chat_id, MESSAGES[lang].get('no_goals_found', "No goals found."))
-        return
-    for goal in goals:
-        goal_id = goal["id"]
-        title = goal["title"]
-        markup = types.InlineKeyboardMarkup()
-        btn_delete = types.InlineKeyboardButton(text="Delete 🗑", callback_data=f"delete_goal_{goal_id}")
-        markup.add(btn_delete)
-        bot.send_message(chat_id, f"Goal: {title}", reply_markup=markup)
-
-def manage_countdowns(bot, chat_id, user_id):
-    from modules.countdowns import list_countdowns, delete_countdown
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    countdowns = list_countdowns(user_id)
-    if not countdowns:
-        bot.send_message(chat_id, MESSAGES[lang].get('no_countdowns_found', "No countdowns found."))
-        return
-    for cd in countdowns:
-        cd_id = cd["id"]
-        title = cd["title"]
-        event_time = cd["event_datetime"]
-        markup = types.InlineKeyboardMarkup()
-        btn_delete = types.InlineKeyboardButton(text="Delete 🗑", callback_data=f"delete_countdown_{cd_id}")
-        markup.add(btn_delete)
-        bot.send_message(chat_id, f"Countdown: {title}\nEvent: {event_time}", reply_markup=markup)
+    return markup
+
+def manage_items_menu(bot, chat_id, user_id):
+    lang = get_user_language(user_id)
+    tracked_send_message(chat_id, user_id, label(lang, 'manage_items_menu', "Manage Items:\nSelect a category to view and delete items:"),
+                         reply_markup=keyboard_markup('manage_items_menu', lang))
 
 # -------------------------------
 # Additional Utility: Settings Menu
 # -------------------------------
-def settings_menu(bot, chat_id, user_id):
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
+@keyboard('settings_menu')
+def settings_keyboard(lang):
     markup = types.InlineKeyboardMarkup()
     btn_change_lang = types.InlineKeyboardButton(
-        text=MESSAGES[lang].get('change_language', "Change Language"),
+        text=label(lang, 'change_language', "Change Language"),
         callback_data="settings_change_lang"
     )
     btn_change_tz = types.InlineKeyboardButton(
-        text=MESSAGES[lang].get('change_timezone', "Change Timezone"),
+        text=label(lang, 'change_timezone', "Change Timezone"),
         callback_data="settings_change_tz"
     )
     btn_back = types.InlineKeyboardButton(
-        text=MESSAGES[lang].get('back_to_main_menu', "Back to Main Menu"),
+        text=label(lang, 'back_to_main_menu', "Back to Main Menu"),
         callback_data="back_main"
     )
     markup.row(btn_change_lang, btn_change_tz)
     markup.add(btn_back)
-    tracked_send_message(chat_id, user_id, MESSAGES[lang].get('settings', "Settings:"), reply_markup=markup)
+    return markup
+
+def settings_menu(bot, chat_id, user_id):
+    lang = get_user_language(user_id)
+    tracked_send_message(chat_id, user_id, label(lang, 'settings', "Settings:"),
+                         reply_markup=keyboard_markup('settings_menu', lang))
 
 # -------------------------------
 # Callback Handlers for Manage Items and Settings
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("manage_") or call.data in ["back_main", "settings_change_lang", "settings_change_tz"])
-def manage_callback_handler(call):
+@router.callback("manage")
+@router.callback("back", "main")
+@router.callback("settings", "change")
+def manage_callback_handler(call, route):
     user_id = call.from_user.id
     chat_id = call.message.chat.id
     data = call.data
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
+    lang = get_user_language(user_id)
     if data == "manage_tasks":
-        manage_tasks(bot, chat_id, user_id)
+        send_manage_page(bot, chat_id, user_id, 'tasks')
     elif data == "manage_reminders":
-        manage_reminders(bot, chat_id, user_id)
+        send_manage_page(bot, chat_id, user_id, 'reminders')
     elif data == "manage_goals":
-        manage_goals(bot, chat_id, user_id)
+        send_manage_page(bot, chat_id, user_id, 'goals')
     elif data == "manage_countdowns":
-        manage_countdowns(bot, chat_id, user_id)
+        send_manage_page(bot, chat_id, user_id, 'countdowns')
+    elif data == "manage_quotes":
+        send_manage_page(bot, chat_id, user_id, 'quotes')
     elif data == "back_main":
         from modules.menu import send_main_menu
         send_main_menu(bot, chat_id, lang)
     elif data == "settings_change_lang":
-        user_states[user_id]['state'] = STATE_LANGUAGE
-        markup = types.InlineKeyboardMarkup()
-        btn_english = types.InlineKeyboardButton(text="English", callback_data="set_lang_en")
-        btn_farsi = types.InlineKeyboardButton(text="فارسی", callback_data="set_lang_fa")
-        markup.add(btn_english, btn_farsi)
-        tracked_send_message(chat_id, user_id, MESSAGES[lang].get('select_language', "Please select your language:"), reply_markup=markup)
+        user_states[user_id] = {'state': STATE_LANGUAGE, 'data': {}}
+        tracked_send_message(chat_id, user_id, label(lang, 'select_language', "Please select your language:"),
+                             reply_markup=keyboard_markup('language_choice', lang))
     elif data == "settings_change_tz":
-        user_states[user_id]['state'] = STATE_TIMEZONE
-        tz_markup = types.InlineKeyboardMarkup(row_width=2)
-        for label, tz_value in TIMEZONE_CHOICES:
-            tz_btn = types.InlineKeyboardButton(text=label, callback_data=f"set_tz_{tz_value}")
-            tz_markup.add(tz_btn)
-        tracked_send_message(chat_id, user_id, MESSAGES[lang].get('select_timezone', "Please select your timezone:"), reply_markup=tz_markup)
+        user_states[user_id] = {'state': STATE_TIMEZONE, 'data': {}}
+        tracked_send_message(chat_id, user_id, label(lang, 'select_timezone', "Please select your timezone:"),
+                             reply_markup=keyboard_markup('timezone_choices', lang))
     else:
         bot.answer_callback_query(call.id, MESSAGES[lang].get('unknown_menu_option', "Unknown menu option selected."))
 
+@router.callback("page")
+def manage_page_handler(call, route):
+    handle_page_callback(bot, call, route.action, route.args)
+
 # -------------------------------
 # Callback Handlers for Deletion Actions
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("delete_task_"))
-def delete_task_handler(call):
+@router.callback("delete", "task")
+def delete_task_handler(call, route):
     user_id = call.from_user.id
     chat_id = call.message.chat.id
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    task_id = int(call.data.split("delete_task_")[1])
+    lang = get_user_language(user_id)
+    task_id, top = parse_delete_args(route.args)
     from modules.tasks import delete_task
     delete_task(user_id, task_id)
     bot.answer_callback_query(call.id, MESSAGES[lang].get('task_deleted', "Task deleted."))
-    bot.send_message(chat_id, MESSAGES[lang].get('task_deleted_confirmation', "Task has been deleted."))
+    if top is not None:
+        edit_manage_page(bot, call, 'tasks', after_id=top)
+    else:
+        bot.send_message(chat_id, MESSAGES[lang].get('task_deleted_confirmation', "Task has been deleted."))
     clear_flow_messages(chat_id, user_id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("delete_reminder_"))
-def delete_reminder_handler(call):
+@router.callback("delete", "reminder")
+def delete_reminder_handler(call, route):
     user_id = call.from_user.id
     chat_id = call.message.chat.id
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    rem_id = int(call.data.split("delete_reminder_")[1])
+    lang = get_user_language(user_id)
+    rem_id, top = parse_delete_args(route.args)
     from modules.reminders import delete_reminder
     delete_reminder(user_id, rem_id)
     bot.answer_callback_query(call.id, MESSAGES[lang].get('reminder_deleted', "Reminder deleted."))
-    bot.send_message(chat_id, MESSAGES[lang].get('reminder_deleted_confirmation', "Reminder has been deleted."))
+    if top is not None:
+        edit_manage_page(bot, call, 'reminders', after_id=top)
+    else:
+        bot.send_message(chat_id, MESSAGES[lang].get('reminder_deleted_confirmation', "Reminder has been deleted."))
     clear_flow_messages(chat_id, user_id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("delete_goal_"))
-def delete_goal_handler(call):
+@router.callback("delete", "goal")
+def delete_goal_handler(call, route):
     user_id = call.from_user.id
     chat_id = call.message.chat.id
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    goal_id = int(call.data.split("delete_goal_")[1])
+    lang = get_user_language(user_id)
+    goal_id, top = parse_delete_args(route.args)
     from modules.goals import delete_goal
     delete_goal(user_id, goal_id)
     bot.answer_callback_query(call.id, MESSAGES[lang].get('goal_deleted', "Goal deleted."))
-    bot.send_message(chat_id, MESSAGES[lang].get('goal_deleted_confirmation', "Goal has been deleted."))
+    if top is not None:
+        edit_manage_page(bot, call, 'goals', after_id=top)
+    else:
+        bot.send_message(chat_id, MESSAGES[lang].get('goal_deleted_confirmation', "Goal has been deleted."))
     clear_flow_messages(chat_id, user_id)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("delete_countdown_"))
-def delete_countdown_handler(call):
+@router.callback("delete", "countdown")
+def delete_countdown_handler(call, route):
     user_id = call.from_user.id
     chat_id = call.message.chat.id
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
-    cd_id = int(call.data.split("delete_countdown_")[1])
+    lang = get_user_language(user_id)
+    cd_id, top = parse_delete_args(route.args)
     from modules.countdowns import delete_countdown
     delete_countdown(user_id, cd_id)
     bot.answer_callback_query(call.id, MESSAGES[lang].get('countdown_deleted', "Countdown deleted."))
-    bot.send_message(chat_id, MESSAGES[lang].get('countdown_deleted_confirmation', "Countdown has been deleted."))
+    if top is not None:
+        edit_manage_page(bot, call, 'countdowns', after_id=top)
+    else:
+        bot.send_message(chat_id, MESSAGES[lang].get('countdown_deleted_confirmation', "Countdown has been deleted."))
     clear_flow_messages(chat_id, user_id)
 
-# -------------------------------
-# Integration: Weekly Schedule Module
-# -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("menu_weekly_schedule"))
-def callback_weekly_schedule_handler(call):
+@router.callback("delete", "quote")
+def delete_quote_handler(call, route):
     user_id = call.from_user.id
     chat_id = call.message.chat.id
-    from modules.weekly_schedule import start_add_weekly_event
-    start_add_weekly_event(bot, chat_id, user_id, user_lang=user_states[user_id]['data'].get('language', 'en'))
+    lang = get_user_language(user_id)
+    quote_id, top = parse_delete_args(route.args)
+    from modules.quotes import delete_quote
+    delete_quote(user_id, quote_id)
+    bot.answer_callback_query(call.id, MESSAGES[lang].get('quote_deleted', "Quote deleted."))
+    if top is not None:
+        edit_manage_page(bot, call, 'quotes', after_id=top)
+    else:
+        bot.send_message(chat_id, MESSAGES[lang].get('quote_deleted_confirmation', "Quote has been deleted."))
+    clear_flow_messages(chat_id, user_id)
 
 # -------------------------------
 # Integration: Main Menu Selections
 # -------------------------------
-@bot.callback_query_handler(func=lambda call: call.data.startswith("menu_"))
-def callback_menu_handler(call):
+@router.callback("menu")
+def callback_menu_handler(call, route):
     chat_id = call.message.chat.id
     user_id = call.from_user.id
     data = call.data
-    lang = user_states.get(user_id, {}).get('data', {}).get('language', 'en')
+    lang = get_user_language(user_id)
     if data == "menu_add_task":
         from modules.tasks import start_add_task
         start_add_task(bot, chat_id, user_id)
@@ -679,10 +653,32 @@ def callback_menu_handler(call):
 # -------------------------------
 from modules.menu import send_main_menu
 
+# Registered last, so the command handlers above take precedence.
+router.attach(bot)
+# Time every command/document handler (router-dispatched handlers time themselves).
+instrument_handlers(bot)
+
 # -------------------------------
 # Main Entry Point
 # -------------------------------
 if __name__ == "__main__":
     init_db()
-    print("Bot is running...")
-    bot.infinity_polling()
+    # Compile and validate every localized template and cache the static keyboards.
+    load_templates()
+    attach_state_stores()
+    # Local Prometheus endpoint (see metrics.py).
+    start_metrics_server()
+    start_dispatcher()
+    use_update_lanes(bot)
+    if BOT_RUNTIME == "async":
+        # Intake, Bot API I/O and the scheduler run on one asyncio loop (see async_runtime.py).
+        run_async(bot, BOT_MODE)
+    else:
+        # Start the scheduler in the background, restoring persisted jobs first.
+        init_scheduler(bot)
+        if BOT_MODE == "webhook":
+            start_webhook(bot)
+        else:
+            print("Bot is running...")
+            bot.remove_webhook()
+            bot.infinity_polling()
@@ -7,36 +7,430 @@ This module initializes the SQLite database for the bot, creating all required t
 - countdowns
 - quotes
 - weekly_schedule
+- scheduler_jobs (APScheduler job store, created by migration 4)
+- flow_states (in-progress conversation flows, created by migration 6)
+
+fetch_page() serves keyset-paginated listings (Manage Items).
 
 Each table is created with all fields and constraints as per the architecture specification.
+
+Schema changes after the initial tables are applied by numbered migrations
+(see MIGRATIONS); PRAGMA user_version records the last one applied.
+
+Connections are handed out by a thread-affine pool: every thread keeps one long-lived
+connection that is configured (WAL, synchronous=NORMAL, mmap, busy_timeout, foreign keys)
+exactly once. Modules should use the db_connection() context manager.
+With METRICS_ENABLED every statement is timed (TimedConnection, see metrics.py).
+
+Small interactive writes are group-committed by a write-behind writer thread
+(queue_write(), see the Write-Behind Queue section).
 """
 
+import atexit
+import queue
 import sqlite3
 import os
+import re
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
 
+from metrics import METRICS_ENABLED, SQL_SECONDS
+
 # Load environment variables
 load_dotenv()
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Database file name
 DATABASE_FILE = os.getenv('DB_PATH', 'data/bot.db')
 
+# Per-connection tuning, applied once when a thread opens its connection.
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A sqlite3 connection owned by the pool.
+    close() only releases it (rolling back anything left uncommitted) so that the
+    legacy "get_db_connection() ... conn.close()" pattern keeps working.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        sqlite3.Connection.close(self)
+
+
+# SQL statement -> (op, table) labels for metrics.SQL_SECONDS.
+_STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|EXISTS)\s+(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def _statement_labels(sql):
+    words = sql.split(None, 1)
+    op = words[0].upper() if words else ''
+    match = _STATEMENT_TABLE.search(sql)
+    return op, match.group(1).lower() if match else ''
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor whose execute()/executemany() are recorded in metrics.SQL_SECONDS."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, *_statement_labels(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, *_statement_labels(sql))
+
+
+class TimedConnection(PooledConnection):
+    """
+    Pooled connection that records every statement's execution time
+    (used when METRICS_ENABLED). For SELECTs this covers stepping to the
+    first row; fetching the rest is not included.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, *_statement_labels(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, *_statement_labels(sql))
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            SQL_SECONDS.observe(time.perf_counter() - start, 'SCRIPT', '')
+
+
+class ConnectionPool:
+    """
+    Hands every thread its own connection to the database file and counts
+    hits (connection reused) and misses (connection opened).
+    """
+
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+        directory = os.path.dirname(database_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def acquire(self):
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            with self._lock:
+                self.hits += 1
+            return conn
+        conn = self._open()
+        self._local.conn = conn
+        with self._lock:
+            self.misses += 1
+            self._connections.add(conn)
+        return conn
+
+    def _open(self):
+        # check_same_thread is disabled only so close_all() can run at shutdown;
+        # the thread-local slot is what keeps each connection on its own thread.
+        conn = sqlite3.connect(
+            self.database_file,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            factory=TimedConnection if METRICS_ENABLED else PooledConnection,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS};")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE};")
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.depth = 0
+        return conn
+
+    def stats(self):
+        """Returns the pool counters as a dict."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'open_connections': len(self._connections),
+            }
+
+    def close_all(self):
+        """Closes every connection the pool has opened (call at shutdown)."""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            try:
+                conn.really_close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_FILE)
+    return _pool
+
+
 def get_db_connection():
     """
-    Returns a connection object to the SQLite database.
-    Enables foreign key support and sets a row factory for dict-like access.
+    Returns the calling thread's pooled connection to the SQLite database.
+    Foreign keys are enabled and rows support dict-like access.
+    Calling close() on it releases it back to the pool.
+    """
+    return get_pool().acquire()
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager around the calling thread's pooled connection.
+    Commits when the outermost block exits cleanly and rolls back on error.
+    """
+    conn = get_pool().acquire()
+    conn.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        conn.depth -= 1
+        if conn.depth == 0 and conn.in_transaction:
+            conn.rollback()
+        raise
+    conn.depth -= 1
+    if conn.depth == 0 and conn.in_transaction:
+        conn.commit()
+
+
+def pool_stats():
+    """Returns hit/miss/open counters for the connection pool."""
+    return get_pool().stats()
+
+
+# -------------------------------
+# Write-Behind Queue (group commit)
+# -------------------------------
+# Small writes from handler threads (saving an item, marking it done, profile
+# updates) go through queue_write() instead of committing on their own: one
+# writer thread runs them in batches, each batch a single BEGIN IMMEDIATE ...
+# COMMIT, so a burst of button taps shares one commit (and one WAL sync).
+# A batch takes every write already queued (up to DB_WRITE_BATCH_SIZE) and
+# then lingers up to DB_WRITE_FLUSH_MS for more. The default of 0 commits as
+# soon as the queue is drained: writes arriving during a commit form the next
+# batch, which batches bursts without delaying callers that wait for their
+# write (see benchmarks/bench_writes.py).
+# queue_write() returns a Future that resolves once the write is committed;
+# callers that read their own write back wait on it, the rest do not.
+# DB_WRITE_BEHIND=0 runs every write inline instead.
+DB_WRITE_BEHIND = os.getenv('DB_WRITE_BEHIND', '1') == '1'
+DB_WRITE_FLUSH_MS = int(os.getenv('DB_WRITE_FLUSH_MS', '0'))
+DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '200'))
+
+_STOP = object()
+
+
+def _run_write(conn, write, params):
+    """
+    Runs one queued write: a callable(conn) returns its own result, an INSERT
+    its lastrowid and any other statement its rowcount.
+    """
+    if callable(write):
+        return write(conn)
+    cursor = conn.execute(write, params)
+    return cursor.lastrowid if write.lstrip()[:6].upper() == 'INSERT' else cursor.rowcount
+
+
+class WriteBehindQueue:
+    """
+    A queue of writes drained by one writer thread in committed batches.
+    Every write runs in its own savepoint, so a failing write only fails its
+    own future and the rest of its batch still commits.
+    """
+
+    def __init__(self, flush_ms=DB_WRITE_FLUSH_MS, batch_size=DB_WRITE_BATCH_SIZE):
+        self.flush_seconds = flush_ms / 1000
+        self.batch_size = batch_size
+        self.writes = 0
+        self.batches = 0
+        self.failed = 0
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, write, params=()):
+        """Queues a write and returns a Future with its result."""
+        if self._thread is None:
+            self.start()
+        if threading.current_thread() is self._thread:
+            # A queued callable writing again: it already runs inside a batch.
+            future = Future()
+            future.set_result(_run_write(get_pool().acquire(), write, params))
+            return future
+        future = Future()
+        self._queue.put((write, params, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Blocks until every write queued before the call is committed."""
+        self.submit(lambda conn: None).result(timeout)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+                # The writer is a daemon thread; commit whatever is queued at exit.
+                atexit.register(self.stop)
+
+    def stop(self, timeout=10.0):
+        """Commits everything queued so far, then stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'writes': self.writes,
+            'batches': self.batches,
+            'failed': self.failed,
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            stopping = False
+            while len(batch) < self.batch_size:
+                # Take whatever is already queued, then linger until the deadline for more.
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with db_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for write, params, future in batch:
+                    conn.execute("SAVEPOINT write_behind")
+                    try:
+                        outcomes.append((future, _run_write(conn, write, params), None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_behind")
+                        # Fire-and-forget callers never look at the future, so log it here.
+                        print(f"Queued write failed: {e}")
+                        outcomes.append((future, None, e))
+                    conn.execute("RELEASE write_behind")
+        except Exception as e:
+            # BEGIN or COMMIT failed (e.g. the database stayed locked): nothing was written.
+            print(f"Write-behind batch of {len(batch)} writes failed: {e}")
+            outcomes = [(future, None, e) for _, _, future in batch]
+        self.batches += 1
+        for future, result, error in outcomes:
+            self.writes += 1
+            if error is None:
+                future.set_result(result)
+            else:
+                self.failed += 1
+                future.set_exception(error)
+
+
+_writer = WriteBehindQueue()
+
+
+def queue_write(write, params=()):
     """
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(DATABASE_FILE), exist_ok=True)
+    Queues `write` (an SQL statement with `params`, or a callable taking the
+    connection) for the next group commit. Returns a Future with the write's
+    result (see _run_write), set once the write is committed. Call .result()
+    on it for read-your-writes.
+    """
+    if not DB_WRITE_BEHIND:
+        future = Future()
+        try:
+            with db_connection() as conn:
+                future.set_result(_run_write(conn, write, params))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _writer.submit(write, params)
+
+
+def flush_writes(timeout=None):
+    """Blocks until every write queued so far is committed."""
+    if DB_WRITE_BEHIND:
+        _writer.flush(timeout)
 
-    conn = sqlite3.connect(
-        DATABASE_FILE,
-        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
-    )
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+
+def stop_writer(timeout=10.0):
+    """Commits the queued writes and stops the writer thread (it restarts on the next write)."""
+    _writer.stop(timeout)
+
+
+def write_queue_stats():
+    """Returns queued/written/batch/failure counters of the write-behind queue."""
+    return _writer.stats()
 
 def init_db():
     """
@@ -49,10 +443,15 @@ def init_db():
       - countdowns
       - quotes
       - weekly_schedule
+    Then applies any pending schema migrations.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    with db_connection() as conn:
+        _create_tables(conn.cursor())
+    apply_migrations()
+
+
+def _create_tables(cursor):
+    """Runs the CREATE TABLE statements for every table."""
     # Create table: users
     cursor.execute(''' 
         CREATE TABLE IF NOT EXISTS users (
@@ -143,11 +542,413 @@ def init_db():
             FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
         );
     ''')
-    
-    conn.commit()
-    conn.close()
+
+# -------------------------------
+# Schema Migrations
+# -------------------------------
+# Each migration is (version, description, steps). A step is either an SQL
+# string or a callable taking the connection. Migrations run in order inside
+# their own transaction, and PRAGMA user_version is bumped to the version.
+MIGRATIONS = [
+    (1, "hot-path indexes for per-user status/time queries", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_status_created ON tasks (user_id, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_due ON tasks (user_id, due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_goals_user_status_created ON goals (user_id, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_trigger ON reminders (user_id, next_trigger_time)",
+        "CREATE INDEX IF NOT EXISTS idx_countdowns_user_event ON countdowns (user_id, event_datetime)",
+        "CREATE INDEX IF NOT EXISTS idx_weekly_user_day ON weekly_schedule (user_id, day_of_week)",
+    ]),
+    (2, "per-user listing indexes ordered by created_at", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_created ON reminders (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_countdowns_user_created ON countdowns (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_quotes_user_created ON quotes (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_weekly_user_created ON weekly_schedule (user_id, created_at)",
+    ]),
+    (3, "onboarded flag and slot indexes for bucketed scheduler jobs", [
+        "ALTER TABLE users ADD COLUMN onboarded INTEGER NOT NULL DEFAULT 0",
+        # Users created before this migration had already been through /start.
+        "UPDATE users SET onboarded = 1",
+        "CREATE INDEX IF NOT EXISTS idx_users_summary_slot "
+        "ON users (onboarded, summary_schedule, summary_time, timezone)",
+        "CREATE INDEX IF NOT EXISTS idx_users_timezone ON users (onboarded, timezone, random_checkin_max)",
+        "CREATE INDEX IF NOT EXISTS idx_weekly_day_time ON weekly_schedule (day_of_week, time_of_day)",
+    ]),
+    (4, "persistent APScheduler job store", [
+        """
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            id TEXT PRIMARY KEY,
+            next_run_time REAL,
+            job_state BLOB NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scheduler_jobs_next_run ON scheduler_jobs (next_run_time)",
+    ]),
+    (5, "reminder status and due-time index for the reminder poller", [
+        "ALTER TABLE reminders ADD COLUMN status TEXT NOT NULL DEFAULT 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_reminders_status_trigger ON reminders (status, next_trigger_time)",
+    ]),
+    (6, "persistent conversation flow state", [
+        """
+        CREATE TABLE IF NOT EXISTS flow_states (
+            namespace TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (namespace, user_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_flow_states_namespace_updated ON flow_states (namespace, updated_at)",
+    ]),
+    (7, "keyset pagination indexes for Manage Items", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_goals_user_id ON goals (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_id ON reminders (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_countdowns_user_id ON countdowns (user_id, id)",
+    ]),
+    (8, "precomputed next occurrence for weekly events", [
+        "ALTER TABLE weekly_schedule ADD COLUMN minute_of_week INTEGER",
+        "ALTER TABLE weekly_schedule ADD COLUMN next_fire_utc DATETIME",
+        lambda conn: _backfill_weekly_next_fire(conn),
+        "CREATE INDEX IF NOT EXISTS idx_weekly_next_fire ON weekly_schedule (next_fire_utc)",
+        "CREATE INDEX IF NOT EXISTS idx_weekly_user_next_fire ON weekly_schedule (user_id, next_fire_utc)",
+        # Weekly reminders no longer look events up by (day_of_week, time_of_day).
+        "DROP INDEX IF EXISTS idx_weekly_day_time",
+    ]),
+    (9, "countdown status and next alert for the countdown alert engine", [
+        "ALTER TABLE countdowns ADD COLUMN status TEXT NOT NULL DEFAULT 'active'",
+        "ALTER TABLE countdowns ADD COLUMN next_alert_at DATETIME",
+        lambda conn: _backfill_countdown_alerts(conn),
+        "CREATE INDEX IF NOT EXISTS idx_countdowns_status_alert ON countdowns (status, next_alert_at)",
+        "CREATE INDEX IF NOT EXISTS idx_countdowns_status_event ON countdowns (status, event_datetime)",
+    ]),
+    (10, "due check-in index for the goal check-in engine", [
+        "CREATE INDEX IF NOT EXISTS idx_goals_status_check ON goals (status, next_check_date)",
+    ]),
+    (11, "dense quote positions and per-user quote decks for O(1) random quotes", [
+        "ALTER TABLE quotes ADD COLUMN seq INTEGER",
+        """
+        CREATE TABLE IF NOT EXISTS quote_decks (
+            user_id INTEGER PRIMARY KEY,
+            quote_count INTEGER NOT NULL DEFAULT 0,
+            deck_size INTEGER,
+            deck_step INTEGER,
+            deck_offset INTEGER,
+            deck_position INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        """,
+        lambda conn: _reindex_quotes(conn),
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_quotes_user_seq ON quotes (user_id, seq)",
+    ]),
+    (12, "per-timezone keyset index for the due/upcoming digest", [
+        "CREATE INDEX IF NOT EXISTS idx_users_tz_user ON users (onboarded, timezone, user_id)",
+    ]),
+    (13, "countdown event time and alerts in UTC", [
+        "ALTER TABLE countdowns ADD COLUMN event_at_utc DATETIME",
+        lambda conn: _backfill_countdown_utc(conn),
+        # Passed countdowns are now found by event_at_utc.
+        "DROP INDEX IF EXISTS idx_countdowns_status_event",
+        "CREATE INDEX IF NOT EXISTS idx_countdowns_status_event_utc ON countdowns (status, event_at_utc)",
+    ]),
+    (14, "reminder trigger time in UTC", [
+        "ALTER TABLE reminders ADD COLUMN trigger_at_utc DATETIME",
+        lambda conn: _backfill_reminder_utc(conn),
+        # Due reminders are now found by trigger_at_utc.
+        "DROP INDEX IF EXISTS idx_reminders_status_trigger",
+        "CREATE INDEX IF NOT EXISTS idx_reminders_status_trigger_utc ON reminders (status, trigger_at_utc)",
+    ]),
+    (15, "keyset pagination index for quotes in Manage Items", [
+        "CREATE INDEX IF NOT EXISTS idx_quotes_user_id ON quotes (user_id, id)",
+    ]),
+    (16, "drop the unused weekly_schedule.minute_of_week", [
+        # Added by migration 8; weekly events are found by next_fire_utc alone.
+        "ALTER TABLE weekly_schedule DROP COLUMN minute_of_week",
+    ]),
+]
+
+
+def _reindex_quotes(conn):
+    """Assigns quote positions and counts for existing quotes (migration 11)."""
+    from modules.quotes import reindex_quotes
+    reindex_quotes(conn)
+
+
+def _backfill_countdown_alerts(conn):
+    """Marks passed countdowns and computes next_alert_at for the rest (migration 9)."""
+    from modules.countdowns import ALERT_INTERVALS, next_alert_time
+    now = datetime.now()
+    conn.execute("UPDATE countdowns SET status = 'passed' WHERE event_datetime <= ?", (now,))
+    rows = conn.execute("SELECT id, event_datetime, notify_schedule FROM countdowns "
+                        "WHERE status = 'active' AND notify_schedule IN ('daily', 'weekly')").fetchall()
+    conn.executemany("UPDATE countdowns SET next_alert_at = ? WHERE id = ?",
+                     [(next_alert_time(datetime.fromisoformat(row["event_datetime"]),
+                                       ALERT_INTERVALS[row["notify_schedule"]], now), row["id"])
+                      for row in rows])
+
+
+def _backfill_countdown_utc(conn):
+    """Computes event_at_utc, and next_alert_at in UTC, from each owner's timezone (migration 13)."""
+    import pytz
+    from modules.countdowns import countdown_schedule
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = conn.execute("""
+        SELECT c.id, c.event_datetime, c.notify_schedule, c.status, COALESCE(u.timezone, 'UTC') AS timezone
+        FROM countdowns c LEFT JOIN users u ON u.user_id = c.user_id
+    """).fetchall()
+    updates = []
+    for row in rows:
+        try:
+            user_tz = pytz.timezone(row["timezone"])
+        except pytz.UnknownTimeZoneError:
+            user_tz = pytz.utc
+        event_at_utc, next_alert = countdown_schedule(datetime.fromisoformat(row["event_datetime"]),
+                                                      row["notify_schedule"], user_tz, now)
+        updates.append((event_at_utc, next_alert if row["status"] == 'active' else None, row["id"]))
+    conn.executemany("UPDATE countdowns SET event_at_utc = ?, next_alert_at = ? WHERE id = ?", updates)
+
+
+def _backfill_reminder_utc(conn):
+    """Computes trigger_at_utc from each owner's timezone (migration 14)."""
+    import pytz
+    from modules.reminders import trigger_time_utc
+    rows = conn.execute("""
+        SELECT r.id, r.next_trigger_time, COALESCE(u.timezone, 'UTC') AS timezone
+        FROM reminders r LEFT JOIN users u ON u.user_id = r.user_id
+    """).fetchall()
+    updates = []
+    for row in rows:
+        try:
+            user_tz = pytz.timezone(row["timezone"])
+        except pytz.UnknownTimeZoneError:
+            user_tz = pytz.utc
+        updates.append((trigger_time_utc(datetime.fromisoformat(row["next_trigger_time"]), user_tz), row["id"]))
+    conn.executemany("UPDATE reminders SET trigger_at_utc = ? WHERE id = ?", updates)
+
+
+def _backfill_weekly_next_fire(conn):
+    """Computes next_fire_utc for existing weekly events (migration 8)."""
+    from modules.weekly_schedule import next_weekly_fire
+    now = datetime.now(timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+    rows = conn.execute("""
+        SELECT w.id, w.day_of_week, w.time_of_day, COALESCE(u.timezone, 'UTC') AS timezone
+        FROM weekly_schedule w LEFT JOIN users u ON u.user_id = w.user_id
+    """).fetchall()
+    conn.executemany("UPDATE weekly_schedule SET next_fire_utc = ? WHERE id = ?",
+                     [(next_weekly_fire(row["day_of_week"], row["time_of_day"], row["timezone"], now), row["id"])
+                      for row in rows])
+
+
+def get_schema_version(conn):
+    """Returns the schema version recorded in PRAGMA user_version."""
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def apply_migrations():
+    """
+    Applies every migration newer than the database's user_version.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    conn = get_db_connection()
+    current = get_schema_version(conn)
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            # Re-check under the write lock in case another process migrated first.
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {int(version)};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied migration {version}: {description}")
+    return applied
+
+
+# -------------------------------
+# Keyset Pagination
+# -------------------------------
+# Tables listed page by page in Manage Items, over their (user_id, id) index.
+PAGED_TABLES = ('tasks', 'goals', 'reminders', 'countdowns', 'quotes')
+
+
+def fetch_page(table, user_id, limit=None, after_id=None, before_id=None):
+    """
+    Returns one user's rows of `table`, newest (highest id) first.
+    With after_id only rows older than that id are returned (the next page),
+    with before_id only rows newer than it (the previous page); `limit` caps
+    the count. Pages are found through the index, never by OFFSET.
+    """
+    if table not in PAGED_TABLES:
+        raise ValueError(f"{table} is not a paged table")
+    sql = f"SELECT * FROM {table} WHERE user_id = ?"
+    params = [user_id]
+    order = "DESC"
+    if after_id is not None:
+        sql += " AND id < ?"
+        params.append(after_id)
+    elif before_id is not None:
+        # Walk upwards from the anchor, then flip back to newest-first.
+        sql += " AND id > ?"
+        params.append(before_id)
+        order = "ASC"
+    sql += f" ORDER BY id {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with db_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    if order == "ASC":
+        rows.reverse()
+    return rows
+
+
+# -------------------------------
+# Query Plan Checks
+# -------------------------------
+# Queries issued on hot paths (summaries, scheduler jobs, listings). Each one
+# must be answered through an index; check_query_plans() fails on full scans.
+HOT_QUERIES = {
+    'user_language': (
+        "SELECT language FROM users WHERE user_id = ?", (1,)),
+    'summary_pending_tasks': (
+        "SELECT title, due_date FROM tasks WHERE user_id = ? AND status = 'pending' ORDER BY created_at DESC", (1,)),
+    'summary_goals_in_progress': (
+        "SELECT title, frequency, next_check_date FROM goals WHERE user_id = ? AND status = 'in_progress' "
+        "ORDER BY created_at DESC", (1,)),
+    'summary_upcoming_reminders': (
+        "SELECT title, next_trigger_time FROM reminders WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ? "
+        "ORDER BY next_trigger_time ASC", (1, datetime.now(), datetime.now())),
+    'summary_countdowns': (
+        "SELECT title, event_datetime FROM countdowns WHERE user_id = ? ORDER BY created_at DESC", (1,)),
+    'summary_weekly_schedule': (
+        "SELECT title, day_of_week, time_of_day FROM weekly_schedule WHERE user_id = ? ORDER BY created_at DESC", (1,)),
+    'summary_random_quote': (
+        "SELECT quote_text FROM quotes WHERE user_id = ? AND seq = "
+        "(SELECT ABS(RANDOM()) % quote_count FROM quote_decks WHERE user_id = ? AND quote_count > 0)", (1, 1)),
+    'quote_deck': (
+        "SELECT * FROM quote_decks WHERE user_id = ?", (1,)),
+    'quote_by_seq': (
+        "SELECT quote_text FROM quotes WHERE user_id = ? AND seq = ?", (1, 0)),
+    'scheduler_weekly_events': (
+        "SELECT id, day_of_week, time_of_day FROM weekly_schedule WHERE user_id = ?", (1,)),
+    'scheduler_tomorrow_weekly': (
+        "SELECT w.user_id, w.title, w.time_of_day FROM weekly_schedule w JOIN users u ON u.user_id = w.user_id "
+        "WHERE w.next_fire_utc >= ? AND w.next_fire_utc < ? AND u.onboarded = 1 AND u.timezone = ? "
+        "ORDER BY w.next_fire_utc", (datetime.now(), datetime.now(), 'UTC')),
+    'scheduler_due_users': (
+        "SELECT user_id FROM users WHERE onboarded = 1 AND timezone = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+        ('UTC', 0, 500)),
+    'scheduler_tasks_due': (
+        "SELECT title, due_date FROM tasks WHERE user_id = ? AND due_date BETWEEN ? AND ?",
+        (1, datetime.now(), datetime.now())),
+    'scheduler_reminders_due': (
+        "SELECT title, next_trigger_time FROM reminders WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ?",
+        (1, datetime.now(), datetime.now())),
+    'scheduler_countdowns_due': (
+        "SELECT title, event_datetime FROM countdowns WHERE user_id = ? AND event_datetime BETWEEN ? AND ?",
+        (1, datetime.now(), datetime.now())),
+    'bucket_daily_summary_users': (
+        "SELECT user_id, language FROM users WHERE onboarded = 1 AND summary_schedule = 'daily' "
+        "AND summary_time = ? AND timezone = ?", ('21:00', 'UTC')),
+    'bucket_custom_summary_users': (
+        "SELECT user_id, language FROM users WHERE onboarded = 1 AND summary_schedule = 'custom' "
+        "AND summary_time = ?", ('3',)),
+    'bucket_timezone_users': (
+        "SELECT user_id FROM users WHERE onboarded = 1 AND timezone = ?", ('UTC',)),
+    'bucket_checkin_users': (
+        "SELECT user_id, language, random_checkin_max FROM users WHERE onboarded = 1 AND timezone = ? "
+        "AND random_checkin_max > 0", ('UTC',)),
+    'due_goal_checkins': (
+        "SELECT g.id, g.user_id, g.title, g.frequency, g.created_at, COALESCE(u.language, 'en') AS language "
+        "FROM goals g LEFT JOIN users u ON u.user_id = g.user_id "
+        "WHERE g.status = 'in_progress' AND g.next_check_date <= ? ORDER BY g.next_check_date LIMIT ?",
+        (datetime.now(), 500)),
+    'due_countdown_alerts': (
+        "SELECT c.id, c.user_id, c.title, c.event_datetime, c.event_at_utc, c.notify_schedule, c.next_alert_at, "
+        "COALESCE(u.language, 'en') AS language FROM countdowns c LEFT JOIN users u ON u.user_id = c.user_id "
+        "WHERE c.status = 'active' AND c.next_alert_at <= ? ORDER BY c.next_alert_at LIMIT ?",
+        (datetime.now(), 200)),
+    'mark_passed_countdowns': (
+        "UPDATE countdowns SET status = 'passed', next_alert_at = NULL "
+        "WHERE status = 'active' AND event_at_utc <= ?", (datetime.now(),)),
+    'due_weekly_events': (
+        "SELECT w.id, w.user_id, w.title, w.day_of_week, w.time_of_day, w.next_fire_utc, "
+        "COALESCE(u.timezone, 'UTC') AS timezone FROM weekly_schedule w LEFT JOIN users u ON u.user_id = w.user_id "
+        "WHERE w.next_fire_utc <= ? ORDER BY w.next_fire_utc LIMIT ?", (datetime.now(), 200)),
+    'jobstore_due_jobs': (
+        "SELECT id, job_state FROM scheduler_jobs WHERE next_run_time <= ? ORDER BY next_run_time", (0.0,)),
+    'jobstore_next_run_time': (
+        "SELECT next_run_time FROM scheduler_jobs WHERE next_run_time IS NOT NULL "
+        "ORDER BY next_run_time LIMIT 1", ()),
+    'due_reminders': (
+        "SELECT r.id, r.user_id, r.title, r.next_trigger_time, r.trigger_at_utc, r.repeat_type, r.repeat_value, "
+        "COALESCE(u.language, 'en') AS language, COALESCE(u.timezone, 'UTC') AS timezone "
+        "FROM reminders r LEFT JOIN users u ON u.user_id = r.user_id "
+        "WHERE r.status = 'active' AND r.trigger_at_utc <= ? ORDER BY r.trigger_at_utc LIMIT ?",
+        (datetime.now(), 200)),
+    'flow_states_restore': (
+        "SELECT user_id, state, data, updated_at FROM flow_states WHERE namespace = ? AND updated_at >= ? "
+        "ORDER BY updated_at", ('tasks', 0.0)),
+    'list_tasks': (
+        "SELECT * FROM tasks WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 9)),
+    'list_goals': (
+        "SELECT * FROM goals WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 9)),
+    'list_reminders': (
+        "SELECT * FROM reminders WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 9)),
+    'list_countdowns': (
+        "SELECT * FROM countdowns WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 9)),
+    'list_countdowns_previous_page': (
+        "SELECT * FROM countdowns WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT ?", (1, 100, 9)),
+    'list_quotes': (
+        "SELECT * FROM quotes WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 9)),
+    'list_weekly_events': (
+        "SELECT * FROM weekly_schedule WHERE user_id = ? ORDER BY created_at DESC", (1,)),
+}
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def explain_query_plan(sql, params=()):
+    """Returns the detail lines of EXPLAIN QUERY PLAN for a statement."""
+    with db_connection() as conn:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row["detail"] for row in rows]
+
+
+def check_query_plans(queries=None):
+    """
+    Runs EXPLAIN QUERY PLAN for every hot query and raises RuntimeError
+    listing each one that falls back to a full table scan.
+    """
+    queries = HOT_QUERIES if queries is None else queries
+    failures = []
+    for name, (sql, params) in queries.items():
+        for detail in explain_query_plan(sql, params):
+            match = _FULL_SCAN.match(detail)
+            if match and match.group(1) != "CONSTANT":
+                failures.append(f"{name}: {detail}")
+    if failures:
+        raise RuntimeError("Full table scans on hot queries:\n  " + "\n  ".join(failures))
+
 
 if __name__ == "__main__":
     # When running this file directly, initialize the database.
+    # Pass --check-plans to also verify that hot queries use indexes.
     init_db()
     print("Database initialized successfully at", DATABASE_FILE)
+    if "--check-plans" in sys.argv[1:]:
+        check_query_plans()
+        print(f"All {len(HOT_QUERIES)} hot queries use an index.")
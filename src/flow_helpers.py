@@ -1,11 +1,33 @@
 # flow_helpers.py
+import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+
+from telebot import apihelper
+from telebot.apihelper import ApiTelegramException
+
+from outbound import dispatcher, PRIORITY_TIMELY
 
 logger = logging.getLogger(__name__)
 
-# Global variables to track messages.
-flow_messages = {}       # { user_id: [msg_id, msg_id, ...] }
-flow_user_messages = {}  # { user_id: [msg_id, msg_id, ...] }
+# Bounds for message tracking: ids kept per user, and users tracked at once
+# (least recently active users are dropped first).
+MAX_TRACKED_PER_USER = 100
+MAX_TRACKED_USERS = 10000
+
+# Telegram only lets bots delete messages younger than 48 hours, and
+# deleteMessages takes at most 100 ids per call.
+DELETE_WINDOW_SECONDS = 48 * 60 * 60
+DELETE_BATCH_SIZE = 100
+
+# Bot and user messages of the current flow, oldest first. Bot messages still
+# in the outbound queue are tracked by the Future of their sendMessage call.
+flow_messages = OrderedDict()  # { user_id: [(msg_id or Future, sent_at), ...] }
+_tracking_lock = threading.Lock()
 
 # Global bot instance—must be set at startup.
 BOT = None
@@ -18,6 +40,17 @@ def set_bot(bot_instance):
     global BOT
     BOT = bot_instance
 
+def _track(user_id, msg_id, sent_at):
+    """Records a message for user_id, keeping both the per-user list and the user count bounded."""
+    with _tracking_lock:
+        ids = flow_messages.setdefault(user_id, [])
+        ids.append((msg_id, sent_at or time.time()))
+        if len(ids) > MAX_TRACKED_PER_USER:
+            del ids[0]
+        flow_messages.move_to_end(user_id)
+        while len(flow_messages) > MAX_TRACKED_USERS:
+            flow_messages.popitem(last=False)
+
 def tracked_send_message(chat_id, user_id, text, **kwargs):
     """
     Sends a message using the global BOT instance and stores its message_id.
@@ -27,7 +60,11 @@ def tracked_send_message(chat_id, user_id, text, **kwargs):
     if BOT is None:
         raise Exception("BOT instance not set in flow_helpers. Call set_bot(bot) first.")
     msg = BOT.send_message(chat_id, text, **kwargs)
-    flow_messages.setdefault(user_id, []).append(msg.message_id)
+    if isinstance(msg, Future):
+        # Queued by the outbound dispatcher; the id is read when the flow is cleared.
+        _track(user_id, msg, time.time())
+    else:
+        _track(user_id, msg.message_id, msg.date)
     return msg
 
 def tracked_user_message(message):
@@ -35,26 +72,64 @@ def tracked_user_message(message):
     Tracks a user-sent message for later deletion.
     """
     user_id = message.from_user.id
-    flow_user_messages.setdefault(user_id, []).append(message.message_id)
+    _track(user_id, message.message_id, message.date)
+
+def _message_id(entry):
+    """Returns a tracked message's id, or None for a send that failed or has not completed."""
+    if not isinstance(entry, Future):
+        return entry
+    if not entry.done() or entry.exception() is not None:
+        return None
+    return entry.result().message_id
+
+def delete_messages_request(chat_id, message_ids):
+    """
+    Calls the Bot API's deleteMessages for up to DELETE_BATCH_SIZE ids.
+    The pinned pyTelegramBotAPI (4.12.0, see requirements.txt) has no
+    delete_messages method, so this goes through its private
+    apihelper._make_request; keep it in sync with telebot on upgrades and
+    switch to TeleBot.delete_messages once the pin includes it.
+    """
+    return apihelper._make_request(BOT.token, 'deleteMessages', method='post', params={
+        'chat_id': chat_id, 'message_ids': json.dumps(message_ids)})
+
+def _delete_messages(chat_id, tracked):
+    """
+    Deletes tracked messages in deleteMessages calls of up to DELETE_BATCH_SIZE
+    ids. Runs on the outbound dispatcher after every earlier call to the chat,
+    so the flow's queued sends have completed and their ids are known.
+    Messages that are already gone count as deleted.
+    """
+    message_ids = [msg_id for msg_id in map(_message_id, tracked) if msg_id is not None]
+    for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+        try:
+            delete_messages_request(chat_id, message_ids[start:start + DELETE_BATCH_SIZE])
+        except ApiTelegramException as e:
+            if not (e.error_code == 400 and 'not found' in (e.description or '').lower()):
+                raise
+    return True
+
+def _log_cleanup_failure(user_id, future):
+    if future.exception() is not None:
+        logger.error(f"Failed to delete flow messages for user {user_id}: {future.exception()}")
 
 def clear_flow_messages(chat_id, user_id):
     """
-    Deletes all tracked bot and user messages for the given user.
+    Deletes all tracked bot and user messages for the given user in the
+    background: one outbound call in the timely lane (behind interactive
+    replies, ahead of bulk digests) sends the ids in bulk deleteMessages
+    calls. Messages past Telegram's 48h delete window are skipped. Returns
+    the queued call's future (None if nothing is tracked).
     """
     global BOT
     if BOT is None:
         raise Exception("BOT instance not set in flow_helpers. Call set_bot(bot) first.")
-    if user_id in flow_messages:
-        for msg_id in flow_messages[user_id]:
-            try:
-                BOT.delete_message(chat_id, msg_id)
-            except Exception as e:
-                logger.error(f"Failed to delete bot message {msg_id} for user {user_id}: {e}")
-        flow_messages[user_id] = []
-    if user_id in flow_user_messages:
-        for msg_id in flow_user_messages[user_id]:
-            try:
-                BOT.delete_message(chat_id, msg_id)
-            except Exception as e:
-                logger.error(f"Failed to delete user message {msg_id} for user {user_id}: {e}")
-        flow_user_messages[user_id] = []
+    with _tracking_lock:
+        tracked = flow_messages.pop(user_id, [])
+    cutoff = time.time() - DELETE_WINDOW_SECONDS
+    tracked = [entry for entry, sent_at in tracked if sent_at > cutoff]
+    if not tracked:
+        return None
+    future = dispatcher.submit(_delete_messages, chat_id, tracked, priority=PRIORITY_TIMELY)
+    future.add_done_callback(partial(_log_cleanup_failure, user_id))
+    return future
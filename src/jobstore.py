@@ -0,0 +1,147 @@
+"""
+jobstore.py
+
+An APScheduler job store that keeps jobs in the bot's own SQLite database
+(the scheduler_jobs table created by database migrations), so scheduled
+summaries and reminders survive container restarts.
+
+It mirrors APScheduler's SQLAlchemyJobStore but talks to sqlite3 through the
+shared connection pool, and adds add_jobs() for bulk inserts at startup.
+"""
+
+import logging
+import pickle
+import sqlite3
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, JobLookupError, ConflictingIdError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+from database import db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteJobStore(BaseJobStore):
+    """
+    Stores pickled job state in the scheduler_jobs table.
+    Jobs must reference module-level functions and picklable arguments.
+    """
+
+    def __init__(self, pickle_protocol=pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.pickle_protocol = pickle_protocol
+
+    def lookup_job(self, job_id):
+        with db_connection() as conn:
+            row = conn.execute("SELECT job_state FROM scheduler_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._reconstitute_job(row["job_state"]) if row else None
+
+    def get_due_jobs(self, now):
+        timestamp = datetime_to_utc_timestamp(now)
+        return self._get_jobs("WHERE next_run_time <= ?", (timestamp,))
+
+    def get_next_run_time(self):
+        with db_connection() as conn:
+            row = conn.execute("""
+                SELECT next_run_time FROM scheduler_jobs
+                WHERE next_run_time IS NOT NULL
+                ORDER BY next_run_time LIMIT 1
+            """).fetchone()
+        return utc_timestamp_to_datetime(row["next_run_time"]) if row else None
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        try:
+            with db_connection() as conn:
+                conn.execute("INSERT INTO scheduler_jobs (id, next_run_time, job_state) VALUES (?, ?, ?)",
+                             self._job_row(job))
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def add_jobs(self, jobs, replace_existing=False):
+        """
+        Inserts many jobs with one executemany in a single transaction.
+        Existing jobs are kept (so their pending next_run_time survives a
+        restart) unless replace_existing is True. Returns the number inserted.
+        """
+        verb = "INSERT OR REPLACE" if replace_existing else "INSERT OR IGNORE"
+        with db_connection() as conn:
+            before = conn.total_changes
+            conn.executemany(f"{verb} INTO scheduler_jobs (id, next_run_time, job_state) VALUES (?, ?, ?)",
+                             (self._job_row(job) for job in jobs))
+            return conn.total_changes - before
+
+    def get_job_ids(self):
+        """Returns the set of stored job ids without unpickling any job."""
+        with db_connection() as conn:
+            return {row[0] for row in conn.execute("SELECT id FROM scheduler_jobs")}
+
+    def remove_stale_jobs(self, keep_ids):
+        """Deletes every stored job whose id is not in keep_ids. Returns the number removed."""
+        stale = [(job_id,) for job_id in self.get_job_ids() if job_id not in keep_ids]
+        with db_connection() as conn:
+            conn.executemany("DELETE FROM scheduler_jobs WHERE id = ?", stale)
+        return len(stale)
+
+    def update_job(self, job):
+        job_id, next_run_time, job_state = self._job_row(job)
+        with db_connection() as conn:
+            cursor = conn.execute("UPDATE scheduler_jobs SET next_run_time = ?, job_state = ? WHERE id = ?",
+                                  (next_run_time, job_state, job_id))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        with db_connection() as conn:
+            cursor = conn.execute("DELETE FROM scheduler_jobs WHERE id = ?", (job_id,))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        with db_connection() as conn:
+            conn.execute("DELETE FROM scheduler_jobs")
+
+    def count_jobs(self):
+        """Returns the number of stored jobs."""
+        with db_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM scheduler_jobs").fetchone()[0]
+
+    def _job_row(self, job):
+        return (job.id, datetime_to_utc_timestamp(job.next_run_time),
+                pickle.dumps(job.__getstate__(), self.pickle_protocol))
+
+    def _reconstitute_job(self, job_state):
+        job_state = pickle.loads(job_state)
+        job_state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, where="", params=()):
+        jobs = []
+        failed_job_ids = []
+        with db_connection() as conn:
+            rows = conn.execute(f"SELECT id, job_state FROM scheduler_jobs {where} ORDER BY next_run_time",
+                                params).fetchall()
+        for row in rows:
+            try:
+                jobs.append(self._reconstitute_job(row["job_state"]))
+            except BaseException:
+                logger.exception('Unable to restore job "%s" -- removing it', row["id"])
+                failed_job_ids.append((row["id"],))
+
+        # Remove all the jobs we failed to restore
+        if failed_job_ids:
+            with db_connection() as conn:
+                conn.executemany("DELETE FROM scheduler_jobs WHERE id = ?", failed_job_ids)
+        return jobs
+
+    def __repr__(self):
+        return '<%s>' % self.__class__.__name__
@@ -0,0 +1,151 @@
+"""
+lanes.py
+
+Per-user ordered, cross-user parallel processing of incoming updates.
+
+TeleBot's own worker pool hands updates to whichever thread is free, so two
+quick taps from one user can run at the same time and race on that user's
+flow state. LaneExecutor instead hashes each update's user_id to one of
+UPDATE_LANES worker lanes: a lane is a single thread with its own queue, so
+one user's updates are handled strictly in arrival order while different
+users run in parallel on different lanes.
+
+use_update_lanes(bot) routes bot.process_new_updates() (called by the polling
+loop and by the webhook workers) through the shared executor. The bot must be
+created with threaded=False, so that handlers run on the lane threads.
+lane_stats() reports per-lane queue depth, peak depth and processed counts;
+each update's latency from queued to handled goes to metrics.UPDATE_SECONDS.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from metrics import UPDATE_SECONDS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+UPDATE_LANES = int(os.getenv('UPDATE_LANES', '8'))
+# A full lane blocks the producer (polling loop / webhook worker): backpressure
+# instead of unbounded memory when one lane falls behind.
+UPDATE_LANE_QUEUE_SIZE = int(os.getenv('UPDATE_LANE_QUEUE_SIZE', '1000'))
+
+# Update fields that carry the acting user, in the order they are checked.
+_USER_FIELDS = ('message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+                'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+                'chat_join_request')
+
+
+def update_user_id(update):
+    """Returns the id of the user an update comes from, or None if it has no user."""
+    for field in _USER_FIELDS:
+        item = getattr(update, field, None)
+        if item is None:
+            continue
+        user = getattr(item, 'from_user', None) or getattr(item, 'user', None)
+        if user is not None:
+            return user.id
+    return None
+
+
+class LaneExecutor:
+    """N single-threaded lanes; work for the same key always runs on the same lane."""
+
+    def __init__(self, lanes=UPDATE_LANES, queue_size=UPDATE_LANE_QUEUE_SIZE):
+        self.lanes = lanes
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(lanes)]
+        self._processed = [0] * lanes
+        self._failed = [0] * lanes
+        self._peak = [0] * lanes
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def lane_for(self, key):
+        return hash(key) % self.lanes
+
+    def start(self):
+        """Starts the lane threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return self
+            for lane in range(self.lanes):
+                thread = threading.Thread(target=self._worker, args=(lane,), name=f"update-lane-{lane}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def submit(self, key, func, *args):
+        """Queues func(*args) on the lane for `key`; blocks while that lane is full."""
+        lane = self.lane_for(key)
+        lane_queue = self._queues[lane]
+        lane_queue.put((func, args, time.perf_counter()))
+        depth = lane_queue.qsize()
+        if depth > self._peak[lane]:
+            self._peak[lane] = depth
+
+    def stop(self, timeout=10.0):
+        """Lets the lanes finish their queued work (up to `timeout` seconds each) and stops them."""
+        for lane_queue in self._queues:
+            lane_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        """Returns per-lane lists of queue depth, peak depth, processed and failed counts."""
+        return {
+            'lanes': self.lanes,
+            'depth': [lane_queue.qsize() for lane_queue in self._queues],
+            'peak_depth': list(self._peak),
+            'processed': list(self._processed),
+            'failed': list(self._failed),
+        }
+
+    def _worker(self, lane):
+        lane_queue = self._queues[lane]
+        while True:
+            item = lane_queue.get()
+            if item is None:
+                return
+            func, args, queued_at = item
+            try:
+                func(*args)
+                self._processed[lane] += 1
+            except Exception as e:
+                self._failed[lane] += 1
+                logger.error(f"Update lane {lane} handler failed: {e}", exc_info=True)
+            UPDATE_SECONDS.observe(time.perf_counter() - queued_at)
+
+
+# Shared executor—installed by use_update_lanes().
+executor = LaneExecutor()
+
+
+def use_update_lanes(bot, lane_executor=None):
+    """
+    Routes bot.process_new_updates() through the lane executor: every update
+    is queued on the lane of its user (updates without a user are spread by
+    update_id) and processed there by the original method.
+    """
+    lane_executor = lane_executor or executor
+    process_updates = bot.process_new_updates
+
+    def process_new_updates(updates):
+        for update in updates:
+            user_id = update_user_id(update)
+            lane_executor.submit(update.update_id if user_id is None else user_id, process_updates, [update])
+
+    bot.process_new_updates = process_new_updates
+    lane_executor.start()
+    return lane_executor
+
+
+def lane_stats():
+    """Returns the shared executor's per-lane metrics (see LaneExecutor.stats)."""
+    return executor.stats()
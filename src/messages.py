@@ -24,7 +24,8 @@ MESSAGES = {
             "• *Weekly Schedule*: Add recurring weekly events (e.g., classes, meetings).\n"
             "• *Random Check-Ins*: Receive friendly prompts throughout the day.\n"
             "• *Summaries*: Receive daily summaries of your items.\n"
-            "• *Quotes*: Add motivational quotes.\n\n"
+            "• *Quotes*: Add motivational quotes.\n"
+            "• *Import/Export*: /import a CSV or JSON file of items; /export (or /export json) downloads them.\n\n"
             "Manage items and adjust settings via the main menu.\n"
             "For a detailed explanation of each feature, type /info. Enjoy!"
         ),
@@ -117,6 +118,8 @@ MESSAGES = {
         "unknown_time_option": "Unknown time option.",
         "unknown_repeat_option": "Unknown repeat option.",
         "no_reminder_action": "No reminder action expected here.",
+        "reminder_due": "⏰ Reminder: {title}",
+        "reminder_due_late": "⏰ Reminder: {title}\n(This was due at {due}.)",
         
         # Goal module messages
         "enter_goal_title": "Please enter the goal title:",
@@ -129,6 +132,11 @@ MESSAGES = {
         "goal_added": "Goal added ({frequency})",
         "goal_added_successfully": "Goal added successfully.\nNext check date: {next_check_date}",
         "unknown_goal_action": "Unknown goal action.",
+        "goal_checkin": "🎯 Goal check-in: {title}\nHow is it going?",
+        "goal_checkin_done": "✅ Done",
+        "goal_checkin_working": "💪 Still working",
+        "goal_checkin_marked_done": "🎉 Goal completed: {title}",
+        "goal_checkin_keep_going": "💪 Keep going: {title}\nNext check-in: {next_check_date}",
         
         # Countdown module messages
         "enter_countdown_title": "Please name your countdown event:",
@@ -143,6 +151,7 @@ MESSAGES = {
         "no_countdown_action": "No countdown action expected here.",
         "countdown_added": "Countdown added:\nEvent: {title}\nEvent Time: {event_time}\nTime Left: {time_left}\nAlerts: {alerts}",
         "event_passed": "Event passed",
+        "countdown_alert": "⏳ Countdown: {title}\nEvent Time: {event_time}\nTime Left: {time_left}",
         
         # Quotes module messages
         "enter_quote_text": "Please enter the quote you want to add:",
@@ -158,7 +167,24 @@ MESSAGES = {
         "manage_reminders": "Manage Reminders",
         "manage_goals": "Manage Goals",
         "manage_countdowns": "Manage Countdowns",
+        "manage_quotes": "Manage Quotes",
         "manage_items_menu": "Manage Items:\nSelect a category to view and delete items:",
+        "page_prev": "◀️ Newer",
+        "page_next": "Older ▶️",
+        "import_prompt": (
+            "Send a CSV or JSON file to import (up to 20 MB). Columns: type (task, reminder, goal, countdown, quote), "
+            "title, date (YYYY/MM/DD HH:MM, Gregorian or Jalali), repeat, repeat_value, status.\n"
+            "Tip: /export produces a file in the same format. Send any text to cancel."
+        ),
+        "import_unsupported_file": "Please send a .csv or .json file.",
+        "import_too_large": "That file is too large; bots can only download files up to 20 MB.",
+        "import_download_failed": "Couldn't download the file. Please try again.",
+        "import_failed": "Nothing was imported. Please fix these rows and send the file again:\n{errors}",
+        "import_done": "Import complete: {summary}. ✅",
+        "import_cancelled": "Import cancelled.",
+        "export_empty": "You have no items to export yet.",
+        "export_caption": "Your Remindino export ({count} items).",
+        "export_failed": "Couldn't send your export. Please try /export again.",
         "back_to_main_menu": "Back to Main Menu"
 
 
@@ -188,7 +214,8 @@ MESSAGES = {
             "• *برنامه هفتگی:* افزودن رویدادهای تکرارشونده در یک روز مشخص از هفته (مثلاً کلاس‌ها یا جلسات).\n"
             "• *بررسی‌های تصادفی:* دریافت پیام‌های دوستانه به‌صورت تصادفی.\n"
             "• *خلاصه و گزارش‌ها:* دریافت خلاصه روزانه از وظایف، اهداف، یادآوری‌ها و شمارش معکوس‌ها.\n"
-            "• *نقل قول‌ها:* افزودن نقل قول‌های انگیزشی.\n\n"
+            "• *نقل قول‌ها:* افزودن نقل قول‌های انگیزشی.\n"
+            "• *ورود/خروج:* با /import یک فایل CSV یا JSON از موارد را وارد کنید؛ با /export (یا /export json) آن‌ها را دریافت کنید.\n\n"
             "شما می‌توانید از منوی اصلی موارد خود را مدیریت و از تنظیمات برای تغییر زبان یا منطقه زمانی استفاده کنید.\n\n"
             "برای توضیحات دقیق درباره هر بخش، /info را تایپ کنید. 😊"
         ),
@@ -279,6 +306,8 @@ MESSAGES = {
         "unknown_time_option": "گزینه زمان ناشناخته است.",
         "unknown_repeat_option": "گزینه تکرار ناشناخته است.",
         "no_reminder_action": "هیچ عملی برای یادآوری مورد انتظار نیست.",
+        "reminder_due": "⏰ یادآوری: {title}",
+        "reminder_due_late": "⏰ یادآوری: {title}\n(زمان این یادآوری {due} بود.)",
         
         # Goal module messages
         "enter_goal_title": "لطفاً عنوان هدف را وارد کنید:",
@@ -291,6 +320,11 @@ MESSAGES = {
         "goal_added": "هدف اضافه شد ({frequency})",
         "goal_added_successfully": "هدف با موفقیت اضافه شد.\nتاریخ بررسی بعدی: {next_check_date}",
         "unknown_goal_action": "عملکرد نامشخص برای هدف.",
+        "goal_checkin": "🎯 بررسی هدف: {title}\nچطور پیش می‌رود؟",
+        "goal_checkin_done": "✅ انجام شد",
+        "goal_checkin_working": "💪 هنوز در حال انجام",
+        "goal_checkin_marked_done": "🎉 هدف انجام شد: {title}",
+        "goal_checkin_keep_going": "💪 ادامه بده: {title}\nبررسی بعدی: {next_check_date}",
         
         # Countdown module messages
         "enter_countdown_title": "لطفاً نام رویداد شمارش معکوس را وارد کنید:",
@@ -305,6 +339,7 @@ MESSAGES = {
         "no_countdown_action": "هیچ عملی برای شمارش معکوس مورد انتظار نیست.",
         "countdown_added": "شمارش معکوس اضافه شد:\nرویداد: {title}\nزمان رویداد: {event_time}\nزمان باقی‌مانده: {time_left}\nاعلان‌ها: {alerts}",
         "event_passed": "رویداد گذشته است",
+        "countdown_alert": "⏳ شمارش معکوس: {title}\nزمان رویداد: {event_time}\nزمان باقی‌مانده: {time_left}",
         
         # Quotes module messages
         "enter_quote_text": "لطفاً نقل قول مورد نظر خود را وارد کنید:",
@@ -320,7 +355,24 @@ MESSAGES = {
         "manage_reminders": "مدیریت یادآوری‌ها",
         "manage_goals": "مدیریت اهداف",
         "manage_countdowns": "مدیریت شمارش معکوس",
+        "manage_quotes": "مدیریت نقل قول‌ها",
         "manage_items_menu": "مدیریت موارد:\nیک دسته را برای مشاهده و حذف موارد انتخاب کنید:",
+        "page_prev": "◀️ جدیدتر",
+        "page_next": "قدیمی‌تر ▶️",
+        "import_prompt": (
+            "یک فایل CSV یا JSON برای وارد کردن ارسال کنید (حداکثر ۲۰ مگابایت). ستون‌ها: type (task, reminder, goal, countdown, quote)، "
+            "title، date (YYYY/MM/DD HH:MM، میلادی یا شمسی)، repeat، repeat_value، status.\n"
+            "نکته: /export فایلی با همین قالب می‌سازد. برای لغو، هر متنی ارسال کنید."
+        ),
+        "import_unsupported_file": "لطفاً یک فایل ‎.csv یا ‎.json ارسال کنید.",
+        "import_too_large": "این فایل بیش از حد بزرگ است؛ ربات‌ها فقط می‌توانند فایل‌های تا ۲۰ مگابایت را دریافت کنند.",
+        "import_download_failed": "دریافت فایل ممکن نشد. لطفاً دوباره تلاش کنید.",
+        "import_failed": "چیزی وارد نشد. لطفاً این ردیف‌ها را اصلاح کرده و فایل را دوباره ارسال کنید:\n{errors}",
+        "import_done": "وارد کردن کامل شد: {summary}. ✅",
+        "import_cancelled": "وارد کردن لغو شد.",
+        "export_empty": "هنوز موردی برای خروجی گرفتن ندارید.",
+        "export_caption": "خروجی ریمایندینو شما ({count} مورد).",
+        "export_failed": "ارسال خروجی ممکن نشد. لطفاً دوباره /export را امتحان کنید.",
         "back_to_main_menu": "بازگشت به منوی اصلی"
 
         
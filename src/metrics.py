@@ -0,0 +1,349 @@
+"""
+metrics.py
+
+In-process instrumentation of the hot paths, served in the Prometheus text
+format on a local HTTP endpoint (GET /metrics on METRICS_HOST:METRICS_PORT).
+
+Recorded as they happen (histograms are cumulative per label set):
+  - remindino_update_seconds               update latency: queued on its user's lane -> handled
+  - remindino_handler_seconds{handler}     run time of each bot.py handler (commands,
+                                           router callbacks and flows); errors counted in
+                                           remindino_handler_errors_total
+  - remindino_job_seconds{job}             run time of each scheduler job, per job family
+  - remindino_job_lag_seconds{job}         job start (submission) minus its scheduled run time;
+                                           misfires and failures in remindino_job_missed_total /
+                                           remindino_job_errors_total
+  - remindino_sql_seconds{op,table}        every statement executed on a pooled connection
+                                           (database.get_db_connection / db_connection)
+  - remindino_bot_api_seconds{method}      every Telegram Bot API request; failures in
+                                           remindino_bot_api_errors_total{method,code}, so
+                                           code="429" counts rate limiting
+  - remindino_outbound_wait_seconds{lane}  time an outgoing message waited in the dispatcher
+
+Read at scrape time from the existing stats functions (lane, outbound, write
+queue, connection pool, user cache, flow states, keyboards, date parsing,
+webhook): remindino_<source>_<counter>, typed untyped since they mix queue
+depths with running totals.
+
+Recording is a perf_counter() pair, a dict lookup and a short lock per
+event (1-2 us, see benchmarks/bench_metrics.py), so it stays on
+in production. METRICS_ENABLED=0 drops the per-statement, per-request and
+per-handler wrappers and the endpoint.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# Local by default: the endpoint is unauthenticated.
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+
+PREFIX = 'remindino_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label set. Each observation
+    increments a single bucket; buckets are made cumulative when rendered.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(buckets)
+        self._series = {}   # { labelvalues: [bucket counts..., +Inf count, sum] }
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.bounds) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labelvalues, list(counts)) for labelvalues, counts in self._series.items()]
+        for labelvalues, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+UPDATE_SECONDS = Histogram('update_seconds', "Update latency from its lane queue to handled.")
+HANDLER_SECONDS = Histogram('handler_seconds', "Run time of bot handlers.", ('handler',))
+HANDLER_ERRORS = Counter('handler_errors_total', "Bot handlers that raised.", ('handler',))
+JOB_SECONDS = Histogram('job_seconds', "Run time of scheduler jobs.", ('job',))
+JOB_LAG = Histogram('job_lag_seconds', "Scheduler job start minus scheduled run time.", ('job',), LAG_BUCKETS)
+JOB_MISSED = Counter('job_missed_total', "Scheduler runs skipped past their misfire grace time.", ('job',))
+JOB_ERRORS = Counter('job_errors_total', "Scheduler jobs that raised.", ('job',))
+SQL_SECONDS = Histogram('sql_seconds', "Execution time of SQL statements.", ('op', 'table'), SQL_BUCKETS)
+BOT_API_SECONDS = Histogram('bot_api_seconds', "Duration of Telegram Bot API requests.", ('method',))
+BOT_API_ERRORS = Counter('bot_api_errors_total', "Failed Telegram Bot API requests.", ('method', 'code'))
+OUTBOUND_WAIT = Histogram('outbound_wait_seconds', "Time outgoing messages waited in the dispatcher.",
+                          ('lane',), LAG_BUCKETS)
+DELIVERIES = Counter('scheduled_deliveries_total', "Outcome of messages queued by the due-item pollers.",
+                     ('kind', 'outcome'))
+
+METRICS = [UPDATE_SECONDS, HANDLER_SECONDS, HANDLER_ERRORS, JOB_SECONDS, JOB_LAG, JOB_MISSED, JOB_ERRORS,
+           SQL_SECONDS, BOT_API_SECONDS, BOT_API_ERRORS, OUTBOUND_WAIT, DELIVERIES]
+
+# -------------------------------
+# Instrumentation helpers
+# -------------------------------
+def timed_handler(handler):
+    """Wraps a bot handler so its run time and failures are recorded under its name."""
+    if not METRICS_ENABLED:
+        return handler
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def instrument_handlers(bot):
+    """
+    Times every handler registered on the TeleBot (call after router.attach).
+    Bound methods are skipped: the router's dispatchers time the handlers
+    they route to themselves.
+    """
+    if not METRICS_ENABLED:
+        return
+    for handlers in (bot.message_handlers, bot.edited_message_handlers, bot.callback_query_handlers,
+                     bot.inline_handlers, bot.chosen_inline_handlers, bot.my_chat_member_handlers,
+                     bot.chat_member_handlers):
+        for handler in handlers:
+            function = handler['function']
+            if getattr(function, '__self__', None) is None and not hasattr(function, '__wrapped__'):
+                handler['function'] = timed_handler(function)
+
+
+def timed_job(job):
+    """Decorator recording a scheduler job function's run time under the job family `job`."""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                JOB_SECONDS.observe(time.perf_counter() - start, job)
+        return wrapper
+    return decorator
+
+
+def instrument_bot_api():
+    """
+    Times every Bot API request made through telebot.apihelper and counts
+    failures by error code (429 = rate limited). Idempotent.
+    """
+    if not METRICS_ENABLED:
+        return
+    from telebot import apihelper
+    make_request = apihelper._make_request
+    if hasattr(make_request, '__wrapped__'):
+        return
+
+    @functools.wraps(make_request)
+    def timed_make_request(token, method_name, method='get', params=None, files=None):
+        start = time.perf_counter()
+        try:
+            return make_request(token, method_name, method=method, params=params, files=files)
+        except apihelper.ApiTelegramException as e:
+            BOT_API_ERRORS.inc(method_name, str(e.error_code))
+            raise
+        except Exception as e:
+            BOT_API_ERRORS.inc(method_name, type(e).__name__)
+            raise
+        finally:
+            BOT_API_SECONDS.observe(time.perf_counter() - start, method_name)
+
+    apihelper._make_request = timed_make_request
+
+# -------------------------------
+# Stats read at scrape time
+# -------------------------------
+_stats_sources = {}   # { name: stats() -> dict }
+
+
+def register_stats(name, stats):
+    """
+    Adds stats() to every scrape. stats() returns {key: value}, where value is
+    a number, a list of per-lane numbers or a {namespace: number} dict.
+    """
+    _stats_sources[name] = stats
+
+
+def _default_stats():
+    """The stats functions of the other modules (imported lazily: they import this one)."""
+    from database import pool_stats, write_queue_stats
+    from lanes import lane_stats
+    from outbound import dispatcher
+    from user_cache import user_cache_stats
+    from state_store import state_store_stats
+    from templates import markup_cache_stats
+    from modules.date_conversion import parse_cache_info
+    return {
+        'lanes': lane_stats,
+        'outbound': dispatcher.stats,
+        'write_queue': write_queue_stats,
+        'db_pool': pool_stats,
+        'user_cache': user_cache_stats,
+        'flows': lambda: {'in_progress': state_store_stats()},
+        'keyboards': markup_cache_stats,
+        'date_parse_cache': lambda: parse_cache_info()._asdict(),
+    }
+
+
+def _render_stats(name, stats):
+    lines = []
+    for key, value in stats.items():
+        metric = f"{PREFIX}{name}_{key}"
+        if isinstance(value, dict):
+            samples = [(f'{{namespace="{_escape(label)}"}}', v) for label, v in value.items()]
+        elif isinstance(value, (list, tuple)):
+            samples = [(f'{{lane="{index}"}}', v) for index, v in enumerate(value)]
+        elif isinstance(value, (int, float)):
+            samples = [('', value)]
+        else:
+            continue
+        lines.append(f"# TYPE {metric} untyped")
+        lines.extend(f"{metric}{labels} {_number(v)}" for labels, v in samples)
+    return lines
+
+
+def render_metrics():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, stats in {**_default_stats(), **_stats_sources}.items():
+        try:
+            lines.extend(_render_stats(name, stats()))
+        except Exception as e:
+            logger.error(f"Failed to collect {name} stats: {e}")
+    return '\n'.join(lines) + '\n'
+
+# -------------------------------
+# HTTP endpoint
+# -------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serves /metrics on a background thread and instruments Bot API requests.
+    Returns the server, or None when METRICS_ENABLED=0.
+    """
+    if not METRICS_ENABLED:
+        return None
+    instrument_bot_api()
+    server = _MetricsHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metrics served on http://{host}:{server.server_address[1]}/metrics")
+    return server
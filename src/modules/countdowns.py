@@ -1,23 +1,19 @@
 from datetime import datetime, timedelta
+import pytz
 from telebot import types
-from database import get_db_connection
+from database import db_connection, fetch_page, queue_write
+from user_cache import get_user_language, get_user_timezone
+from state_store import StateStore
 from modules.date_conversion import parse_date  # Supports both Gregorian and Jalali dates
 
 # New import:
 from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_messages
+from outbound import track_delivery
 from messages import MESSAGES
+from templates import keyboard, keyboard_markup, render
 
-# Global dictionary to track countdown conversation state per user.
-countdowns_states = {}
-
-def get_user_language(user_id):
-    """Retrieves the user's language from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 'en'
+# Bounded, persisted store of countdown conversation state per user (see state_store.py).
+countdowns_states = StateStore('countdowns')
 
 def start_add_countdown(bot, chat_id, user_id):
     """
@@ -58,17 +54,23 @@ def handle_countdown_messages(bot, message):
     else:
         tracked_send_message(chat_id, user_id, MESSAGES[lang]['unexpected_input'])
 
-def prompt_notify_choice(bot, chat_id, user_id):
-    """
-    Sends an inline keyboard for periodic alert options for the countdown.
-    """
-    lang = get_user_language(user_id)
+@keyboard('countdown_notify_choice')
+def notify_choice_keyboard(lang):
+    """Builds the periodic alert keyboard in `lang` (cached by templates.keyboard_markup)."""
     markup = types.InlineKeyboardMarkup()
     btn_none = types.InlineKeyboardButton(text=MESSAGES[lang]['no_alerts'], callback_data="countdown_notify_none")
     btn_daily = types.InlineKeyboardButton(text=MESSAGES[lang]['daily_alerts'], callback_data="countdown_notify_daily")
     btn_weekly = types.InlineKeyboardButton(text=MESSAGES[lang]['weekly_alerts'], callback_data="countdown_notify_weekly")
     markup.row(btn_none, btn_daily, btn_weekly)
-    tracked_send_message(chat_id, user_id, MESSAGES[lang]['prompt_countdown_alerts'], reply_markup=markup)
+    return markup
+
+def prompt_notify_choice(bot, chat_id, user_id):
+    """
+    Sends an inline keyboard for periodic alert options for the countdown.
+    """
+    lang = get_user_language(user_id)
+    tracked_send_message(chat_id, user_id, render(lang, 'prompt_countdown_alerts'),
+                         reply_markup=keyboard_markup('countdown_notify_choice', lang))
 
 def handle_countdown_callbacks(bot, call):
     """
@@ -106,7 +108,9 @@ def finalize_countdown(bot, chat_id, user_id):
     event_datetime = data.get('event_datetime')
     notify_schedule = data.get('notify_schedule', 'none')
     save_countdown_in_db(user_id, title, event_datetime, notify_schedule)
-    time_left = compute_time_left(event_datetime, lang)
+    # event_datetime is in the user's timezone, so measure from their local now.
+    time_left = compute_time_left(event_datetime, lang,
+                                  datetime.now(get_user_timezone(user_id)).replace(tzinfo=None))
     bot.send_message(chat_id,
                      MESSAGES[lang]['countdown_added'].format(
                          title=title,
@@ -119,24 +123,24 @@ def finalize_countdown(bot, chat_id, user_id):
 
 def save_countdown_in_db(user_id, title, event_datetime, notify_schedule):
     """
-    Saves the countdown event into the database.
+    Saves the countdown event into the database, with its event time and first
+    periodic alert in UTC (see countdown_schedule).
+    Group-committed (see database.queue_write); returns a Future with the new id.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     now = datetime.now()
-    cursor.execute("""
-        INSERT INTO countdowns (user_id, title, event_datetime, notify_schedule, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, title, event_datetime, notify_schedule, now))
-    conn.commit()
-    conn.close()
+    event_at_utc, next_alert = countdown_schedule(event_datetime, notify_schedule, get_user_timezone(user_id),
+                                                  _utcnow())
+    return queue_write("""
+        INSERT INTO countdowns (user_id, title, event_datetime, notify_schedule, created_at, event_at_utc, next_alert_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, title, event_datetime, notify_schedule, now, event_at_utc, next_alert))
 
-def compute_time_left(event_datetime, lang='en'):
+def compute_time_left(event_datetime, lang='en', now=None):
     """
     Computes the time left until the event.
     Returns a string in the format "X days, Y hours left" (or "Event passed" if in the past).
     """
-    now = datetime.now()
+    now = now or datetime.now()
     delta = event_datetime - now
     if delta.total_seconds() < 0:
         return MESSAGES[lang].get('event_passed', "Event passed")
@@ -154,23 +158,165 @@ def compute_time_left(event_datetime, lang='en'):
     
     return ", ".join(parts) + " left" if parts else "Less than a minute left"
 
-def list_countdowns(user_id):
+def list_countdowns(user_id, limit=None, after_id=None, before_id=None):
     """
-    Retrieves a list of countdown events for the given user.
+    Retrieves the user's countdown events, newest first. With `limit`, returns one
+    keyset page: countdown events older than `after_id` or newer than `before_id`.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM countdowns WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    countdowns = cursor.fetchall()
-    conn.close()
-    return countdowns
+    return fetch_page('countdowns', user_id, limit, after_id, before_id)
 
 def delete_countdown(user_id, countdown_id):
     """
     Deletes the specified countdown event from the database.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM countdowns WHERE id = ? AND user_id = ?", (countdown_id, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM countdowns WHERE id = ? AND user_id = ?", (countdown_id, user_id))
+
+def reschedule_countdowns(user_id):
+    """
+    Recomputes event_at_utc/next_alert_at for the user's active countdowns
+    from their cached timezone, e.g. after a timezone change. Returns the
+    number updated.
+    """
+    user_tz = get_user_timezone(user_id)
+    now = _utcnow()
+    with db_connection() as conn:
+        rows = conn.execute("SELECT id, event_datetime, notify_schedule FROM countdowns "
+                            "WHERE user_id = ? AND status = 'active'", (user_id,)).fetchall()
+        updates = [countdown_schedule(_to_datetime(row["event_datetime"]), row["notify_schedule"], user_tz, now)
+                   + (row["id"],) for row in rows]
+        conn.executemany("UPDATE countdowns SET event_at_utc = ?, next_alert_at = ? WHERE id = ?", updates)
+    return len(updates)
+
+
+# -------------------------------
+# Countdown Alert Engine
+# -------------------------------
+# The scheduler polls for due alerts (scheduler.dispatch_countdown_alerts).
+# event_datetime is what the user typed, in their timezone; every countdown
+# also carries event_at_utc, the same moment in UTC, and every active one with
+# daily/weekly alerts carries next_alert_at (UTC), the next point at a whole
+# number of days/weeks before the event, so alerts land at the event's own
+# clock time and read "N days left". Polls compare both against UTC now, so
+# they fire on time whatever the user's or the server's timezone. Each tick:
+#   - marks countdowns whose event has passed (status 'passed', no alert),
+#     which drops them out of all later scans;
+#   - claims one batch of due alerts (idx_countdowns_status_alert) and moves
+#     each to its next alert in a single executemany, before anything is sent;
+#   - renders the batch's time-left texts against one `now` and queues them
+#     on the outbound dispatcher.
+ALERT_INTERVALS = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+
+COUNTDOWN_ALERT_BATCH_SIZE = 200
+
+# Alerts sent within this of their slot show the time left as of the slot
+# ("3 days left", not "2 days, 23 hours, 59 minutes left"); later ones use now.
+COUNTDOWN_ALERT_LATE_AFTER = timedelta(minutes=5)
+
+DUE_COUNTDOWN_ALERTS_QUERY = """
+    SELECT c.id, c.user_id, c.title, c.event_datetime, c.event_at_utc, c.notify_schedule, c.next_alert_at,
+           COALESCE(u.language, 'en') AS language
+    FROM countdowns c LEFT JOIN users u ON u.user_id = c.user_id
+    WHERE c.status = 'active' AND c.next_alert_at <= ?
+    ORDER BY c.next_alert_at
+    LIMIT ?
+"""
+
+MARK_PASSED_COUNTDOWNS = """
+    UPDATE countdowns SET status = 'passed', next_alert_at = NULL
+    WHERE status = 'active' AND event_at_utc <= ?
+"""
+
+
+def _to_datetime(value):
+    """DATETIME columns come back as ISO strings; parse them (datetimes pass through)."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _utcnow():
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+
+def event_time_utc(event_datetime, user_tz):
+    """Converts a naive event_datetime in `user_tz` (a pytz timezone) to naive UTC."""
+    return user_tz.localize(event_datetime).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def countdown_schedule(event_datetime, notify_schedule, user_tz, now):
+    """
+    Returns (event_at_utc, next_alert_at) for a countdown whose event_datetime
+    is in `user_tz`; `now` and both results are naive UTC.
+    """
+    event_at_utc = event_time_utc(event_datetime, user_tz)
+    return event_at_utc, next_alert_time(event_at_utc, ALERT_INTERVALS.get(notify_schedule), now)
+
+
+def next_alert_time(event_datetime, interval, after):
+    """
+    Returns the first alert strictly after `after`: the latest
+    event_datetime - k * interval (k >= 1) still after it. None for
+    countdowns without alerts or when no full interval is left.
+    """
+    if interval is None:
+        return None
+    intervals_left = (event_datetime - after - timedelta(microseconds=1)) // interval
+    if intervals_left < 1:
+        return None
+    return event_datetime - interval * intervals_left
+
+
+def render_countdown_alerts(rows, now):
+    """
+    Renders the alert text for each claimed row, all against the same `now`
+    (naive UTC). Returns [(chat_id, text)].
+    """
+    alerts = []
+    for row in rows:
+        lang = row["language"] if row["language"] in MESSAGES else 'en'
+        event_at_utc = _to_datetime(row["event_at_utc"])
+        alert_time = _to_datetime(row["next_alert_at"])
+        as_of = alert_time if now - alert_time <= COUNTDOWN_ALERT_LATE_AFTER else now
+        alerts.append((row["user_id"], MESSAGES[lang]['countdown_alert'].format(
+            title=row["title"],
+            event_time=_to_datetime(row["event_datetime"]).strftime('%Y-%m-%d %H:%M'),
+            time_left=compute_time_left(event_at_utc, lang, as_of))))
+    return alerts
+
+
+def _claim_due_countdown_alerts(now, batch_size):
+    """
+    Marks passed countdowns, then selects one batch of due alerts and advances
+    each to its next alert, all in one write transaction, so every alert is
+    claimed exactly once. Returns the claimed rows.
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(MARK_PASSED_COUNTDOWNS, (now,))
+        rows = conn.execute(DUE_COUNTDOWN_ALERTS_QUERY, (now, batch_size)).fetchall()
+        updates = []
+        for row in rows:
+            alert_time = _to_datetime(row["next_alert_at"])
+            # After downtime only one alert is sent; the next one is after now.
+            next_alert = next_alert_time(_to_datetime(row["event_at_utc"]),
+                                         ALERT_INTERVALS.get(row["notify_schedule"]), max(alert_time, now))
+            updates.append((next_alert, row["id"]))
+        conn.executemany("UPDATE countdowns SET next_alert_at = ? WHERE id = ?", updates)
+    return rows
+
+
+def process_due_countdown_alerts(bot, now=None, batch_size=COUNTDOWN_ALERT_BATCH_SIZE):
+    """
+    Queues every due daily/weekly countdown alert, one claimed batch at a
+    time; `now` is naive UTC. Returns the number of alerts queued (see
+    outbound.track_delivery for their delivery).
+    """
+    now = now or _utcnow()
+    queued = 0
+    while True:
+        claimed = _claim_due_countdown_alerts(now, batch_size)
+        for chat_id, text in render_countdown_alerts(claimed, now):
+            track_delivery(bot.send_message(chat_id, text), 'countdown_alert', f"to user {chat_id}")
+            queued += 1
+        if len(claimed) < batch_size:
+            return queued
@@ -2,52 +2,99 @@
 This module provides functions to parse date strings that may be in either
 the Gregorian calendar or the Jalali (Iranian) calendar. If a date string
 has a year between 1300 and 1500, it is assumed to be in the Jalali calendar
-and will be converted to Gregorian using the jdatetime library.
+and will be converted to Gregorian.
 
 Supported date formats:
-    - Gregorian: "YYYY/MM/DD" or "YYYY-MM-DD" with optional time "HH:MM" 
+    - Gregorian: "YYYY/MM/DD" or "YYYY-MM-DD" with optional time "HH:MM"
       (e.g., "2023/03/21 15:30")
-    - Jalali: "YYYY/MM/DD" or "YYYY-MM-DD" with optional time "HH:MM" 
+    - Jalali: "YYYY/MM/DD" or "YYYY-MM-DD" with optional time "HH:MM"
       (e.g., "1400/01/15 08:45")
+
+Jalali conversion is table driven: JALALI_YEAR_STARTS holds the proleptic
+Gregorian ordinal of 1 Farvardin for every supported year (built once at
+import with jdatetime), and Jalali months have fixed lengths apart from
+Esfand, so a Jalali date converts with one index, one addition and
+date.fromordinal(). parse_date() sits behind an LRU cache, and
+parse_dates()/jalali_to_gregorian_dates() convert many dates in one call.
 """
 
 import datetime
+from array import array
+from functools import lru_cache
+
 import jdatetime
 
-def parse_date(date_str):
+JALALI_MIN_YEAR = 1300
+JALALI_MAX_YEAR = 1500
+
+PARSE_CACHE_SIZE = 4096
+
+# Days before the first day of each Jalali month: six 31-day months, five
+# 30-day months, then Esfand (29 days, 30 in leap years).
+JALALI_MONTH_OFFSETS = array('H', [0, 31, 62, 93, 124, 155, 186, 216, 246, 276, 306, 336])
+
+# Ordinal of 1 Farvardin for JALALI_MIN_YEAR .. JALALI_MAX_YEAR + 1 (the extra
+# entry gives the length of the last year).
+JALALI_YEAR_STARTS = array('l', (
+    jdatetime.date(year, 1, 1).togregorian().toordinal()
+    for year in range(JALALI_MIN_YEAR, JALALI_MAX_YEAR + 2)))
+
+def _jalali_ordinal(year, month, day):
     """
-    Parses a date string and returns a datetime.datetime object in the Gregorian calendar.
-    
-    The function supports input with an optional time part. If the time is not provided,
-    it defaults to 00:00.
-    
-    Supported formats:
-      - Gregorian: "YYYY/MM/DD" or "YYYY-MM-DD", optionally with "HH:MM"
-      - Jalali: "YYYY/MM/DD" or "YYYY-MM-DD", optionally with "HH:MM",
-        where the year is between 1300 and 1500.
-        
-    Args:
-        date_str (str): The input date string.
-        
-    Returns:
-        datetime.datetime: The corresponding Gregorian datetime.
-        
-    Raises:
-        ValueError: If the date_str is not in a valid format or conversion fails.
+    Returns the proleptic Gregorian ordinal of a Jalali date.
+    Raises ValueError for dates outside the table or invalid months/days.
+    """
+    index = year - JALALI_MIN_YEAR
+    if not 0 <= index <= JALALI_MAX_YEAR - JALALI_MIN_YEAR:
+        raise ValueError(f"Jalali year must be between {JALALI_MIN_YEAR} and {JALALI_MAX_YEAR}")
+    if not 1 <= month <= 12:
+        raise ValueError("month must be in 1..12")
+    start = JALALI_YEAR_STARTS[index]
+    if month <= 6:
+        month_length = 31
+    elif month <= 11:
+        month_length = 30
+    else:
+        month_length = JALALI_YEAR_STARTS[index + 1] - start - 336
+    if not 1 <= day <= month_length:
+        raise ValueError("day is out of range for month")
+    return start + JALALI_MONTH_OFFSETS[month - 1] + day - 1
+
+def jalali_to_gregorian(year, month, day):
+    """Converts a Jalali date to a datetime.date (ValueError if invalid)."""
+    return datetime.date.fromordinal(_jalali_ordinal(year, month, day))
+
+def jalali_to_gregorian_dates(dates):
     """
+    Batch conversion: takes an iterable of (year, month, day) Jalali tuples and
+    returns a list of datetime.date, in order. Raises ValueError naming the
+    first invalid date.
+    """
+    converted = []
+    for year, month, day in dates:
+        try:
+            converted.append(datetime.date.fromordinal(_jalali_ordinal(year, month, day)))
+        except ValueError as e:
+            raise ValueError(f"Invalid Jalali date {year}/{month}/{day}: {e}") from e
+    return converted
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_date(date_str):
     # Split input into date and time parts.
-    parts = date_str.strip().split()
+    parts = date_str.split()
+    if not parts:
+        raise ValueError("Invalid date format. Expected format: YYYY/MM/DD")
     date_part = parts[0]
     time_part = "00:00"
     if len(parts) > 1:
         time_part = parts[1]
-    
+
     # Standardize delimiter: replace '-' with '/'
     date_part = date_part.replace("-", "/")
     date_components = date_part.split("/")
     if len(date_components) < 3:
         raise ValueError("Invalid date format. Expected format: YYYY/MM/DD")
-    
+
     try:
         year = int(date_components[0])
         month = int(date_components[1])
@@ -66,10 +113,9 @@ def parse_date(date_str):
         raise ValueError("Time components must be integers") from e
 
     # Determine if the date is Jalali or Gregorian.
-    if 1300 <= year <= 1500:
+    if JALALI_MIN_YEAR <= year <= JALALI_MAX_YEAR:
         try:
-            jalali_date = jdatetime.date(year, month, day)
-            gregorian_date = jalali_date.togregorian()  # returns a datetime.date
+            gregorian_date = datetime.date.fromordinal(_jalali_ordinal(year, month, day))
             return datetime.datetime(gregorian_date.year, gregorian_date.month, gregorian_date.day, hour, minute)
         except Exception as e:
             raise ValueError("Error converting Jalali date to Gregorian") from e
@@ -79,6 +125,47 @@ def parse_date(date_str):
         except Exception as e:
             raise ValueError("Error parsing Gregorian date") from e
 
+def parse_date(date_str):
+    """
+    Parses a date string and returns a datetime.datetime object in the Gregorian calendar.
+
+    The function supports input with an optional time part. If the time is not provided,
+    it defaults to 00:00.
+
+    Supported formats:
+      - Gregorian: "YYYY/MM/DD" or "YYYY-MM-DD", optionally with "HH:MM"
+      - Jalali: "YYYY/MM/DD" or "YYYY-MM-DD", optionally with "HH:MM",
+        where the year is between 1300 and 1500.
+
+    Args:
+        date_str (str): The input date string.
+
+    Returns:
+        datetime.datetime: The corresponding Gregorian datetime.
+
+    Raises:
+        ValueError: If the date_str is not in a valid format or conversion fails.
+    """
+    return _parse_date(date_str.strip())
+
+def parse_dates(date_strs):
+    """
+    Batch version of parse_date(): parses a list (or any iterable) of date
+    strings and returns their datetimes in order. Raises ValueError naming the
+    first string that does not parse.
+    """
+    parsed = []
+    for date_str in date_strs:
+        try:
+            parsed.append(_parse_date(date_str.strip()))
+        except ValueError as e:
+            raise ValueError(f"Invalid date '{date_str}': {e}") from e
+    return parsed
+
+def parse_cache_info():
+    """Hit/miss counters of the parse_date() LRU cache."""
+    return _parse_date.cache_info()
+
 if __name__ == "__main__":
     # Test cases to demonstrate date conversion.
     test_dates = [
@@ -87,7 +174,7 @@ if __name__ == "__main__":
         "1400-07-10 08:30",        # Jalali with hyphen and time.
         "2023-03-21 15:45"         # Gregorian with hyphen and time.
     ]
-    
+
     for d in test_dates:
         try:
             converted = parse_date(d)
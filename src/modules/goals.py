@@ -1,23 +1,19 @@
 import sqlite3
+from calendar import monthrange
 from datetime import datetime, timedelta
 from telebot import types
-from database import get_db_connection
+from database import db_connection, fetch_page, queue_write
+from user_cache import get_user_language
+from state_store import StateStore
 
 # New import:
 from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_messages
+from outbound import track_delivery
 from messages import MESSAGES
+from templates import keyboard, keyboard_markup, render
 
-# Global dictionary to track goal creation conversation state per user.
-goals_states = {}
-
-def get_user_language(user_id):
-    """Retrieves the user's language from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 'en'
+# Bounded, persisted store of goal creation conversation state per user (see state_store.py).
+goals_states = StateStore('goals')
 
 def start_add_goal(bot, chat_id, user_id):
     """
@@ -27,6 +23,19 @@ def start_add_goal(bot, chat_id, user_id):
     goals_states[user_id] = {'state': 'awaiting_title', 'data': {}}
     tracked_send_message(chat_id, user_id, MESSAGES[lang]['enter_goal_title'])
 
+@keyboard('goal_frequency')
+def frequency_keyboard(lang):
+    """Builds the goal frequency keyboard in `lang` (cached by templates.keyboard_markup)."""
+    markup = types.InlineKeyboardMarkup()
+    btn_daily = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_daily'], callback_data="goal_freq_daily")
+    btn_weekly = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_weekly'], callback_data="goal_freq_weekly")
+    btn_monthly = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_monthly'], callback_data="goal_freq_monthly")
+    btn_seasonal = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_seasonal'], callback_data="goal_freq_seasonal")
+    btn_yearly = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_yearly'], callback_data="goal_freq_yearly")
+    markup.row(btn_daily, btn_weekly)
+    markup.row(btn_monthly, btn_seasonal, btn_yearly)
+    return markup
+
 def handle_goal_messages(bot, message):
     """
     Handles text messages related to the add-goal conversation.
@@ -46,18 +55,8 @@ def handle_goal_messages(bot, message):
     if current_state == 'awaiting_title':
         data['title'] = text
         goals_states[user_id]['state'] = 'awaiting_frequency'
-        
-        # Create an inline keyboard for frequency selection.
-        markup = types.InlineKeyboardMarkup()
-        btn_daily = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_daily'], callback_data="goal_freq_daily")
-        btn_weekly = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_weekly'], callback_data="goal_freq_weekly")
-        btn_monthly = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_monthly'], callback_data="goal_freq_monthly")
-        btn_seasonal = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_seasonal'], callback_data="goal_freq_seasonal")
-        btn_yearly = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_freq_yearly'], callback_data="goal_freq_yearly")
-        markup.row(btn_daily, btn_weekly)
-        markup.row(btn_monthly, btn_seasonal, btn_yearly)
-        
-        tracked_send_message(chat_id, user_id, MESSAGES[lang]['select_goal_frequency'], reply_markup=markup)
+        tracked_send_message(chat_id, user_id, render(lang, 'select_goal_frequency'),
+                             reply_markup=keyboard_markup('goal_frequency', lang))
     else:
         tracked_send_message(chat_id, user_id, MESSAGES[lang]['unexpected_input'])
 
@@ -79,20 +78,12 @@ def handle_goal_callbacks(bot, call):
         data['frequency'] = frequency
 
         now = datetime.now()
-        if frequency == "daily":
-            next_check_date = now + timedelta(days=1)
-        elif frequency == "weekly":
-            next_check_date = now + timedelta(weeks=1)
-        elif frequency == "monthly":
-            next_check_date = now + timedelta(days=30)
-        elif frequency == "seasonal":
-            next_check_date = now + timedelta(days=90)
-        elif frequency == "yearly":
-            next_check_date = now + timedelta(days=365)
+        if frequency in GOAL_DAY_STEPS or frequency in GOAL_MONTH_STEPS:
+            next_check_date = next_check_after(now, frequency, now)
         else:
             next_check_date = now  # Fallback (should not occur)
 
-        save_goal_in_db(user_id, data.get('title'), frequency, next_check_date)
+        save_goal_in_db(user_id, data.get('title'), frequency, next_check_date, now)
         bot.answer_callback_query(call.id, MESSAGES[lang]['goal_added'].format(frequency=frequency.capitalize()))
         bot.edit_message_text(
             MESSAGES[lang]['goal_added_successfully'].format(next_check_date=next_check_date.strftime('%Y-%m-%d %H:%M')),
@@ -104,47 +95,165 @@ def handle_goal_callbacks(bot, call):
     else:
         bot.answer_callback_query(call.id, MESSAGES[lang]['unknown_goal_action'])
 
-def save_goal_in_db(user_id, title, frequency, next_check_date):
+def save_goal_in_db(user_id, title, frequency, next_check_date, now=None):
     """
-    Saves the goal in the database.
+    Saves the goal in the database. created_at (`now`) anchors its check-ins.
+    Group-committed (see database.queue_write); returns a Future with the new goal id.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    now = datetime.now()
-    cursor.execute("""
+    now = now or datetime.now()
+    return queue_write("""
         INSERT INTO goals (user_id, title, frequency, next_check_date, status, created_at)
         VALUES (?, ?, ?, ?, 'in_progress', ?)
     """, (user_id, title, frequency, next_check_date, now))
-    conn.commit()
-    conn.close()
 
-def list_goals(user_id):
+def list_goals(user_id, limit=None, after_id=None, before_id=None):
     """
-    Retrieves a list of goals for the given user.
+    Retrieves the user's goals, newest first. With `limit`, returns one
+    keyset page: goals older than `after_id` or newer than `before_id`.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM goals WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    goals = cursor.fetchall()
-    conn.close()
-    return goals
+    return fetch_page('goals', user_id, limit, after_id, before_id)
 
 def mark_goal_done(user_id, goal_id):
     """
-    Marks the specified goal as done.
+    Marks the specified goal as done (group-committed; returns a Future with the rowcount).
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE goals SET status = 'done' WHERE id = ? AND user_id = ?", (goal_id, user_id))
-    conn.commit()
-    conn.close()
+    return queue_write("UPDATE goals SET status = 'done' WHERE id = ? AND user_id = ?", (goal_id, user_id))
 
 def delete_goal(user_id, goal_id):
     """
     Deletes the specified goal from the database.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id))
+
+
+# -------------------------------
+# Goal Check-In Engine
+# -------------------------------
+# The scheduler polls for due check-ins (scheduler.dispatch_goal_checkins).
+# process_due_goal_checkins() claims in-progress goals whose next_check_date
+# has passed in batches ordered by next_check_date (idx_goals_status_check),
+# advances the whole batch with one UPDATE, then sends each goal a
+# "done / still working" prompt. Check-ins are anchored on created_at with
+# calendar arithmetic: monthly goals created on Jan 31 are checked on Feb 28
+# (29), Mar 31, Apr 30, ...; seasonal is every 3 months, yearly every 12.
+# After downtime a goal is checked in once, not once per missed period.
+GOAL_DAY_STEPS = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+GOAL_MONTH_STEPS = {'monthly': 1, 'seasonal': 3, 'yearly': 12}
+
+GOAL_CHECKIN_BATCH_SIZE = 500
+
+DUE_GOALS_QUERY = """
+    SELECT g.id, g.user_id, g.title, g.frequency, g.created_at,
+           COALESCE(u.language, 'en') AS language
+    FROM goals g LEFT JOIN users u ON u.user_id = g.user_id
+    WHERE g.status = 'in_progress' AND g.next_check_date <= ?
+    ORDER BY g.next_check_date
+    LIMIT ?
+"""
+
+
+def _to_datetime(value):
+    """DATETIME columns come back as ISO strings; parse them (datetimes pass through)."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def add_months(value, months):
+    """Adds calendar months, clamping the day to the end of shorter months."""
+    year, month = divmod(value.month - 1 + months, 12)
+    year += value.year
+    month += 1
+    return value.replace(year=year, month=month, day=min(value.day, monthrange(year, month)[1]))
+
+
+def next_check_after(anchor, frequency, after):
+    """
+    Returns the first check-in of a goal anchored at `anchor` (its created_at)
+    that falls strictly after `after`.
+    """
+    if frequency in GOAL_DAY_STEPS:
+        step = GOAL_DAY_STEPS[frequency]
+        periods = max((after - anchor) // step, 0) + 1
+        return anchor + step * periods
+    step = GOAL_MONTH_STEPS[frequency]
+    periods = max(((after.year - anchor.year) * 12 + after.month - anchor.month) // step, 1)
+    next_check = add_months(anchor, periods * step)
+    while next_check <= after:
+        periods += 1
+        next_check = add_months(anchor, periods * step)
+    return next_check
+
+
+def send_goal_checkin(bot, chat_id, goal_id, title, lang='en'):
+    """Sends the check-in prompt for one goal with done / still working buttons; returns the send_message result."""
+    markup = types.InlineKeyboardMarkup()
+    btn_done = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_checkin_done'], callback_data=f"goal_done_{goal_id}")
+    btn_working = types.InlineKeyboardButton(text=MESSAGES[lang]['goal_checkin_working'],
+                                             callback_data=f"goal_working_{goal_id}")
+    markup.row(btn_done, btn_working)
+    return bot.send_message(chat_id, MESSAGES[lang]['goal_checkin'].format(title=title), reply_markup=markup)
+
+
+def _claim_due_goals(now, batch_size):
+    """
+    Selects one batch of due goals and moves each to its next check-in with a
+    single UPDATE, in one write transaction, so every check-in is claimed
+    exactly once. Returns the claimed rows.
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(DUE_GOALS_QUERY, (now, batch_size)).fetchall()
+        if not rows:
+            return []
+        next_dates = []
+        for row in rows:
+            next_dates.extend((row["id"], next_check_after(_to_datetime(row["created_at"]), row["frequency"], now)))
+        conn.execute(f"""
+            UPDATE goals
+            SET next_check_date = CASE id {' '.join('WHEN ? THEN ?' for _ in rows)} END
+            WHERE id IN ({', '.join('?' for _ in rows)})
+        """, next_dates + [row["id"] for row in rows])
+    return rows
+
+
+def process_due_goal_checkins(bot, now=None, batch_size=GOAL_CHECKIN_BATCH_SIZE):
+    """
+    Sends a check-in prompt for every in-progress goal whose next_check_date
+    has passed, one claimed batch at a time. Returns the number of prompts
+    queued (see outbound.track_delivery for their delivery).
+    """
+    now = now or datetime.now()
+    queued = 0
+    while True:
+        claimed = _claim_due_goals(now, batch_size)
+        for row in claimed:
+            lang = row["language"] if row["language"] in MESSAGES else 'en'
+            result = send_goal_checkin(bot, row["user_id"], row["id"], row["title"], lang)
+            track_delivery(result, 'goal_checkin', f"{row['id']} to user {row['user_id']}")
+            queued += 1
+        if len(claimed) < batch_size:
+            return queued
+
+
+def handle_goal_checkin_callback(bot, call, action, goal_id):
+    """
+    Handles the buttons of a check-in prompt: "done" completes the goal,
+    "working" keeps it in progress until its next check-in.
+    """
+    user_id = call.from_user.id
+    lang = get_user_language(user_id)
+    with db_connection() as conn:
+        goal = conn.execute("SELECT title, next_check_date FROM goals WHERE id = ? AND user_id = ?",
+                            (goal_id, user_id)).fetchone()
+    if goal is None:
+        bot.answer_callback_query(call.id, MESSAGES[lang]['unknown_goal_action'])
+        return
+    if action == 'done':
+        mark_goal_done(user_id, goal_id)
+        text = MESSAGES[lang]['goal_checkin_marked_done'].format(title=goal["title"])
+    else:
+        next_check_date = _to_datetime(goal["next_check_date"]).strftime('%Y-%m-%d %H:%M')
+        text = MESSAGES[lang]['goal_checkin_keep_going'].format(title=goal["title"], next_check_date=next_check_date)
+    bot.edit_message_text(text, call.message.chat.id, call.message.message_id)
+    bot.answer_callback_query(call.id)
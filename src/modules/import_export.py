@@ -0,0 +1,409 @@
+"""
+modules/import_export.py
+
+This module implements bulk import and export of a user's items
+(tasks, reminders, goals, countdowns and quotes), for users moving their
+data in from other tools or taking it out.
+
+File format (CSV with a header row, or JSON):
+  type          task | reminder | goal | countdown | quote
+  title         item title (the quote text for quotes)
+  date          task due date (optional), reminder time, goal next check-in
+                (optional), countdown event; Gregorian or Jalali, parsed by
+                date_conversion.parse_date ("YYYY/MM/DD HH:MM")
+  repeat        reminder repeat type (one_time, daily, every_x_hours,
+                every_x_days), goal frequency, countdown alerts (none,
+                daily, weekly)
+  repeat_value  hours/days for every_x_hours / every_x_days reminders
+  status        task pending|done, reminder active|done, goal
+                in_progress|done, countdown active|passed (optional)
+
+JSON may be a top-level array of such objects or one object per line.
+
+Import flow:
+1. /import asks for a document; the next uploaded .csv/.json file is imported
+   (any text message cancels).
+2. The file is downloaded from the Bot API into a spooled temporary file
+   (in memory up to IMPORT_SPOOL_BYTES, on disk beyond), then parsed record
+   by record and validated, with no database lock held. If any row is
+   invalid nothing is imported and the first IMPORT_MAX_ERRORS problems are
+   reported, so a corrected file can simply be uploaded again.
+3. The valid rows (at most IMPORT_MAX_BYTES of input) are inserted with
+   executemany in batches of IMPORT_BATCH_SIZE, all inside one write
+   transaction that is only opened once parsing is done.
+
+Export (/export [csv|json]) writes the same format, iterating each table's
+cursor into a temporary file that is then sent as a document.
+"""
+
+import csv
+import io
+import json
+import tempfile
+from concurrent.futures import Future
+from datetime import datetime
+from functools import partial
+
+import pytz
+import requests
+
+from database import db_connection
+from user_cache import get_user_language, get_user_timezone
+from state_store import StateStore
+from messages import MESSAGES
+from modules.date_conversion import parse_date
+from modules.goals import GOAL_DAY_STEPS, GOAL_MONTH_STEPS, next_check_after
+from modules.countdowns import countdown_schedule
+from modules.reminders import trigger_time_utc
+
+# Telegram only lets bots download files up to 20 MB.
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+IMPORT_SPOOL_BYTES = 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 10
+JSON_CHUNK_SIZE = 64 * 1024
+
+ITEM_FIELDS = ('type', 'title', 'date', 'repeat', 'repeat_value', 'status')
+ITEM_TYPES = ('task', 'reminder', 'goal', 'countdown', 'quote')
+IMPORT_FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'json'}
+
+REMINDER_REPEAT_TYPES = ('one_time', 'daily', 'every_x_hours', 'every_x_days')
+ITEM_STATUSES = {
+    'task': ('pending', 'done'),
+    'reminder': ('active', 'done'),
+    'goal': ('in_progress', 'done'),
+    'countdown': ('active', 'passed'),
+}
+
+INSERT_QUERIES = {
+    'task': """
+        INSERT INTO tasks (user_id, title, due_date, status, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    'reminder': """
+        INSERT INTO reminders (user_id, title, next_trigger_time, trigger_at_utc, repeat_type, repeat_value, status,
+                               created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'goal': """
+        INSERT INTO goals (user_id, title, frequency, next_check_date, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    'countdown': """
+        INSERT INTO countdowns (user_id, title, event_datetime, notify_schedule, status, event_at_utc,
+                                next_alert_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'quote': """
+        INSERT INTO quotes (user_id, quote_text, seq, created_at)
+        VALUES (?, ?, ?, ?)
+    """,
+}
+
+# Each query yields rows in ITEM_FIELDS order (without type), oldest first.
+EXPORT_QUERIES = {
+    'task': "SELECT title, due_date, NULL, NULL, status FROM tasks WHERE user_id = ? ORDER BY id",
+    'reminder': """
+        SELECT title, next_trigger_time, repeat_type, repeat_value, status
+        FROM reminders WHERE user_id = ? ORDER BY id
+    """,
+    'goal': "SELECT title, next_check_date, frequency, NULL, status FROM goals WHERE user_id = ? ORDER BY id",
+    'countdown': """
+        SELECT title, event_datetime, notify_schedule, NULL, status
+        FROM countdowns WHERE user_id = ? ORDER BY id
+    """,
+    'quote': "SELECT quote_text, NULL, NULL, NULL, NULL FROM quotes WHERE user_id = ? ORDER BY seq",
+}
+
+# Bounded, persisted store of users waiting to upload an import file (see state_store.py).
+import_states = StateStore('imports')
+
+# -------------------------------
+# Reading Import Files
+# -------------------------------
+def _csv_records(stream):
+    """Yields (position, record) for each data row of a CSV stream."""
+    reader = csv.DictReader(stream)
+    for line_number, record in enumerate(reader, start=2):
+        yield f"line {line_number}", record
+
+def _json_records(stream):
+    """
+    Yields (position, record) for each object of a JSON array or of JSON
+    Lines, decoding the stream incrementally, JSON_CHUNK_SIZE at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, number = '', 0, 0
+    while True:
+        # Skip whitespace and the array brackets / commas between objects.
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position == len(buffer):
+            buffer, position = stream.read(JSON_CHUNK_SIZE), 0
+            if not buffer:
+                return
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            chunk = stream.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError(f"item {number + 1}: invalid JSON ({e.msg})") from e
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        number += 1
+        yield f"item {number}", record
+        position = end
+
+def _field(record, name):
+    value = record.get(name)
+    return '' if value is None else str(value).strip()
+
+def _parse_optional_date(value):
+    return parse_date(value) if value else None
+
+def _item_row(user_id, record, now, quote_number, user_tz):
+    """
+    Validates one import record and returns (type, insert parameters).
+    Reminder and countdown dates are in the user's timezone, `user_tz`. Quote rows carry
+    their position in the file, `quote_number`, as seq; import_items() adds
+    the user's existing quote count.
+    Raises ValueError describing the problem.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("expected an object with type, title, date, ... fields")
+    item_type = _field(record, 'type').lower()
+    if item_type not in ITEM_TYPES:
+        raise ValueError(f"unknown type '{item_type}' (expected one of {', '.join(ITEM_TYPES)})")
+    title = _field(record, 'title')
+    if not title:
+        raise ValueError("title is required")
+    repeat = _field(record, 'repeat').lower()
+    status = _field(record, 'status').lower()
+    if item_type in ITEM_STATUSES:
+        status = status or ITEM_STATUSES[item_type][0]
+        if status not in ITEM_STATUSES[item_type]:
+            raise ValueError(f"status must be one of {', '.join(ITEM_STATUSES[item_type])}")
+    date_value = _field(record, 'date')
+
+    if item_type == 'task':
+        return item_type, (user_id, title, _parse_optional_date(date_value), status, now)
+
+    if item_type == 'reminder':
+        if not date_value:
+            raise ValueError("date is required for reminders")
+        repeat = repeat or 'one_time'
+        if repeat not in REMINDER_REPEAT_TYPES:
+            raise ValueError(f"repeat must be one of {', '.join(REMINDER_REPEAT_TYPES)}")
+        repeat_value = None
+        if repeat in ('every_x_hours', 'every_x_days'):
+            repeat_value = _field(record, 'repeat_value')
+            if not repeat_value.isdigit() or int(repeat_value) < 1:
+                raise ValueError(f"repeat_value must be a positive whole number for {repeat}")
+            repeat_value = int(repeat_value)
+        next_trigger_time = parse_date(date_value)
+        return item_type, (user_id, title, next_trigger_time, trigger_time_utc(next_trigger_time, user_tz),
+                           repeat, repeat_value, status, now)
+
+    if item_type == 'goal':
+        if repeat not in GOAL_DAY_STEPS and repeat not in GOAL_MONTH_STEPS:
+            raise ValueError("repeat must be the goal frequency (daily, weekly, monthly, seasonal, yearly)")
+        next_check_date = _parse_optional_date(date_value) or next_check_after(now, repeat, now)
+        return item_type, (user_id, title, repeat, next_check_date, status, now)
+
+    if item_type == 'countdown':
+        if not date_value:
+            raise ValueError("date is required for countdowns")
+        repeat = repeat or 'none'
+        if repeat not in ('none', 'daily', 'weekly'):
+            raise ValueError("repeat must be one of none, daily, weekly")
+        event_datetime = parse_date(date_value)
+        event_at_utc, next_alert = countdown_schedule(event_datetime, repeat, user_tz,
+                                                      datetime.now(pytz.utc).replace(tzinfo=None))
+        if status != 'active':
+            next_alert = None
+        return item_type, (user_id, title, event_datetime, repeat, status, event_at_utc, next_alert, now)
+
+    return item_type, (user_id, title, quote_number, now)
+
+def import_items(user_id, stream, file_format, now=None):
+    """
+    Imports every record of a text stream in `file_format` ('csv' or 'json')
+    for the user, in one transaction. Returns {type: count}. Raises ValueError
+    listing the first problems found; nothing is imported in that case.
+    The stream is parsed and validated before the transaction is opened.
+    """
+    now = now or datetime.now()
+    user_tz = get_user_timezone(user_id)
+    records = _csv_records(stream) if file_format == 'csv' else _json_records(stream)
+    rows = {item_type: [] for item_type in ITEM_TYPES}
+    errors = []
+    try:
+        for position, record in records:
+            try:
+                item_type, row = _item_row(user_id, record, now, len(rows['quote']), user_tz)
+            except ValueError as e:
+                errors.append(f"{position}: {e}")
+                if len(errors) >= IMPORT_MAX_ERRORS:
+                    break
+                continue
+            rows[item_type].append(row)
+    except (ValueError, csv.Error, UnicodeDecodeError) as e:
+        errors.append(str(e))
+    if errors:
+        raise ValueError("\n".join(errors))
+
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if rows['quote']:
+            deck = conn.execute("SELECT quote_count FROM quote_decks WHERE user_id = ?", (user_id,)).fetchone()
+            quote_base = deck["quote_count"] if deck else 0
+            rows['quote'] = [(uid, text, quote_base + number, created_at)
+                             for uid, text, number, created_at in rows['quote']]
+        for item_type, batch in rows.items():
+            for start in range(0, len(batch), IMPORT_BATCH_SIZE):
+                conn.executemany(INSERT_QUERIES[item_type], batch[start:start + IMPORT_BATCH_SIZE])
+        if rows['quote']:
+            conn.execute("""
+                INSERT INTO quote_decks (user_id, quote_count) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET quote_count = quote_count + excluded.quote_count
+            """, (user_id, len(rows['quote'])))
+    return {item_type: len(batch) for item_type, batch in rows.items() if batch}
+
+def _download(url):
+    """
+    Downloads `url` into a SpooledTemporaryFile, rewound for reading.
+    Returns None if it is larger than IMPORT_MAX_BYTES.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    with requests.get(url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            spooled.write(chunk)
+            if spooled.tell() > IMPORT_MAX_BYTES:
+                spooled.close()
+                return None
+    spooled.seek(0)
+    return spooled
+
+def import_document(bot, message):
+    """
+    Downloads the uploaded document from the Bot API and imports it.
+    Replies with the per-type counts or the problems found.
+    """
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    lang = get_user_language(user_id)
+    document = message.document
+    file_name = (document.file_name or '').lower()
+    file_format = next((fmt for ext, fmt in IMPORT_FORMATS.items() if file_name.endswith(ext)), None)
+    if file_format is None:
+        bot.send_message(chat_id, MESSAGES[lang]['import_unsupported_file'])
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        bot.send_message(chat_id, MESSAGES[lang]['import_too_large'])
+        return
+    import_states.pop(user_id, None)
+
+    try:
+        spooled = _download(bot.get_file_url(document.file_id))
+    except requests.RequestException as e:
+        # The file URL embeds the bot token, so only the error type is logged.
+        print(f"Failed to download import file for user {user_id}: {type(e).__name__}")
+        bot.send_message(chat_id, MESSAGES[lang]['import_download_failed'])
+        return
+    if spooled is None:
+        bot.send_message(chat_id, MESSAGES[lang]['import_too_large'])
+        return
+    try:
+        with spooled:
+            # utf-8-sig also accepts the byte order mark spreadsheet tools write.
+            stream = io.TextIOWrapper(spooled, encoding='utf-8-sig', newline='')
+            counts = import_items(user_id, stream, file_format)
+    except ValueError as e:
+        bot.send_message(chat_id, MESSAGES[lang]['import_failed'].format(errors=e))
+        return
+    summary = ", ".join(f"{count} {item_type}" for item_type, count in counts.items()) or "0"
+    bot.send_message(chat_id, MESSAGES[lang]['import_done'].format(summary=summary))
+
+def start_import(bot, chat_id, user_id):
+    """Starts the /import flow: asks the user to upload a CSV or JSON file."""
+    lang = get_user_language(user_id)
+    import_states[user_id] = {'state': 'awaiting_document', 'data': {}}
+    bot.send_message(chat_id, MESSAGES[lang]['import_prompt'])
+
+def handle_import_messages(bot, message):
+    """A text message while waiting for the upload cancels the import."""
+    user_id = message.from_user.id
+    import_states.pop(user_id, None)
+    bot.send_message(message.chat.id, MESSAGES[get_user_language(user_id)]['import_cancelled'])
+
+# -------------------------------
+# Export
+# -------------------------------
+def _export_value(value):
+    """Dates are exported as "YYYY-MM-DD HH:MM", which parse_date reads back."""
+    if isinstance(value, str) and len(value) >= 16 and value[4] == '-' and value[10] in ' T':
+        try:
+            return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M')
+        except ValueError:
+            return value
+    return value
+
+def _export_rows(conn, user_id):
+    """Yields export records (ITEM_FIELDS tuples), streaming each table's cursor."""
+    for item_type, query in EXPORT_QUERIES.items():
+        for row in conn.execute(query, (user_id,)):
+            yield (item_type,) + tuple(_export_value(value) for value in row)
+
+def export_items(user_id, out, file_format):
+    """
+    Writes all of the user's items to the text stream `out` as CSV or a JSON
+    array. Returns the number of items written.
+    """
+    count = 0
+    with db_connection() as conn:
+        rows = _export_rows(conn, user_id)
+        if file_format == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(ITEM_FIELDS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            out.write('[')
+            for row in rows:
+                out.write(',\n' if count else '\n')
+                json.dump({field: value for field, value in zip(ITEM_FIELDS, row) if value is not None},
+                          out, ensure_ascii=False)
+                count += 1
+            out.write('\n]\n')
+    return count
+
+def _report_export_failure(bot, chat_id, lang, future):
+    if future.exception() is not None:
+        bot.send_message(chat_id, MESSAGES[lang]['export_failed'])
+
+def send_export(bot, chat_id, user_id, file_format='csv'):
+    """
+    Exports the user's items to a temporary file and sends it as a document.
+    The upload is queued (outbound.QueuedTeleBot), so it gets the file's
+    bytes rather than the file, which is closed before it runs; the user is
+    told if it fails.
+    """
+    lang = get_user_language(user_id)
+    with tempfile.TemporaryFile() as raw:
+        out = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        count = export_items(user_id, out, file_format)
+        out.flush()
+        out.detach()
+        if not count:
+            bot.send_message(chat_id, MESSAGES[lang]['export_empty'])
+            return
+        raw.seek(0)
+        data = raw.read()
+    sent = bot.send_document(chat_id, data, visible_file_name=f"remindino_export.{file_format}",
+                             caption=MESSAGES[lang]['export_caption'].format(count=count))
+    if isinstance(sent, Future):
+        sent.add_done_callback(partial(_report_export_failure, bot, chat_id, lang))
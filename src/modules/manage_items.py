@@ -0,0 +1,128 @@
+"""
+modules/manage_items.py
+
+This module implements the paginated Manage Items view.
+A category (tasks, reminders, goals, countdowns, quotes) is shown as one message with
+MANAGE_PAGE_SIZE numbered items, a numbered delete button per item, and
+newer/older buttons that edit the same message in place. Pages come from the
+keyset-paginated list_* queries, so only one page of rows is read per view.
+
+Callback data:
+  - page_<kind>_n_<id>        older items than id (next page)
+  - page_<kind>_p_<id>        newer items than id (previous page)
+  - delete_<item>_<id>_<top>  delete item id, then redraw the page that
+                              starts below top (the page it was shown on)
+"""
+
+from collections import namedtuple
+
+from telebot import types
+
+from messages import MESSAGES
+from user_cache import get_user_language
+from modules.tasks import list_tasks
+from modules.goals import list_goals
+from modules.reminders import list_reminders
+from modules.countdowns import list_countdowns
+from modules.quotes import list_quotes
+
+MANAGE_PAGE_SIZE = 8
+DELETE_BUTTONS_PER_ROW = 4
+
+ManageKind = namedtuple('ManageKind', 'item list_items describe title_key title empty_key empty')
+
+MANAGE_KINDS = {
+    'tasks': ManageKind(
+        'task', list_tasks, lambda row: f"{row['title']} (Due: {row['due_date'] or 'No due date'})",
+        'manage_tasks', "Manage Tasks", 'no_tasks_found', "No tasks found."),
+    'reminders': ManageKind(
+        'reminder', list_reminders, lambda row: f"{row['title']} (Next: {row['next_trigger_time']})",
+        'manage_reminders', "Manage Reminders", 'no_reminders_found', "No reminders found."),
+    'goals': ManageKind(
+        'goal', list_goals, lambda row: row['title'],
+        'manage_goals', "Manage Goals", 'no_goals_found', "No goals found."),
+    'countdowns': ManageKind(
+        'countdown', list_countdowns, lambda row: f"{row['title']} (Event: {row['event_datetime']})",
+        'manage_countdowns', "Manage Countdowns", 'no_countdowns_found', "No countdowns found."),
+    'quotes': ManageKind(
+        'quote', list_quotes, lambda row: row['quote_text'],
+        'manage_quotes', "Manage Quotes", 'no_quotes_found', "No quotes found."),
+}
+
+
+def render_manage_page(user_id, kind, after_id=None, before_id=None):
+    """
+    Builds (text, markup) for one page of the user's items of `kind`.
+    markup is None when the user has no items at all.
+    """
+    spec = MANAGE_KINDS[kind]
+    lang = get_user_language(user_id)
+    # One extra row tells whether there is a further page in that direction.
+    rows = spec.list_items(user_id, MANAGE_PAGE_SIZE + 1, after_id, before_id)
+    if before_id is not None:
+        has_newer, has_older = len(rows) > MANAGE_PAGE_SIZE, True
+        rows = rows[-MANAGE_PAGE_SIZE:]
+    else:
+        has_newer, has_older = after_id is not None, len(rows) > MANAGE_PAGE_SIZE
+        rows = rows[:MANAGE_PAGE_SIZE]
+    if not rows:
+        if after_id is not None or before_id is not None:
+            # The page emptied (e.g. its items were deleted); show the first page.
+            return render_manage_page(user_id, kind)
+        return MESSAGES[lang].get(spec.empty_key, spec.empty), None
+
+    lines = [MESSAGES[lang].get(spec.title_key, spec.title)]
+    top = rows[0]['id'] + 1
+    buttons = []
+    for number, row in enumerate(rows, start=1):
+        lines.append(f"{number}. {spec.describe(row)}")
+        buttons.append(types.InlineKeyboardButton(
+            text=f"🗑 {number}", callback_data=f"delete_{spec.item}_{row['id']}_{top}"))
+    markup = types.InlineKeyboardMarkup(row_width=DELETE_BUTTONS_PER_ROW)
+    markup.add(*buttons)
+    navigation = []
+    if has_newer:
+        navigation.append(types.InlineKeyboardButton(
+            text=MESSAGES[lang].get('page_prev', "◀️ Newer"), callback_data=f"page_{kind}_p_{rows[0]['id']}"))
+    if has_older:
+        navigation.append(types.InlineKeyboardButton(
+            text=MESSAGES[lang].get('page_next', "Older ▶️"), callback_data=f"page_{kind}_n_{rows[-1]['id']}"))
+    if navigation:
+        markup.row(*navigation)
+    markup.row(types.InlineKeyboardButton(
+        text=MESSAGES[lang].get('back_to_main_menu', "Back to Main Menu"), callback_data="back_main"))
+    return "\n".join(lines), markup
+
+
+def send_manage_page(bot, chat_id, user_id, kind):
+    """Sends the first page of the user's items of `kind` as a new message."""
+    text, markup = render_manage_page(user_id, kind)
+    return bot.send_message(chat_id, text, reply_markup=markup)
+
+
+def edit_manage_page(bot, call, kind, after_id=None, before_id=None):
+    """
+    Redraws the page shown in call.message in place. Redrawing an unchanged
+    page (a double tap) is not an error, see outbound.OutboundDispatcher.
+    """
+    text, markup = render_manage_page(call.from_user.id, kind, after_id, before_id)
+    return bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+
+
+def handle_page_callback(bot, call, kind, args):
+    """Handles page_<kind>_<n|p>_<id>: moves the list to the older/newer page."""
+    direction, _, anchor = args.partition('_')
+    if kind not in MANAGE_KINDS or not anchor.isdigit():
+        bot.answer_callback_query(call.id)
+        return
+    if direction == 'n':
+        edit_manage_page(bot, call, kind, after_id=int(anchor))
+    else:
+        edit_manage_page(bot, call, kind, before_id=int(anchor))
+    bot.answer_callback_query(call.id)
+
+
+def parse_delete_args(args):
+    """Splits delete callback args "<id>_<top>" into (item_id, top); top is None for old buttons."""
+    item_id, _, top = args.partition('_')
+    return int(item_id), (int(top) if top.isdigit() else None)
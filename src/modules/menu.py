@@ -1,6 +1,7 @@
 # modules/menu.py
 
 from telebot import types
+from templates import keyboard, keyboard_markup, render
 
 # Dictionary of menu labels for bilingual support.
 MENU_LABELS = {
@@ -30,16 +31,10 @@ MENU_LABELS = {
     }
 }
 
-def send_main_menu(bot, chat_id, user_lang='en'):
-    """
-    Sends the Main Menu to the user with localized options.
-    
-    Parameters:
-      - bot: The TeleBot instance.
-      - chat_id: The Telegram chat ID.
-      - user_lang: The user's language code ('en' or 'fa'), defaults to 'en'.
-    """
-    labels = MENU_LABELS.get(user_lang, MENU_LABELS['en'])
+@keyboard('main_menu')
+def main_menu_keyboard(lang):
+    """Builds the Main Menu keyboard in `lang` (cached by templates.keyboard_markup)."""
+    labels = MENU_LABELS[lang]
     markup = types.InlineKeyboardMarkup(row_width=2)
     
     btn_add_task = types.InlineKeyboardButton(text=labels['add_task'], callback_data="menu_add_task")
@@ -58,36 +53,16 @@ def send_main_menu(bot, chat_id, user_lang='en'):
     markup.row(btn_weekly_schedule, btn_view_summary)
     markup.row(btn_manage_items, btn_quotes)
     markup.row(btn_settings)
-    
-    bot.send_message(chat_id, labels['main_menu'], reply_markup=markup)
+    return markup
 
-def register_menu_handlers(bot):
+def send_main_menu(bot, chat_id, user_lang='en'):
     """
-    Registers a basic callback query handler for main menu selections.
-    This is a placeholder handler to be overridden or expanded in your main bot file.
+    Sends the Main Menu to the user with localized options.
+    
+    Parameters:
+      - bot: The TeleBot instance.
+      - chat_id: The Telegram chat ID.
+      - user_lang: The user's language code ('en' or 'fa'), defaults to 'en'.
     """
-    @bot.callback_query_handler(func=lambda call: call.data.startswith("menu_"))
-    def handle_menu(call):
-        chat_id = call.message.chat.id
-        data = call.data
-        # For demonstration, simply send a placeholder message.
-        if data == "menu_add_task":
-            bot.send_message(chat_id, "You selected Add Task. [Placeholder for tasks module]")
-        elif data == "menu_add_goal":
-            bot.send_message(chat_id, "You selected Add Goal. [Placeholder for goals module]")
-        elif data == "menu_add_reminder":
-            bot.send_message(chat_id, "You selected Add Reminder. [Placeholder for reminders module]")
-        elif data == "menu_add_countdown":
-            bot.send_message(chat_id, "You selected Add Countdown. [Placeholder for countdowns module]")
-        elif data == "menu_weekly_schedule":
-            bot.send_message(chat_id, "You selected Weekly Schedule. [Placeholder for weekly schedule module]")
-        elif data == "menu_view_summary":
-            bot.send_message(chat_id, "You selected View Summary. [Placeholder for summaries module]")
-        elif data == "menu_manage_items":
-            bot.send_message(chat_id, "You selected Manage Items. [Placeholder for items management module]")
-        elif data == "menu_quotes":
-            bot.send_message(chat_id, "You selected Quotes. [Placeholder for quotes module]")
-        elif data == "menu_settings":
-            bot.send_message(chat_id, "You selected Settings. [Placeholder for settings module]")
-        else:
-            bot.send_message(chat_id, "Unknown menu option selected.")
+    bot.send_message(chat_id, render(user_lang, 'main_menu', catalog='menu'),
+                     reply_markup=keyboard_markup('main_menu', user_lang))
@@ -2,8 +2,13 @@
 modules/quotes.py
 
 This module implements the Quotes functionality.
-It allows users to add personal quotes, list all their quotes,
-and retrieve a random quote (for inclusion in summaries or check-ins).
+It allows users to add personal quotes, list and delete their quotes
+(see manage_items.py), and retrieve a random quote (for inclusion in summaries or check-ins).
+
+Random quotes (see the sampler section below) are drawn in O(1) by position:
+every quote carries a dense per-user position `seq` (0..count-1) and the
+per-user count lives in quote_decks, so a draw is a primary-key read plus one
+(user_id, seq) index lookup instead of sorting every quote with ORDER BY RANDOM().
 
 Quote Addition Flow:
 1. The bot initiates the add-quote conversation when the user selects the Quotes option.
@@ -13,23 +18,26 @@ Quote Addition Flow:
 5. Confirmation is sent back to the user.
 """
 
+import os
+import random
 from datetime import datetime
+from math import gcd
+from dotenv import load_dotenv
 from telebot import types
-from database import get_db_connection
+from database import db_connection, fetch_page, queue_write
+from user_cache import get_user_language
+from state_store import StateStore
 from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_messages
 from messages import MESSAGES
 
-# Global dictionary to track the quote addition conversation state per user.
-quotes_states = {}
+load_dotenv()
+
+# Draw summary quotes from a per-user shuffle deck, so users cycle through all
+# their quotes before any repeats (otherwise every draw is independent).
+QUOTE_NO_REPEAT = os.getenv('QUOTE_NO_REPEAT', '0') == '1'
 
-def get_user_language(user_id):
-    """Retrieves the user's language from the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 'en'
+# Bounded, persisted store of the quote addition conversation state per user (see state_store.py).
+quotes_states = StateStore('quotes')
 
 def start_add_quote(bot, chat_id, user_id):
     """
@@ -68,55 +76,121 @@ def handle_quote_messages(bot, message):
 
 def save_quote_in_db(user_id, quote_text):
     """
-    Saves a quote in the database under the user's record.
+    Saves a quote in the database under the user's record, at the next
+    position, and bumps the user's quote count. Group-committed (see
+    database.queue_write); returns a Future with the new quote id.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     now = datetime.now()
-    cursor.execute("""
-        INSERT INTO quotes (user_id, quote_text, created_at)
-        VALUES (?, ?, ?)
-    """, (user_id, quote_text, now))
-    conn.commit()
-    conn.close()
 
-def list_quotes(user_id):
+    def insert_quote(conn):
+        # Runs inside the writer's write transaction, so the count cannot change underneath.
+        count = _quote_count(conn, user_id)
+        quote_id = conn.execute("""
+            INSERT INTO quotes (user_id, quote_text, created_at, seq)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, quote_text, now, count)).lastrowid
+        conn.execute("""
+            INSERT INTO quote_decks (user_id, quote_count) VALUES (?, 1)
+            ON CONFLICT (user_id) DO UPDATE SET quote_count = quote_count + 1
+        """, (user_id,))
+        return quote_id
+
+    return queue_write(insert_quote)
+
+def list_quotes(user_id, limit=None, after_id=None, before_id=None):
     """
-    Retrieves a list of quotes for the given user.
-    Returns a list of sqlite3.Row objects.
+    Retrieves the user's quotes, newest first. With `limit`, returns one
+    keyset page: quotes older than `after_id` or newer than `before_id`.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM quotes WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    quotes = cursor.fetchall()
-    conn.close()
-    return quotes
+    return fetch_page('quotes', user_id, limit, after_id, before_id)
 
 def delete_quote(user_id, quote_id):
     """
-    Deletes a specific quote from the database.
+    Deletes a specific quote from the database (Manage Items). The user's
+    last quote moves into the freed position, so positions stay dense.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM quotes WHERE id = ? AND user_id = ?", (quote_id, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT seq FROM quotes WHERE id = ? AND user_id = ?", (quote_id, user_id)).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM quotes WHERE id = ?", (quote_id,))
+        last = _quote_count(conn, user_id) - 1
+        if row["seq"] != last:
+            conn.execute("UPDATE quotes SET seq = ? WHERE user_id = ? AND seq = ?", (row["seq"], user_id, last))
+        conn.execute("UPDATE quote_decks SET quote_count = ? WHERE user_id = ?", (last, user_id))
 
-def get_random_quote(user_id):
+def get_random_quote(user_id, no_repeat=False):
     """
     Retrieves a random quote for the given user from the 'quotes' table.
+    With no_repeat, quotes are dealt from the user's shuffle deck.
     Returns the quote text if found, otherwise None.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT quote_text 
-        FROM quotes 
-        WHERE user_id = ? 
-        ORDER BY RANDOM() LIMIT 1
-    """, (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        seq = draw_quote_seq(conn, user_id, no_repeat)
+        if seq is None:
+            return None
+        row = conn.execute("SELECT quote_text FROM quotes WHERE user_id = ? AND seq = ?", (user_id, seq)).fetchone()
     if row:
         return row["quote_text"]
     return None
+
+# -------------------------------
+# Quote Sampler
+# -------------------------------
+# quote_decks keeps, per user, the quote count and a shuffle deck. A deck is
+# the permutation position -> (deck_step * position + deck_offset) % count
+# with deck_step coprime to count: it visits every position exactly once per
+# cycle and needs three integers of state however many quotes there are.
+# Adding or deleting a quote changes the count and starts a new deck.
+
+def _quote_count(conn, user_id):
+    row = conn.execute("SELECT quote_count FROM quote_decks WHERE user_id = ?", (user_id,)).fetchone()
+    return row["quote_count"] if row else 0
+
+def _new_deck(count):
+    """Returns a random (step, offset) for a deck over `count` positions."""
+    step = random.randrange(1, count) if count > 1 else 1
+    while gcd(step, count) != 1:
+        step = random.randrange(1, count)
+    return step, random.randrange(count)
+
+def draw_quote_seq(conn, user_id, no_repeat=False):
+    """
+    Returns the position of a random quote of the user, or None if they have
+    none. Plain draws only read the count; no_repeat draws deal the next card
+    of the user's deck (a small write).
+    """
+    deck = conn.execute("SELECT * FROM quote_decks WHERE user_id = ?", (user_id,)).fetchone()
+    if deck is None or deck["quote_count"] == 0:
+        return None
+    count = deck["quote_count"]
+    if not no_repeat:
+        return random.randrange(count)
+    step, offset, position = deck["deck_step"], deck["deck_offset"], deck["deck_position"]
+    if deck["deck_size"] != count or position >= count:
+        step, offset = _new_deck(count)
+        position = 0
+    conn.execute("""
+        UPDATE quote_decks SET deck_size = ?, deck_step = ?, deck_offset = ?, deck_position = ?
+        WHERE user_id = ?
+    """, (count, step, offset, position + 1, user_id))
+    return (step * position + offset) % count
+
+def reindex_quotes(conn):
+    """
+    Assigns dense positions (in insertion order) to every quote and rebuilds
+    the per-user counts; used by the migration that introduced them and by
+    bulk loaders that insert quotes directly.
+    """
+    rows = conn.execute("SELECT id, user_id FROM quotes ORDER BY user_id, id").fetchall()
+    positions = []
+    counts = {}
+    for row in rows:
+        seq = counts.get(row["user_id"], 0)
+        counts[row["user_id"]] = seq + 1
+        positions.append((seq, row["id"]))
+    conn.execute("UPDATE quotes SET seq = NULL")
+    conn.executemany("UPDATE quotes SET seq = ? WHERE id = ?", positions)
+    conn.execute("DELETE FROM quote_decks")
+    conn.executemany("INSERT INTO quote_decks (user_id, quote_count) VALUES (?, ?)", counts.items())
@@ -18,6 +18,8 @@ Integration:
 import random
 from telebot import types
 from messages import MESSAGES
+from user_cache import get_user_language
+from templates import keyboard, keyboard_markup, render
 
 # A simple dictionary holding check-in labels for English (en) and Persian (fa).
 CHECKIN_LABELS = {
@@ -49,21 +51,10 @@ CHECKIN_LABELS = {
     }
 }
 
-def get_user_language(user_id):
-    """A quick helper to retrieve the user's language from the database."""
-    from database import get_db_connection
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 'en'
-
-def send_random_checkin(bot, chat_id, user_id, user_lang='en'):
-    """
-    Sends a random check-in message to the user with inline options, in the user's language.
-    """
-    labels = CHECKIN_LABELS.get(user_lang, CHECKIN_LABELS['en'])
+@keyboard('random_checkin')
+def checkin_keyboard(lang):
+    """Builds the check-in quick action keyboard in `lang` (cached by templates.keyboard_markup)."""
+    labels = CHECKIN_LABELS[lang]
 
     markup = types.InlineKeyboardMarkup()
     btn_add_task = types.InlineKeyboardButton(text=labels['add_task'], callback_data="random_add_task")
@@ -76,9 +67,14 @@ def send_random_checkin(bot, chat_id, user_id, user_lang='en'):
     markup.row(btn_add_task, btn_add_goal)
     markup.row(btn_add_reminder, btn_add_countdown)
     markup.add(btn_ignore)
-    
-    message_text = labels['prompt']
-    bot.send_message(chat_id, message_text, reply_markup=markup)
+    return markup
+
+def send_random_checkin(bot, chat_id, user_id, user_lang='en'):
+    """
+    Sends a random check-in message to the user with inline options, in the user's language.
+    """
+    message_text = render(user_lang, 'prompt', catalog='checkin')
+    bot.send_message(chat_id, message_text, reply_markup=keyboard_markup('random_checkin', user_lang))
 
 def handle_random_checkin_callback(bot, call):
     """
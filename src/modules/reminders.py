@@ -1,29 +1,23 @@
 import sqlite3
 from datetime import datetime, timedelta
+import pytz
 from telebot import types
-from database import get_db_connection
+from database import db_connection, fetch_page, queue_write
+from user_cache import get_user_language, get_user_timezone
+from state_store import StateStore
 from modules.date_conversion import parse_date  # Supports both Gregorian and Jalali date inputs
 from messages import MESSAGES
+from templates import keyboard, keyboard_markup, render
 
 # New import from our flow helpers.
 from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_messages
+from outbound import track_delivery
 
 # Import the messages dictionary from the main bot.
 
 
-# Global dictionary to track reminder conversation state per user.
-reminders_states = {}
-
-def get_user_language(user_id):
-    """
-    Retrieves the user's language from the database.
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 'en'
+# Bounded, persisted store of reminder conversation state per user (see state_store.py).
+reminders_states = StateStore('reminders')
 
 def start_add_reminder(bot, chat_id, user_id):
     """
@@ -49,19 +43,19 @@ def handle_reminder_callbacks(bot, call):
     # Handle time preset selection when state is 'awaiting_time_option'
     if current_state == 'awaiting_time_option':
         if call.data == "rem_time_1hr":
-            next_trigger_time = datetime.now() + timedelta(hours=1)
+            next_trigger_time = _local_now(user_id) + timedelta(hours=1)
             data['next_trigger_time'] = next_trigger_time
             reminders_states[user_id]['state'] = 'awaiting_repeat_choice'
             bot.edit_message_text(MESSAGES[lang]['reminder_time_set_1hr'], chat_id, call.message.message_id)
             prompt_repeat_choice(bot, chat_id, user_id)
         elif call.data == "rem_time_2hrs":
-            next_trigger_time = datetime.now() + timedelta(hours=2)
+            next_trigger_time = _local_now(user_id) + timedelta(hours=2)
             data['next_trigger_time'] = next_trigger_time
             reminders_states[user_id]['state'] = 'awaiting_repeat_choice'
             bot.edit_message_text(MESSAGES[lang]['reminder_time_set_2hrs'], chat_id, call.message.message_id)
             prompt_repeat_choice(bot, chat_id, user_id)
         elif call.data == "rem_time_tomorrow":
-            next_trigger_time = datetime.now() + timedelta(days=1)
+            next_trigger_time = _local_now(user_id) + timedelta(days=1)
             data['next_trigger_time'] = next_trigger_time
             reminders_states[user_id]['state'] = 'awaiting_repeat_choice'
             bot.edit_message_text(MESSAGES[lang]['reminder_time_set_tomorrow'], chat_id, call.message.message_id)
@@ -96,11 +90,9 @@ def handle_reminder_callbacks(bot, call):
     else:
         bot.answer_callback_query(call.id, MESSAGES[lang]['no_reminder_action'])
 
-def prompt_time_options(bot, chat_id, user_id):
-    """
-    Sends an inline keyboard for time preset options.
-    """
-    lang = get_user_language(user_id)
+@keyboard('reminder_time_options')
+def time_options_keyboard(lang):
+    """Builds the time preset keyboard in `lang` (cached by templates.keyboard_markup)."""
     markup = types.InlineKeyboardMarkup()
     btn_1hr = types.InlineKeyboardButton(text=MESSAGES[lang]['in_1_hour'], callback_data="rem_time_1hr")
     btn_2hrs = types.InlineKeyboardButton(text=MESSAGES[lang]['in_2_hours'], callback_data="rem_time_2hrs")
@@ -108,13 +100,19 @@ def prompt_time_options(bot, chat_id, user_id):
     btn_custom = types.InlineKeyboardButton(text=MESSAGES[lang]['custom'], callback_data="rem_time_custom")
     markup.row(btn_1hr, btn_2hrs)
     markup.row(btn_tomorrow, btn_custom)
-    tracked_send_message(chat_id, user_id, MESSAGES[lang]['prompt_reminder_time'], reply_markup=markup)
+    return markup
 
-def prompt_repeat_choice(bot, chat_id, user_id):
+def prompt_time_options(bot, chat_id, user_id):
     """
-    Sends an inline keyboard for repeat type options.
+    Sends an inline keyboard for time preset options.
     """
     lang = get_user_language(user_id)
+    tracked_send_message(chat_id, user_id, render(lang, 'prompt_reminder_time'),
+                         reply_markup=keyboard_markup('reminder_time_options', lang))
+
+@keyboard('reminder_repeat_choice')
+def repeat_choice_keyboard(lang):
+    """Builds the repeat type keyboard in `lang` (cached by templates.keyboard_markup)."""
     markup = types.InlineKeyboardMarkup()
     btn_one_time = types.InlineKeyboardButton(text=MESSAGES[lang]['one_time'], callback_data="rem_repeat_one_time")
     btn_every_hours = types.InlineKeyboardButton(text=MESSAGES[lang]['every_x_hours'], callback_data="rem_repeat_every_hours")
@@ -122,7 +120,15 @@ def prompt_repeat_choice(bot, chat_id, user_id):
     btn_daily = types.InlineKeyboardButton(text=MESSAGES[lang]['daily'], callback_data="rem_repeat_daily")
     markup.row(btn_one_time, btn_daily)
     markup.row(btn_every_hours, btn_every_days)
-    tracked_send_message(chat_id, user_id, MESSAGES[lang]['prompt_repeat_choice'], reply_markup=markup)
+    return markup
+
+def prompt_repeat_choice(bot, chat_id, user_id):
+    """
+    Sends an inline keyboard for repeat type options.
+    """
+    lang = get_user_language(user_id)
+    tracked_send_message(chat_id, user_id, render(lang, 'prompt_repeat_choice'),
+                         reply_markup=keyboard_markup('reminder_repeat_choice', lang))
 
 def handle_reminder_messages(bot, message):
     """
@@ -190,35 +196,31 @@ def finalize_reminder(bot, chat_id, user_id):
 
 def save_reminder_in_db(user_id, title, next_trigger_time, repeat_type, repeat_value):
     """
-    Saves the reminder in the database.
+    Saves the reminder in the database (group-committed, see database.queue_write),
+    with its trigger time in UTC (see trigger_time_utc).
+    Returns a Future with the new reminder id.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     now = datetime.now()
-    cursor.execute("""
-        INSERT INTO reminders (user_id, title, next_trigger_time, repeat_type, repeat_value, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, title, next_trigger_time, repeat_type, repeat_value, now))
-    conn.commit()
-    conn.close()
+    trigger_at_utc = trigger_time_utc(next_trigger_time, get_user_timezone(user_id))
+    return queue_write("""
+        INSERT INTO reminders (user_id, title, next_trigger_time, trigger_at_utc, repeat_type, repeat_value, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, title, next_trigger_time, trigger_at_utc, repeat_type, repeat_value, now))
 
-def list_reminders(user_id):
+def list_reminders(user_id, limit=None, after_id=None, before_id=None):
     """
-    Retrieves a list of reminders for the given user.
+    Retrieves the user's reminders, newest first. With `limit`, returns one
+    keyset page: reminders older than `after_id` or newer than `before_id`.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM reminders WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    reminders = cursor.fetchall()
-    conn.close()
-    return reminders
+    return fetch_page('reminders', user_id, limit, after_id, before_id)
 
 def update_reminder(user_id, reminder_id, **kwargs):
     """
-    Updates a reminder with given keyword arguments.
+    Updates a reminder with given keyword arguments (group-committed; returns a Future).
+    A new next_trigger_time also moves trigger_at_utc.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if 'next_trigger_time' in kwargs:
+        kwargs['trigger_at_utc'] = trigger_time_utc(kwargs['next_trigger_time'], get_user_timezone(user_id))
     fields = []
     values = []
     for key, value in kwargs.items():
@@ -227,16 +229,181 @@ def update_reminder(user_id, reminder_id, **kwargs):
     values.append(reminder_id)
     values.append(user_id)
     sql = f"UPDATE reminders SET {', '.join(fields)} WHERE id = ? AND user_id = ?"
-    cursor.execute(sql, tuple(values))
-    conn.commit()
-    conn.close()
+    return queue_write(sql, tuple(values))
 
 def delete_reminder(user_id, reminder_id):
     """
     Deletes a reminder from the database.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM reminders WHERE id = ? AND user_id = ?", (reminder_id, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM reminders WHERE id = ? AND user_id = ?", (reminder_id, user_id))
+
+def reschedule_reminders(user_id):
+    """
+    Recomputes trigger_at_utc for the user's active reminders from their
+    cached timezone, e.g. after a timezone change. Returns the number updated.
+    """
+    user_tz = get_user_timezone(user_id)
+    with db_connection() as conn:
+        rows = conn.execute("SELECT id, next_trigger_time FROM reminders WHERE user_id = ? AND status = 'active'",
+                            (user_id,)).fetchall()
+        updates = [(trigger_time_utc(_to_datetime(row["next_trigger_time"]), user_tz), row["id"]) for row in rows]
+        conn.executemany("UPDATE reminders SET trigger_at_utc = ? WHERE id = ?", updates)
+    return len(updates)
+
+# -------------------------------
+# Reminder Delivery Engine
+# -------------------------------
+# The scheduler polls for due reminders (scheduler.dispatch_due_reminders) and
+# process_due_reminders() claims them in batches ordered by trigger_at_utc,
+# served by idx_reminders_status_trigger_utc. next_trigger_time is what the
+# user chose, in their timezone; trigger_at_utc is the same moment in UTC, so
+# polls compare it against UTC now whatever the user's or server's timezone.
+# Claiming a batch advances every recurring reminder to its first occurrence
+# after now (or marks one-time ones done) in a single UPDATE, before anything
+# is sent. Occurrences step in the user's local time (a daily reminder keeps
+# its clock time across DST changes). After downtime a recurring reminder
+# therefore fires once, not once per missed occurrence.
+REMINDER_BATCH_SIZE = 200
+
+# Reminders delivered later than this also say when they were due.
+REMINDER_LATE_AFTER = timedelta(minutes=5)
+
+DUE_REMINDERS_QUERY = """
+    SELECT r.id, r.user_id, r.title, r.next_trigger_time, r.trigger_at_utc, r.repeat_type, r.repeat_value,
+           COALESCE(u.language, 'en') AS language, COALESCE(u.timezone, 'UTC') AS timezone
+    FROM reminders r LEFT JOIN users u ON u.user_id = r.user_id
+    WHERE r.status = 'active' AND r.trigger_at_utc <= ?
+    ORDER BY r.trigger_at_utc
+    LIMIT ?
+"""
+
+
+def _to_datetime(value):
+    """DATETIME columns come back as ISO strings; parse them (datetimes pass through)."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _utcnow():
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+
+def _local_now(user_id):
+    """The user's current local time, naive like the times they type."""
+    return datetime.now(get_user_timezone(user_id)).replace(tzinfo=None)
+
+
+def _timezone(name):
+    try:
+        return pytz.timezone(name or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
+
+def trigger_time_utc(next_trigger_time, user_tz):
+    """Converts a naive next_trigger_time in `user_tz` (a pytz timezone) to naive UTC."""
+    return user_tz.localize(next_trigger_time).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def repeat_interval(repeat_type, repeat_value):
+    """
+    Returns the timedelta between occurrences of a reminder, or None for
+    one-time reminders (and recurring ones with an unusable repeat_value).
+    """
+    if repeat_type == 'daily':
+        return timedelta(days=1)
+    if repeat_type in ('every_x_hours', 'every_x_days'):
+        try:
+            value = int(repeat_value)
+        except (TypeError, ValueError):
+            return None
+        if value <= 0:
+            return None
+        return timedelta(hours=value) if repeat_type == 'every_x_hours' else timedelta(days=value)
+    return None
+
+
+def next_occurrence(trigger_time, interval, now):
+    """
+    Returns the first occurrence after `now` on the reminder's own schedule
+    (trigger_time + k * interval), skipping every occurrence that was missed.
+    """
+    missed = (now - trigger_time) // interval
+    return trigger_time + interval * (max(missed, 0) + 1)
+
+
+def send_reminder_message(bot, chat_id, title, user_lang='en', due_time=None):
+    """
+    Sends a reminder to the user. When due_time is given (late delivery,
+    e.g. after downtime) the message also says when it was due. Returns the
+    bot's send_message result (a Future when queued by the dispatcher).
+    """
+    if due_time is None:
+        text = MESSAGES[user_lang]['reminder_due'].format(title=title)
+    else:
+        text = MESSAGES[user_lang]['reminder_due_late'].format(title=title, due=due_time.strftime('%Y-%m-%d %H:%M'))
+    return bot.send_message(chat_id, text)
+
+
+def _claim_due_reminders(now, batch_size):
+    """
+    Selects one batch of due reminders and advances them with one UPDATE,
+    all in one write transaction, so each occurrence is claimed exactly once.
+    `now` is naive UTC. Returns [(row, trigger_at_utc)].
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(DUE_REMINDERS_QUERY, (now, batch_size)).fetchall()
+        if not rows:
+            return []
+        claimed = []
+        next_times = []
+        next_utc_times = []
+        done_ids = []
+        for row in rows:
+            trigger_at_utc = _to_datetime(row["trigger_at_utc"])
+            interval = repeat_interval(row["repeat_type"], row["repeat_value"])
+            if interval is None:
+                next_times.extend((row["id"], row["next_trigger_time"]))
+                next_utc_times.extend((row["id"], row["trigger_at_utc"]))
+                done_ids.append(row["id"])
+            else:
+                # Step in local time by as many intervals as UTC says were missed.
+                steps = (next_occurrence(trigger_at_utc, interval, now) - trigger_at_utc) // interval
+                next_time = _to_datetime(row["next_trigger_time"]) + interval * steps
+                next_times.extend((row["id"], next_time))
+                next_utc_times.extend((row["id"], trigger_time_utc(next_time, _timezone(row["timezone"]))))
+            claimed.append((row, trigger_at_utc))
+        ids = [row["id"] for row in rows]
+        cases = ' '.join('WHEN ? THEN ?' for _ in rows)
+        conn.execute(f"""
+            UPDATE reminders
+            SET next_trigger_time = CASE id {cases} END,
+                trigger_at_utc = CASE id {cases} END,
+                status = CASE WHEN id IN ({', '.join('?' for _ in done_ids)}) THEN 'done' ELSE status END
+            WHERE id IN ({', '.join('?' for _ in ids)})
+        """, next_times + next_utc_times + done_ids + ids)
+    return claimed
+
+
+def process_due_reminders(bot, now=None, batch_size=REMINDER_BATCH_SIZE):
+    """
+    Queues every reminder whose trigger time has passed, one claimed batch at
+    a time; `now` is naive UTC. Returns the number of reminders queued;
+    deliveries and failures are counted (and failures logged) by
+    outbound.track_delivery.
+    """
+    now = now or _utcnow()
+    queued = 0
+    while True:
+        claimed = _claim_due_reminders(now, batch_size)
+        for row, trigger_at_utc in claimed:
+            # Late reminders say when they were due, in the user's own time.
+            late = now - trigger_at_utc > REMINDER_LATE_AFTER
+            due_time = _to_datetime(row["next_trigger_time"]) if late else None
+            result = send_reminder_message(bot, row["user_id"], row["title"], row["language"], due_time)
+            track_delivery(result, 'reminder', f"{row['id']} to user {row['user_id']}")
+            queued += 1
+        if len(claimed) < batch_size:
+            return queued
@@ -9,13 +9,57 @@ It generates a summary report for the user that includes:
   - Optionally, a random quote (if any exists for the user)
 
 Key functions:
+  - load_summary_data(user_id, now=None): Fetches every section in one query and returns typed rows.
+  - render_summary(data, user_lang='en', now=None): Formats loaded summary data (localized).
   - generate_summary(user_id, user_lang='en'): Returns a formatted summary string (localized).
   - send_summary(bot, chat_id, user_id, user_lang='en'): Sends the summary to the user.
   - get_random_quote(user_id): Retrieves a random quote from the database.
 """
 
+from collections import namedtuple
 from datetime import datetime, timedelta
-from database import get_db_connection
+from database import db_connection
+from modules.quotes import QUOTE_NO_REPEAT, draw_quote_seq, get_random_quote as _get_random_quote
+
+# Typed rows returned by load_summary_data().
+SummaryTask = namedtuple('SummaryTask', ['title', 'due_date'])
+SummaryGoal = namedtuple('SummaryGoal', ['title', 'frequency', 'next_check_date'])
+SummaryReminder = namedtuple('SummaryReminder', ['title', 'next_trigger_time'])
+SummaryCountdown = namedtuple('SummaryCountdown', ['title', 'event_datetime'])
+SummaryWeeklyEvent = namedtuple('SummaryWeeklyEvent', ['title', 'day_of_week', 'time_of_day'])
+SummaryData = namedtuple('SummaryData', ['tasks', 'goals', 'reminders', 'countdowns', 'weekly_events', 'quote'])
+
+# Section ids used as the first column of SUMMARY_QUERY.
+SECTION_TASKS, SECTION_GOALS, SECTION_REMINDERS, SECTION_COUNTDOWNS, SECTION_WEEKLY, SECTION_QUOTE = range(6)
+
+# Every summary section in one round trip. Each branch selects its section id
+# and an explicit sort key (negated for newest-first sections, with the
+# negated row id breaking ties), and the outer ORDER BY groups and sorts the
+# rows; SQLite does not promise the order of UNION ALL branches or of ORDER BY
+# inside subqueries. The quote is picked by position: a random seq below the
+# user's quote_count (or :quote_seq, dealt from the user's shuffle deck when
+# QUOTE_NO_REPEAT is on), fetched via the (user_id, seq) index.
+SUMMARY_QUERY = """
+    SELECT 0 AS section, -julianday(created_at) AS sort_key, -id AS tie, title, due_date AS a, NULL AS b
+    FROM tasks WHERE user_id = :user_id AND status = 'pending'
+    UNION ALL
+    SELECT 1, -julianday(created_at), -id, title, frequency, next_check_date
+    FROM goals WHERE user_id = :user_id AND status = 'in_progress'
+    UNION ALL
+    SELECT 2, julianday(next_trigger_time), id, title, next_trigger_time, NULL
+    FROM reminders WHERE user_id = :user_id AND next_trigger_time BETWEEN :now AND :next_day
+    UNION ALL
+    SELECT 3, -julianday(created_at), -id, title, event_datetime, NULL
+    FROM countdowns WHERE user_id = :user_id
+    UNION ALL
+    SELECT 4, -julianday(created_at), -id, title, day_of_week, time_of_day
+    FROM weekly_schedule WHERE user_id = :user_id
+    UNION ALL
+    SELECT 5, 0, 0, quote_text, NULL, NULL
+    FROM quotes WHERE user_id = :user_id AND seq = COALESCE(:quote_seq, (
+        SELECT ABS(RANDOM()) % quote_count FROM quote_decks WHERE user_id = :user_id AND quote_count > 0))
+    ORDER BY section, sort_key, tie
+"""
 
 # A dictionary for localized summary labels:
 SUMMARY_LABELS = {
@@ -59,115 +103,104 @@ SUMMARY_LABELS = {
     }
 }
 
-def generate_summary(user_id, user_lang='en'):
+def _to_datetime(value):
     """
-    Generates a localized summary string for the given user.
+    Converts a stored DATETIME value to a datetime.
+    Values that are not ISO formatted are returned unchanged.
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+def _format_datetime(value):
+    """Formats a loaded datetime as YYYY-MM-DD HH:MM (non-datetimes pass through)."""
+    if isinstance(value, datetime):
+        return value.isoformat(" ", "minutes")
+    return value
+
+def load_summary_data(user_id, now=None):
+    """
+    Fetches every summary section for the user in a single query on one connection.
+    Returns a SummaryData of typed rows with DATETIME columns already parsed.
+    """
+    now = now or datetime.now()
+    params = {'user_id': user_id, 'now': now, 'next_day': now + timedelta(days=1), 'quote_seq': None}
+    with db_connection() as conn:
+        if QUOTE_NO_REPEAT:
+            params['quote_seq'] = draw_quote_seq(conn, user_id, no_repeat=True)
+        rows = conn.execute(SUMMARY_QUERY, params).fetchall()
+
+    tasks, goals, reminders, countdowns, weekly_events = [], [], [], [], []
+    quote = None
+    for section, _, _, title, a, b in rows:
+        if section == SECTION_TASKS:
+            tasks.append(SummaryTask(title, _to_datetime(a)))
+        elif section == SECTION_GOALS:
+            goals.append(SummaryGoal(title, a, _to_datetime(b)))
+        elif section == SECTION_REMINDERS:
+            reminders.append(SummaryReminder(title, _to_datetime(a)))
+        elif section == SECTION_COUNTDOWNS:
+            countdowns.append(SummaryCountdown(title, _to_datetime(a)))
+        elif section == SECTION_WEEKLY:
+            weekly_events.append(SummaryWeeklyEvent(title, a, b))
+        elif section == SECTION_QUOTE:
+            quote = title
+    return SummaryData(tasks, goals, reminders, countdowns, weekly_events, quote)
+
+def render_summary(data, user_lang='en', now=None):
+    """
+    Renders loaded SummaryData as a localized summary string.
+    Does no database access.
     """
     labels = SUMMARY_LABELS.get(user_lang, SUMMARY_LABELS['en'])
     summary_lines = []
-    now = datetime.now()
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    now = now or datetime.now()
+
     # --- Pending Tasks ---
-    cursor.execute("""
-        SELECT title, due_date 
-        FROM tasks 
-        WHERE user_id = ? AND status = 'pending' 
-        ORDER BY created_at DESC
-    """, (user_id,))
-    tasks = cursor.fetchall()
-    if tasks:
+    if data.tasks:
         summary_lines.append(labels['pending_tasks'])
-        for task in tasks:
-            title = task["title"]
-            due_date = task["due_date"]
-            if due_date:
-                try:
-                    due_dt = datetime.strptime(due_date, "%Y-%m-%d %H:%M:%S")
-                    due_str = due_dt.strftime("%Y-%m-%d %H:%M")
-                except Exception:
-                    due_str = due_date
+        for task in data.tasks:
+            if task.due_date:
+                due_str = _format_datetime(task.due_date)
             else:
                 due_str = ("No due date" if user_lang == 'en' else "بدون موعد")
-            summary_lines.append(f"- {title}\n  (Due: {due_str})")
+            summary_lines.append(f"- {task.title}\n  (Due: {due_str})")
     else:
         summary_lines.append(labels['no_pending_tasks'])
-    
+
     # --- Active Goals ---
-    cursor.execute("""
-        SELECT title, frequency, next_check_date 
-        FROM goals 
-        WHERE user_id = ? AND status = 'in_progress' 
-        ORDER BY created_at DESC
-    """, (user_id,))
-    goals = cursor.fetchall()
-    if goals:
+    if data.goals:
         summary_lines.append(f"\n{labels['goals_in_progress']}")
-        for goal in goals:
-            title = goal["title"]
-            frequency = goal["frequency"]
-            next_check_date = goal["next_check_date"]
+        for goal in data.goals:
             if user_lang == 'fa':
-                if frequency == 'daily': freq_str = labels['daily_frequency']
-                elif frequency == 'weekly': freq_str = labels['weekly_frequency']
-                elif frequency == 'monthly': freq_str = labels['monthly_frequency']
-                elif frequency == 'seasonal': freq_str = labels['seasonal_frequency']
-                elif frequency == 'yearly': freq_str = labels['yearly_frequency']
-                else: freq_str = frequency
+                freq_str = labels.get(f"{goal.frequency}_frequency", goal.frequency)
             else:
-                freq_str = frequency.capitalize()
-            if next_check_date:
-                try:
-                    next_check_dt = datetime.strptime(next_check_date, "%Y-%m-%d %H:%M:%S")
-                    next_check_str = next_check_dt.strftime("%Y-%m-%d %H:%M")
-                except Exception:
-                    next_check_str = next_check_date
+                freq_str = goal.frequency.capitalize()
+            if goal.next_check_date:
+                next_check_str = _format_datetime(goal.next_check_date)
             else:
                 next_check_str = ("N/A" if user_lang == 'en' else "نامشخص")
-            summary_lines.append(f"- {title}\n  ({freq_str} | Next: {next_check_str})")
+            summary_lines.append(f"- {goal.title}\n  ({freq_str} | Next: {next_check_str})")
     else:
         summary_lines.append(f"\n{labels['no_goals']}")
-    
+
     # --- Upcoming Reminders (Next 24 hours) ---
-    next_day = now + timedelta(days=1)
-    cursor.execute("""
-        SELECT title, next_trigger_time 
-        FROM reminders 
-        WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ? 
-        ORDER BY next_trigger_time ASC
-    """, (user_id, now, next_day))
-    reminders = cursor.fetchall()
-    if reminders:
+    if data.reminders:
         summary_lines.append(f"\n{labels['upcoming_reminders']}")
-        for rem in reminders:
-            title = rem["title"]
-            trigger_time = rem["next_trigger_time"]
-            try:
-                trigger_dt = datetime.strptime(trigger_time, "%Y-%m-%d %H:%M:%S")
-                trigger_str = trigger_dt.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                trigger_str = trigger_time
-            summary_lines.append(f"- {title}\n  (At: {trigger_str})")
+        for rem in data.reminders:
+            summary_lines.append(f"- {rem.title}\n  (At: {_format_datetime(rem.next_trigger_time)})")
     else:
         summary_lines.append(f"\n{labels['no_reminders']}")
-    
+
     # --- Countdowns ---
-    cursor.execute("""
-        SELECT title, event_datetime 
-        FROM countdowns 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC
-    """, (user_id,))
-    countdowns = cursor.fetchall()
-    if countdowns:
+    if data.countdowns:
         summary_lines.append(f"\n{labels['countdowns']}")
-        for cd in countdowns:
-            title = cd["title"]
-            event_datetime = cd["event_datetime"]
-            try:
-                event_dt = datetime.strptime(event_datetime, "%Y-%m-%d %H:%M:%S")
+        for cd in data.countdowns:
+            event_dt = cd.event_datetime
+            if isinstance(event_dt, datetime):
                 delta = event_dt - now
                 if delta.total_seconds() < 0:
                     time_left = labels['event_passed']
@@ -179,40 +212,34 @@ def generate_summary(user_id, user_lang='en'):
                         time_left = f"{days}d {hours}h {minutes}m left"
                     else:
                         time_left = f"{days}روز {hours}ساعت {minutes}دقیقه باقی‌مانده"
-            except Exception:
-                time_left = event_datetime
-            summary_lines.append(f"- {title}\n  {time_left}")
+            else:
+                time_left = event_dt
+            summary_lines.append(f"- {cd.title}\n  {time_left}")
     else:
         summary_lines.append(f"\n{labels['no_countdowns']}")
-    
+
     # --- Weekly Schedule ---
-    cursor.execute("""
-        SELECT title, day_of_week, time_of_day 
-        FROM weekly_schedule 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC
-    """, (user_id,))
-    weekly_events = cursor.fetchall()
-    if weekly_events:
+    if data.weekly_events:
         summary_lines.append(f"\n{labels['weekly_schedule']}")
-        for event in weekly_events:
-            title = event["title"]
-            day = event["day_of_week"]
-            time_of_day = event["time_of_day"]
-            summary_lines.append(f"- {title}\n  on {day} at {time_of_day}")
+        for event in data.weekly_events:
+            summary_lines.append(f"- {event.title}\n  on {event.day_of_week} at {event.time_of_day}")
     else:
         summary_lines.append(f"\n{labels['no_weekly_events']}")
-    
-    conn.close()
-    
+
     # --- Optional Random Quote ---
-    quote = get_random_quote(user_id)
-    if quote:
+    if data.quote:
         summary_lines.append(f"\n{labels['quote_of_the_day']}")
-        summary_lines.append(f"_{quote}_")
-    
+        summary_lines.append(f"_{data.quote}_")
+
     return "\n".join(summary_lines)
 
+def generate_summary(user_id, user_lang='en'):
+    """
+    Generates a localized summary string for the given user.
+    """
+    now = datetime.now()
+    return render_summary(load_summary_data(user_id, now), user_lang, now)
+
 def send_summary(bot, chat_id, user_id, user_lang='en'):
     """
     Generates and sends the summary report to the user (localized by user_lang).
@@ -222,19 +249,7 @@ def send_summary(bot, chat_id, user_id, user_lang='en'):
 
 def get_random_quote(user_id):
     """
-    Retrieves a random quote for the given user from the 'quotes' table.
-    Returns the quote text if found, otherwise None.
+    Retrieves a random quote for the given user through the quote sampler
+    in modules/quotes.py. Returns the quote text if found, otherwise None.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT quote_text 
-        FROM quotes 
-        WHERE user_id = ? 
-        ORDER BY RANDOM() LIMIT 1
-    """, (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return row["quote_text"]
-    return None
+    return _get_random_quote(user_id, QUOTE_NO_REPEAT)
@@ -1,7 +1,9 @@
 import sqlite3
 from datetime import datetime, timedelta
 from telebot import types
-from database import get_db_connection
+from database import db_connection, fetch_page, queue_write
+from user_cache import get_user_language
+from state_store import StateStore
 from modules.date_conversion import parse_date  # Supports both Gregorian and Jalali date inputs
 from messages import MESSAGES
 
@@ -11,19 +13,8 @@ from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_
 # Import the messages dictionary from the main bot.
 
 
-# Global dictionary to track task conversation state per user.
-tasks_states = {}
-
-def get_user_language(user_id):
-    """
-    Retrieves the user's language from the database.
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else 'en'
+# Bounded, persisted store of task conversation state per user (see state_store.py).
+tasks_states = StateStore('tasks')
 
 def start_add_task(bot, chat_id, user_id):
     """
@@ -120,45 +111,32 @@ def handle_task_messages(bot, message):
 
 def save_task_in_db(user_id, title, due_date):
     """
-    Saves the task in the database.
+    Saves the task in the database (group-committed, see database.queue_write).
+    Returns a Future with the new task id.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     now = datetime.now()
-    cursor.execute("""
+    return queue_write("""
         INSERT INTO tasks (user_id, title, description, due_date, status, created_at)
         VALUES (?, ?, ?, ?, 'pending', ?)
     """, (user_id, title, None, due_date, now))
-    conn.commit()
-    conn.close()
 
-def list_tasks(user_id):
+def list_tasks(user_id, limit=None, after_id=None, before_id=None):
     """
-    Retrieves a list of tasks for the given user.
+    Retrieves the user's tasks, newest first. With `limit`, returns one
+    keyset page: tasks older than `after_id` or newer than `before_id`.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    tasks = cursor.fetchall()
-    conn.close()
-    return tasks
+    return fetch_page('tasks', user_id, limit, after_id, before_id)
 
 def mark_task_done(user_id, task_id):
     """
-    Marks the specified task as done.
+    Marks the specified task as done (group-committed; returns a Future with the rowcount).
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE tasks SET status = 'done' WHERE id = ? AND user_id = ?", (task_id, user_id))
-    conn.commit()
-    conn.close()
+    return queue_write("UPDATE tasks SET status = 'done' WHERE id = ? AND user_id = ?", (task_id, user_id))
 
 def delete_task(user_id, task_id):
     """
     Deletes the specified task from the database.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id))
@@ -1,10 +1,14 @@
 # modules/weekly_schedule.py
 
 import sqlite3
-from datetime import datetime
+from datetime import datetime, time, timedelta
+import pytz
 from telebot import types
-from database import get_db_connection
+from database import db_connection, queue_write
+from state_store import StateStore
+from user_cache import get_user_profile
 from flow_helpers import tracked_send_message, tracked_user_message, clear_flow_messages
+from outbound import track_delivery
 
 # Bilingual messages for the weekly schedule module.
 WEEKLY_MSG = {
@@ -48,8 +52,27 @@ DAYS_OF_WEEK_FA = [
     ("یکشنبه", "Sunday")
 ]
 
-# Global dictionary to store weekly event conversation state per user.
-weekly_states = {}
+WEEKDAY_NUMBERS = {day: number for number, (day, _) in enumerate(DAYS_OF_WEEK)}
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+# Weekly event reminders are sent this long before the event starts.
+WEEKLY_REMINDER_LEAD = timedelta(minutes=30)
+# Reminders found later than this (e.g. after downtime) are skipped, not sent late.
+WEEKLY_REMINDER_GRACE = timedelta(minutes=5)
+# Due weekly events claimed per transaction by the poller.
+WEEKLY_BATCH_SIZE = 200
+
+DUE_WEEKLY_EVENTS_QUERY = """
+    SELECT w.id, w.user_id, w.title, w.day_of_week, w.time_of_day, w.next_fire_utc,
+           COALESCE(u.timezone, 'UTC') AS timezone
+    FROM weekly_schedule w LEFT JOIN users u ON u.user_id = w.user_id
+    WHERE w.next_fire_utc <= ?
+    ORDER BY w.next_fire_utc
+    LIMIT ?
+"""
+
+# Bounded, persisted store of weekly event conversation state per user (see state_store.py).
+weekly_states = StateStore('weekly')
 
 def start_add_weekly_event(bot, chat_id, user_id, user_lang='en'):
     """
@@ -134,55 +157,182 @@ def handle_weekly_event_callbacks(bot, call):
     else:
         bot.answer_callback_query(call.id, "Unknown weekly event action.")
 
+def _user_timezone_name(user_id):
+    profile = get_user_profile(user_id)
+    return profile.timezone if profile and profile.timezone else "UTC"
+
+def _utcnow():
+    return datetime.now(pytz.utc).replace(tzinfo=None)
+
+def next_weekly_fire(day_of_week, time_of_day, user_tz, after):
+    """
+    Returns the first occurrence (naive UTC) of the weekly slot
+    (day_of_week, "HH:MM" in user_tz) strictly after `after`, a naive UTC
+    datetime, or None for a malformed day or time.
+    """
+    weekday = WEEKDAY_NUMBERS.get(day_of_week)
+    try:
+        hour, minute = map(int, time_of_day.split(":"))
+        event_time = time(hour, minute)
+    except (AttributeError, ValueError):
+        return None
+    if weekday is None:
+        return None
+    try:
+        tz = pytz.timezone(user_tz or "UTC")
+    except pytz.UnknownTimeZoneError:
+        tz = pytz.utc
+    local_after = pytz.utc.localize(after).astimezone(tz)
+    day = local_after.date() + timedelta(days=(weekday - local_after.weekday()) % 7)
+    while True:
+        local_fire = tz.normalize(tz.localize(datetime.combine(day, event_time)))
+        fire = local_fire.astimezone(pytz.utc).replace(tzinfo=None)
+        if fire > after:
+            return fire
+        day += timedelta(days=7)
+
 def save_weekly_event_in_db(user_id, title, day_of_week, time_of_day):
     """
-    Saves the weekly event in the database.
+    Saves the weekly event in the database together with its next occurrence.
+    Group-committed (see database.queue_write); returns a Future with the new id.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    next_fire = next_weekly_fire(day_of_week, time_of_day, _user_timezone_name(user_id), _utcnow())
     now = datetime.now()
-    cursor.execute("""
-        INSERT INTO weekly_schedule (user_id, title, day_of_week, time_of_day, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, title, day_of_week, time_of_day, now))
-    conn.commit()
-    conn.close()
+    return queue_write("""
+        INSERT INTO weekly_schedule (user_id, title, day_of_week, time_of_day, created_at, next_fire_utc)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user_id, title, day_of_week, time_of_day, now, next_fire))
 
 def list_weekly_events(user_id):
     """
     Retrieves a list of weekly events for the given user.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM weekly_schedule WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    events = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM weekly_schedule WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
+        events = cursor.fetchall()
     return events
 
 def update_weekly_event(user_id, event_id, **kwargs):
     """
     Updates a weekly event with the given keyword arguments.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    fields = []
-    values = []
-    for key, value in kwargs.items():
-        fields.append(f"{key} = ?")
-        values.append(value)
-    values.append(event_id)
-    values.append(user_id)
-    sql = f"UPDATE weekly_schedule SET {', '.join(fields)} WHERE id = ? AND user_id = ?"
-    cursor.execute(sql, tuple(values))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        fields = []
+        values = []
+        for key, value in kwargs.items():
+            fields.append(f"{key} = ?")
+            values.append(value)
+        values.append(event_id)
+        values.append(user_id)
+        sql = f"UPDATE weekly_schedule SET {', '.join(fields)} WHERE id = ? AND user_id = ?"
+        cursor.execute(sql, tuple(values))
+    if 'day_of_week' in kwargs or 'time_of_day' in kwargs:
+        reschedule_weekly_events(user_id, event_id=event_id)
 
 def delete_weekly_event(user_id, event_id):
     """
     Deletes the specified weekly event from the database.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM weekly_schedule WHERE id = ? AND user_id = ?", (event_id, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM weekly_schedule WHERE id = ? AND user_id = ?", (event_id, user_id))
+
+def reschedule_weekly_events(user_id, user_tz=None, event_id=None):
+    """
+    Recomputes next_fire_utc for the user's weekly events (or
+    only event_id), e.g. after a timezone change. Returns the number updated.
+    """
+    user_tz = user_tz or _user_timezone_name(user_id)
+    now = _utcnow()
+    with db_connection() as conn:
+        if event_id is None:
+            rows = conn.execute("SELECT id, day_of_week, time_of_day FROM weekly_schedule WHERE user_id = ?",
+                                (user_id,)).fetchall()
+        else:
+            rows = conn.execute("SELECT id, day_of_week, time_of_day FROM weekly_schedule "
+                                "WHERE id = ? AND user_id = ?", (event_id, user_id)).fetchall()
+        updates = [(next_weekly_fire(row["day_of_week"], row["time_of_day"], user_tz, now), row["id"])
+                   for row in rows]
+        conn.executemany("UPDATE weekly_schedule SET next_fire_utc = ? WHERE id = ?", updates)
+    return len(updates)
+
+# -------------------------------
+# Reminders and tomorrow's events
+# -------------------------------
+def _to_datetime(value):
+    """DATETIME columns come back as ISO strings; parse them (datetimes pass through)."""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+def send_weekly_event_reminder(bot, chat_id, title, event_time_str):
+    """
+    Sends a reminder message for a weekly event; returns the send_message result.
+    """
+    return bot.send_message(chat_id,
+                     f"Reminder: Your weekly event '{title}' is scheduled to start at {event_time_str} (in 30 minutes).")
+
+def _claim_due_weekly_events(horizon, batch_size):
+    """
+    Selects one batch of weekly events starting before `horizon` and advances
+    each to its next occurrence, in one write transaction, so every
+    occurrence is claimed exactly once. Returns [(row, fire_time)].
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(DUE_WEEKLY_EVENTS_QUERY, (horizon, batch_size)).fetchall()
+        claimed = []
+        updates = []
+        for row in rows:
+            fire_time = _to_datetime(row["next_fire_utc"])
+            next_fire = next_weekly_fire(row["day_of_week"], row["time_of_day"], row["timezone"],
+                                         max(fire_time, horizon - WEEKLY_REMINDER_LEAD))
+            updates.append((next_fire, row["id"]))
+            claimed.append((row, fire_time))
+        conn.executemany("UPDATE weekly_schedule SET next_fire_utc = ? WHERE id = ?", updates)
+    return claimed
+
+def process_due_weekly_events(bot, now=None, batch_size=WEEKLY_BATCH_SIZE):
+    """
+    Sends the heads-up for every weekly event starting within
+    WEEKLY_REMINDER_LEAD: a single range query on next_fire_utc across all
+    users. Occurrences whose reminder is more than WEEKLY_REMINDER_GRACE late
+    are skipped. Returns the number of reminders queued (see
+    outbound.track_delivery for their delivery).
+    """
+    now = now or _utcnow()
+    horizon = now + WEEKLY_REMINDER_LEAD
+    queued = 0
+    while True:
+        claimed = _claim_due_weekly_events(horizon, batch_size)
+        for row, fire_time in claimed:
+            if now - (fire_time - WEEKLY_REMINDER_LEAD) > WEEKLY_REMINDER_GRACE:
+                continue
+            result = send_weekly_event_reminder(bot, row["user_id"], row["title"], row["time_of_day"])
+            track_delivery(result, 'weekly_event', f"{row['id']} to user {row['user_id']}")
+            queued += 1
+        if len(claimed) < batch_size:
+            return queued
+
+def tomorrow_weekly_events(user_tz, now=None):
+    """
+    Returns (tomorrow_weekday, {user_id: [rows]}) with the weekly events of
+    every onboarded user in user_tz that occur tomorrow in that timezone,
+    found with one range query on next_fire_utc.
+    """
+    tz = pytz.timezone(user_tz)
+    local_now = (now or datetime.now(pytz.utc)).astimezone(tz)
+    tomorrow = local_now.date() + timedelta(days=1)
+    start = tz.localize(datetime.combine(tomorrow, time())).astimezone(pytz.utc).replace(tzinfo=None)
+    end = tz.localize(datetime.combine(tomorrow + timedelta(days=1), time())).astimezone(pytz.utc).replace(tzinfo=None)
+    with db_connection() as conn:
+        rows = conn.execute("""
+            SELECT w.user_id, w.title, w.time_of_day
+            FROM weekly_schedule w JOIN users u ON u.user_id = w.user_id
+            WHERE w.next_fire_utc >= ? AND w.next_fire_utc < ? AND u.onboarded = 1 AND u.timezone = ?
+            ORDER BY w.next_fire_utc
+        """, (start, end, user_tz)).fetchall()
+    events = {}
+    for row in rows:
+        events.setdefault(row["user_id"], []).append(row)
+    return tomorrow.strftime("%A"), events
@@ -0,0 +1,419 @@
+"""
+outbound.py
+
+Rate-limited, prioritized dispatch of outgoing Telegram messages.
+
+Every Bot API call a handler or job makes to a chat (send_message,
+send_document, edit_message_text, delete_message) and every
+answer_callback_query goes through one OutboundDispatcher:
+  - a global token bucket (Telegram allows about 30 requests/second per bot)
+    and one token bucket per chat (about 1 message/second, with a small burst;
+    callback answers have no chat and only take a global token);
+  - calls to the same chat are made one at a time, in the order they were
+    dispatched, so replies keep their order with several workers;
+  - priority lanes, so interactive replies are sent before bulk digests that
+    scheduler jobs fan out to thousands of users;
+  - 429 handling: the retry_after returned by Telegram pauses the buckets and
+    the message is queued again instead of being lost;
+  - an edit that leaves the message as it was (a 400 "message is not
+    modified", e.g. a double-tapped button) completes with True instead of
+    failing;
+  - a pool of worker threads draining the queue; the time each message
+    waited is recorded per lane in metrics.OUTBOUND_WAIT.
+
+QueuedTeleBot's queued methods return a Future with the call's result instead
+of waiting for it, so a handler never holds its update lane while a chat's
+bucket refills; the interactive lane sends them ahead of queued bulk traffic.
+BulkSender wraps the bot for scheduler jobs and queues the same methods in the
+bulk (or another) lane. Until start_dispatcher() is called, calls are made
+inline on the calling thread.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from functools import partial
+
+import telebot
+from telebot.apihelper import ApiTelegramException
+from dotenv import load_dotenv
+
+from metrics import DELIVERIES, OUTBOUND_WAIT
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '4'))
+# A bucket lets through at most burst + rate messages in any one second, so the
+# defaults stay under Telegram's ~30/s per bot and a few per second per chat.
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '25'))
+OUTBOUND_GLOBAL_BURST = int(os.getenv('OUTBOUND_GLOBAL_BURST', '5'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '2'))
+OUTBOUND_MAX_ATTEMPTS = 5
+
+# Priority lanes: lower values are sent first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_TIMELY = 5      # reminders: after interactive replies, before digests
+PRIORITY_BULK = 10
+LANE_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_TIMELY: 'timely', PRIORITY_BULK: 'bulk'}
+
+# Past this many per-chat buckets, the least recently used ones are dropped
+# once they have refilled.
+MAX_IDLE_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    Not thread-safe on its own; the dispatcher calls it under its lock.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Returns how many seconds until a token is available (0 if one is available now)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Consumes one token; call only after wait_time() returned 0."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def block_until(self, when):
+        """Hands out no tokens before `when` (used for Telegram's retry_after)."""
+        self.blocked_until = max(self.blocked_until, when)
+        self.tokens = 0
+        self.updated = max(self.updated, when)
+
+    def is_idle(self, now):
+        self._refill(now)
+        return now >= self.blocked_until and self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    """One queued API call and the Future that receives its result (chat_id is None for chatless calls)."""
+    __slots__ = ('priority', 'seq', 'chat_id', 'func', 'args', 'kwargs', 'future', 'attempts', 'queued_at')
+
+    def __init__(self, priority, seq, chat_id, func, args, kwargs):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class OutboundDispatcher:
+    """
+    Priority queue of outgoing API calls drained by worker threads under a
+    global and a per-chat rate limit.
+    """
+
+    def __init__(self, workers=OUTBOUND_WORKERS, global_rate=OUTBOUND_GLOBAL_RATE,
+                 global_burst=OUTBOUND_GLOBAL_BURST, chat_rate=OUTBOUND_CHAT_RATE,
+                 chat_burst=OUTBOUND_CHAT_BURST,
+                 max_attempts=OUTBOUND_MAX_ATTEMPTS):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats = OrderedDict()   # { chat_id: TokenBucket }, least recently used first
+        self._ready = []        # heap of (priority, seq, message)
+        self._delayed = []      # heap of (not_before, seq, message)
+        self._owners = {}       # { chat_id: message being sent to that chat }
+        self._waiting = {}      # { chat_id: deque of messages queued behind the owner }
+        self._pending = 0       # submitted and not yet sent or failed
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._counters = {'sent': 0, 'unmodified': 0, 'failed': 0, 'retried': 0, 'rate_limited': 0}
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """Starts the worker threads (idempotent)."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"outbound-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10.0):
+        """Waits up to `timeout` seconds for the queue to drain, then stops the workers."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def submit(self, func, chat_id, *args, priority=PRIORITY_BULK, **kwargs):
+        """
+        Queues func(chat_id, *args, **kwargs) and returns a Future with its result.
+        When the dispatcher is not running the call is made inline.
+        """
+        return self.submit_call(func, (chat_id,) + args, kwargs, chat_id=chat_id, priority=priority)
+
+    def submit_call(self, func, args, kwargs, chat_id=None, priority=PRIORITY_BULK):
+        """
+        Queues func(*args, **kwargs), rate limited per `chat_id` (global only
+        when None), and returns a Future with its result.
+        """
+        message = OutboundMessage(priority, next(self._seq), chat_id, func, args, kwargs)
+        with self._cond:
+            self._pending += 1
+            if self._running:
+                heapq.heappush(self._ready, (priority, message.seq, message))
+                self._cond.notify()
+                return message.future
+        self._deliver(message)
+        return message.future
+
+    def stats(self):
+        """Returns delivery counters and current queue depths."""
+        with self._cond:
+            return dict(self._counters, ready=len(self._ready), delayed=len(self._delayed),
+                        waiting=sum(len(waiting) for waiting in self._waiting.values()),
+                        pending=self._pending, chat_buckets=len(self._chats))
+
+    # -------------------------------
+    # Worker side
+    # -------------------------------
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is not None:
+            self._chats.move_to_end(chat_id)
+            return bucket
+        bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        # Only the least recently used buckets are looked at; eviction stops at
+        # the first one that is still refilling or has a call in flight.
+        while len(self._chats) > MAX_IDLE_CHAT_BUCKETS:
+            oldest_chat, oldest = next(iter(self._chats.items()))
+            if oldest_chat in self._owners or not oldest.is_idle(now):
+                break
+            self._chats.popitem(last=False)
+        return bucket
+
+    def _release(self, message):
+        """Hands the message's chat to the next call queued behind it. Caller holds _cond."""
+        self._pending -= 1
+        if self._owners.get(message.chat_id) is not message:
+            return
+        waiting = self._waiting.get(message.chat_id)
+        if waiting:
+            successor = waiting.popleft()
+            if not waiting:
+                del self._waiting[message.chat_id]
+            self._owners[message.chat_id] = successor
+            heapq.heappush(self._ready, (successor.priority, successor.seq, successor))
+        else:
+            del self._owners[message.chat_id]
+        self._cond.notify_all()
+
+    def _next_message(self):
+        """
+        Blocks until a message may be sent under both rate limits and returns it,
+        or returns None once the dispatcher is stopped. A popped message owns its
+        chat until it is sent or fails; later messages to that chat wait behind
+        it in order. Messages whose chat is over its limit are parked in the
+        delayed heap so other chats keep flowing.
+        """
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, message = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (message.priority, message.seq, message))
+
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                if self._ready:
+                    global_wait = self._global.wait_time(now)
+                    if global_wait == 0:
+                        _, _, message = heapq.heappop(self._ready)
+                        if message.chat_id is None:
+                            self._global.take(now)
+                            return message
+                        owner = self._owners.setdefault(message.chat_id, message)
+                        if owner is not message:
+                            self._waiting.setdefault(message.chat_id, deque()).append(message)
+                            continue
+                        chat_bucket = self._chat_bucket(message.chat_id, now)
+                        chat_wait = chat_bucket.wait_time(now)
+                        if chat_wait == 0:
+                            self._global.take(now)
+                            chat_bucket.take(now)
+                            return message
+                        heapq.heappush(self._delayed, (now + chat_wait, message.seq, message))
+                        continue
+                    timeout = global_wait if timeout is None else min(timeout, global_wait)
+                self._cond.wait(timeout)
+        return None
+
+    def _worker(self):
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            OUTBOUND_WAIT.observe(time.monotonic() - message.queued_at,
+                                  LANE_NAMES.get(message.priority, str(message.priority)))
+            self._deliver(message)
+
+    def _deliver(self, message):
+        message.attempts += 1
+        try:
+            result = message.func(*message.args, **message.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429 and message.attempts < self.max_attempts and self._running:
+                self._retry_later(message, e)
+            elif e.error_code == 400 and 'message is not modified' in (e.description or ''):
+                self._complete(message, True, 'unmodified')
+            else:
+                self._fail(message, e)
+        except Exception as e:
+            self._fail(message, e)
+        else:
+            self._complete(message, result)
+
+    def _complete(self, message, result, counter='sent'):
+        with self._cond:
+            self._counters[counter] += 1
+        message.future.set_result(result)
+        with self._cond:
+            self._release(message)
+
+    def _retry_later(self, message, error):
+        """Honours Telegram's retry_after: pauses the buckets and queues the message again."""
+        retry_after = (error.result_json or {}).get('parameters', {}).get('retry_after', 1)
+        not_before = time.monotonic() + retry_after
+        with self._cond:
+            self._counters['rate_limited'] += 1
+            self._counters['retried'] += 1
+            self._global.block_until(not_before)
+            if message.chat_id is not None:
+                self._chat_bucket(message.chat_id, time.monotonic()).block_until(not_before)
+            heapq.heappush(self._delayed, (not_before, message.seq, message))
+            self._cond.notify()
+        logger.warning(f"Rate limited sending to chat {message.chat_id}; retrying in {retry_after}s")
+
+    def _fail(self, message, error):
+        with self._cond:
+            self._counters['failed'] += 1
+        logger.error(f"Failed to send to chat {message.chat_id} after {message.attempts} attempt(s): {error}")
+        message.future.set_exception(error)
+        with self._cond:
+            self._release(message)
+
+
+# Shared dispatcher—started by start_dispatcher().
+dispatcher = OutboundDispatcher()
+
+
+def start_dispatcher():
+    """Starts the shared dispatcher's worker threads."""
+    dispatcher.start()
+
+
+class QueuedTeleBot(telebot.TeleBot):
+    """
+    TeleBot whose chat-facing Bot API calls go through the outbound
+    dispatcher. Each of them returns a Future with the call's result (for
+    send_message, the sent Message) instead of waiting for it; pass
+    priority=... to queue in another lane.
+    """
+
+    def send_message(self, chat_id, text, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return dispatcher.submit(super().send_message, chat_id, text, *args, priority=priority, **kwargs)
+
+    def send_document(self, chat_id, document, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return dispatcher.submit(super().send_document, chat_id, document, *args, priority=priority, **kwargs)
+
+    def delete_message(self, chat_id, message_id, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return dispatcher.submit(super().delete_message, chat_id, message_id, *args, priority=priority, **kwargs)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, *args, priority=PRIORITY_INTERACTIVE,
+                          **kwargs):
+        return dispatcher.submit_call(super().edit_message_text, (text, chat_id, message_id) + args, kwargs,
+                                      chat_id=chat_id, priority=priority)
+
+    def answer_callback_query(self, callback_query_id, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        return dispatcher.submit_call(super().answer_callback_query, (callback_query_id,) + args, kwargs,
+                                      priority=priority)
+
+
+def track_delivery(result, kind, item):
+    """
+    Counts the outcome of a message a poller queued for `item` (a claimed
+    reminder, alert, ...) under `kind` in metrics.DELIVERIES, and logs failed
+    deliveries with the item, since the poller has already advanced it.
+    `result` is the send's Future; anything else counts as delivered.
+    """
+    if not isinstance(result, Future):
+        DELIVERIES.inc(kind, 'delivered')
+        return
+    result.add_done_callback(partial(_record_delivery, kind, item))
+
+
+def _record_delivery(kind, item, future):
+    error = future.exception()
+    if error is None:
+        DELIVERIES.inc(kind, 'delivered')
+    else:
+        DELIVERIES.inc(kind, 'failed')
+        logger.error(f"Failed to deliver {kind} {item}: {error}")
+
+
+# QueuedTeleBot methods that BulkSender queues in its own lane.
+QUEUED_METHODS = frozenset(('send_message', 'send_document', 'delete_message', 'edit_message_text',
+                            'answer_callback_query'))
+
+
+class BulkSender:
+    """
+    Wraps a QueuedTeleBot for scheduler fan-out jobs: its queued methods
+    (QUEUED_METHODS) go in the given lane, bulk by default. Everything else
+    is delegated to the wrapped bot.
+    """
+
+    def __init__(self, bot, priority=PRIORITY_BULK):
+        self._bot = bot
+        self._priority = priority
+
+    def __getattr__(self, name):
+        attr = getattr(self._bot, name)
+        if name in QUEUED_METHODS:
+            return partial(attr, priority=self._priority)
+        return attr
@@ -0,0 +1,113 @@
+"""
+router.py
+
+Central routing of incoming updates, replacing the chain of lambda predicates
+that pyTelegramBotAPI evaluates in order for every update.
+
+Callback queries: callback_data is parsed once into a CallbackRoute
+(namespace, action, args) by splitting on the first two underscores:
+
+    "task_set_due_yes"        -> ("task", "set", "due_yes")
+    "set_tz_America/New_York" -> ("set", "tz", "America/New_York")
+    "onboard_continue"        -> ("onboard", "continue", "")
+
+args is left unsplit because values such as timezone names contain '_'.
+Handlers are looked up in a dict by (namespace, action), falling back to a
+handler registered for the whole namespace, so the cost does not grow with
+the number of handlers. Each handler's run time is recorded under its own
+name (metrics.timed_handler).
+
+Text messages: commands are still handled by TeleBot's command handlers;
+anything else goes to the handler of the flow the user most recently started
+(state_store.active_flow), found with a single lookup.
+
+Usage in bot.py:
+
+    router = Router()
+
+    @router.callback("delete", "task")
+    def delete_task_handler(call, route): ...
+
+    @router.flow(tasks_states)
+    def message_task_handler(message): ...
+
+    router.attach(bot)   # after all command handlers are registered
+"""
+
+import logging
+from collections import namedtuple
+
+from metrics import timed_handler
+from state_store import active_flow
+
+logger = logging.getLogger(__name__)
+
+CallbackRoute = namedtuple('CallbackRoute', ('namespace', 'action', 'args'))
+
+
+def parse_callback(data):
+    """Parses callback_data into a CallbackRoute."""
+    parts = (data or '').split('_', 2)
+    return CallbackRoute(parts[0], parts[1] if len(parts) > 1 else '', parts[2] if len(parts) > 2 else '')
+
+
+class Router:
+    """Dict-based dispatch of callback queries and flow messages."""
+
+    def __init__(self):
+        self._callbacks = {}   # { (namespace, action or None): handler(call, route) }
+        self._flows = {}       # { state store namespace: handler(message) }
+
+    def callback(self, namespace, action=None):
+        """
+        Decorator registering handler(call, route) for callback_data in
+        `namespace` (with the given action, or any action when None).
+        """
+        def decorator(handler):
+            key = (namespace, action)
+            if key in self._callbacks:
+                raise ValueError(f"Callback route {namespace}/{action or '*'} is already registered")
+            self._callbacks[key] = timed_handler(handler)
+            return handler
+        return decorator
+
+    def flow(self, store):
+        """Decorator registering handler(message) for text sent while `store`'s flow is active."""
+        def decorator(handler):
+            if store.namespace in self._flows:
+                raise ValueError(f"Flow handler for '{store.namespace}' is already registered")
+            self._flows[store.namespace] = timed_handler(handler)
+            return handler
+        return decorator
+
+    def resolve_callback(self, data):
+        """Returns (handler, route) for callback_data; handler is None when nothing matches."""
+        route = parse_callback(data)
+        handler = self._callbacks.get((route.namespace, route.action))
+        if handler is None:
+            handler = self._callbacks.get((route.namespace, None))
+        return handler, route
+
+    def dispatch_callback(self, call):
+        handler, route = self.resolve_callback(call.data)
+        if handler is None:
+            logger.info(f"No route for callback data {call.data!r}")
+            return False
+        handler(call, route)
+        return True
+
+    def dispatch_message(self, message):
+        namespace, _ = active_flow(message.from_user.id)
+        handler = self._flows.get(namespace)
+        if handler is None:
+            return False
+        handler(message)
+        return True
+
+    def attach(self, bot):
+        """
+        Registers the router as the bot's catch-all callback and message handler.
+        Call after the command handlers so that commands keep precedence.
+        """
+        bot.register_callback_query_handler(self.dispatch_callback, func=lambda call: True)
+        bot.register_message_handler(self.dispatch_message, func=lambda message: True)
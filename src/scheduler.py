@@ -1,228 +1,400 @@
+"""
+scheduler.py
+
+Background scheduling for summaries, check-ins and weekly event reminders.
+
+Jobs are shared buckets rather than per-user jobs: one job per (timezone, time slot)
+fans out to every user due in that slot through an indexed query on the users table.
+The number of scheduler jobs therefore grows with the number of distinct slots
+(timezones x chosen times), not with the number of users.
+
+Bucket jobs:
+  - summary_daily_{tz}_{HH:MM}       daily summaries at a local time
+  - summary_custom_{hours}          "every X hours" summaries
+  - nightly_weekly_{tz}             21:00 local summary of tomorrow's weekly events
+  - weekly_event_poll               reminders 30 minutes before weekly events
+  - checkin_plan_{tz}               08:00 local planning of the day's random check-ins
+  - checkin_slot_{YYYYmmddHHMM}     one UTC minute of planned random check-ins
+  - due_upcoming_summary            the 30-minute due/upcoming digest for everyone
+  - reminder_poll                   sends due reminders (see modules.reminders)
+  - countdown_alert_poll            daily/weekly countdown alerts (see modules.countdowns)
+  - goal_checkin_poll               check-in prompts for due goals (see modules.goals)
+
+Weekly events carry their next occurrence as next_fire_utc (see
+modules.weekly_schedule), so the weekly poller and the nightly summary each
+read them with a single range query instead of one job per (tz, day, time).
+
+Bucket jobs live in the scheduler_jobs table (jobstore.SQLiteJobStore) and so
+survive restarts; on startup rehydrate_jobs() rebuilds every bucket implied by
+the users table with a single batched insert. Check-in slot jobs only carry
+in-memory plans and use the 'volatile' in-memory job store.
+
+Every bucket job records its run time (metrics.timed_job) and, through a
+scheduler listener, its start lag, misfires and failures, labelled with its
+job family (JOB_FAMILIES, the job id without its timezone/slot suffix).
+
+Private chats are assumed, so a user's chat_id equals their user_id.
+"""
+
 import random
+import threading
 import time
+from functools import partial
 from datetime import datetime, timedelta
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from apscheduler.job import Job
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 
-from database import get_db_connection
+from database import db_connection
+from jobstore import SQLiteJobStore
+from metrics import JOB_ERRORS, JOB_LAG, JOB_MISSED, timed_job
+from outbound import BulkSender, PRIORITY_TIMELY
+from user_cache import get_user_profile
 from modules.summaries import send_summary
 from modules.random_checkins import send_random_checkin
+from modules.reminders import process_due_reminders
+from modules.countdowns import process_due_countdown_alerts
+from modules.goals import process_due_goal_checkins
+from modules.weekly_schedule import process_due_weekly_events, tomorrow_weekly_events
 import pytz
 
+# Persistent store for bucket jobs; check-in slots stay in memory.
+job_store = SQLiteJobStore()
+
 # The scheduler is set to UTC – all run_date values must be given in UTC.
-scheduler = BackgroundScheduler(timezone=pytz.utc)
+# init_scheduler() swaps in an AsyncIOScheduler when the bot runs on asyncio.
+scheduler = BackgroundScheduler(timezone=pytz.utc,
+                                jobstores={'default': job_store, 'volatile': MemoryJobStore()})
+
+# Bot used by the bucket jobs—set by init_scheduler(). Its send_message queues
+# in the outbound dispatcher's bulk lane, behind interactive replies.
+BOT = None
+# Same bot, but queued ahead of bulk digests; used for time-sensitive reminders.
+TIMELY_BOT = None
+
+# Window (local hours) in which random check-ins are sent.
+CHECKIN_START_HOUR = 8
+CHECKIN_END_HOUR = 21
+
+# How often the reminder poller looks for due reminders.
+REMINDER_POLL_SECONDS = 30
+# How often the countdown alert poller looks for due alerts.
+COUNTDOWN_ALERT_POLL_SECONDS = 60
+# How often the goal check-in poller looks for goals due a check-in.
+GOAL_CHECKIN_POLL_SECONDS = 60
+
+# Users read per page by the due/upcoming digest.
+DUE_SUMMARY_BATCH_SIZE = 500
+
+# Options shared by every bucket job.
+MISFIRE_GRACE_TIME = 300
+
+# Job id prefixes, used as the `job` label of the job metrics.
+JOB_FAMILIES = ('summary_daily', 'summary_custom', 'nightly_weekly', 'weekly_event_poll', 'checkin_plan',
+                'checkin_slot', 'due_upcoming_summary', 'reminder_poll', 'countdown_alert_poll',
+                'goal_checkin_poll')
+
+# Planned random check-ins: { utc_minute (datetime): [(user_id, language), ...] }
+_checkin_slots = {}
+_checkin_lock = threading.Lock()
+_ensure_lock = threading.Lock()
 
 
-def init_scheduler():
-    """Initializes and starts the scheduler."""
-    scheduler.start()
+def init_scheduler(bot, event_loop=None, executor=None):
+    """
+    Stores the bot used by bucket jobs and starts the scheduler. The scheduler
+    starts paused so the persisted jobs can be rehydrated before anything runs.
+    Requires init_db() to have created the scheduler_jobs table.
+    `bot` must be an outbound.QueuedTeleBot. With `event_loop` (the async
+    runtime), jobs are scheduled by an AsyncIOScheduler on that loop and run
+    on `executor` (an APScheduler executor), so they stay off the loop.
+    """
+    global BOT, TIMELY_BOT, scheduler
+    if event_loop is not None:
+        scheduler = AsyncIOScheduler(event_loop=event_loop, timezone=pytz.utc,
+                                     jobstores={'default': job_store, 'volatile': MemoryJobStore()},
+                                     executors={'default': executor} if executor else {})
+    BOT = BulkSender(bot)
+    TIMELY_BOT = BulkSender(bot, PRIORITY_TIMELY)
+    scheduler.add_listener(_record_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_ERROR)
+    scheduler.start(paused=True)
+    rehydrate_jobs()
+    scheduler.resume()
+
+
+def job_family(job_id):
+    """Returns the JOB_FAMILIES entry a job id belongs to (the id itself if none matches)."""
+    for family in JOB_FAMILIES:
+        if job_id.startswith(family):
+            return family
+    return job_id
 
 
-def schedule_reminder(reminder_id, next_trigger_time, user_id, chat_id):
+def _record_job_event(event):
+    """Scheduler listener feeding the job lag, misfire and failure metrics."""
+    family = job_family(event.job_id)
+    if event.code == EVENT_JOB_SUBMITTED:
+        lag = datetime.now(pytz.utc) - event.scheduled_run_times[-1]
+        JOB_LAG.observe(max(lag.total_seconds(), 0.0), family)
+    elif event.code == EVENT_JOB_MISSED:
+        JOB_MISSED.inc(family)
+    else:
+        JOB_ERRORS.inc(family)
+
+
+def _ensure_job(job_id, func, trigger, args=None, jobstore='default'):
     """
-    Schedules a job for a reminder at its next_trigger_time.
-    (Assumes next_trigger_time is already in UTC.)
+    Adds a bucket job unless one with the same id already exists.
+    Returns True if the job was added.
     """
-    trigger = DateTrigger(run_date=next_trigger_time)
-    job_id = f"reminder_{reminder_id}"
-    scheduler.add_job(func=send_reminder_wrapper, trigger=trigger, id=job_id,
-                      args=[user_id, chat_id, reminder_id])
-    print(f"Scheduled reminder job {job_id} for {next_trigger_time}")
+    with _ensure_lock:
+        if scheduler.get_job(job_id, jobstore) is not None:
+            return False
+        scheduler.add_job(func=func, trigger=trigger, id=job_id, args=args or [], jobstore=jobstore,
+                          coalesce=True, misfire_grace_time=MISFIRE_GRACE_TIME)
+    print(f"Scheduled bucket job {job_id}")
+    return True
 
 
-def send_reminder_wrapper(user_id, chat_id, reminder_id):
+def _ensure_spec(spec):
     """
-    Wrapper that retrieves reminder details and sends the reminder message.
+    Ensures the job described by a bucket job spec, a tuple of
+    (job_id, func, make_trigger, args). Invalid specs (None) are ignored.
     """
-    from modules.reminders import send_reminder_message  # Avoid circular dependency
-    send_reminder_message(user_id, chat_id, reminder_id)
+    if spec:
+        job_id, func, make_trigger, args = spec
+        _ensure_job(job_id, func, make_trigger(), args)
 
 
-def schedule_summary(bot, user_id, chat_id, summary_schedule, summary_time, user_tz):
+def _build_job(job_id, func, make_trigger, args, now):
     """
-    Schedules a summary report for the user using their chosen timezone.
-    user_tz is a string (e.g. "Asia/Tehran") that is converted to a pytz timezone.
+    Builds a Job from a bucket job spec the way scheduler.add_job() would,
+    without storing it, so that rehydrate_jobs() can insert many jobs in one batch.
+    """
+    trigger = make_trigger()
+    return Job(scheduler, id=job_id, func=func, trigger=trigger, executor='default',
+               args=args, kwargs={}, name=func.__name__, misfire_grace_time=MISFIRE_GRACE_TIME,
+               coalesce=True, max_instances=1, next_run_time=trigger.get_next_fire_time(None, now))
+
+
+def _parse_hhmm(value):
+    """Parses "HH:MM" into (hour, minute); returns None when malformed."""
+    try:
+        hour, minute = map(int, value.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour, minute
+
+
+# -------------------------------
+# Summaries
+# -------------------------------
+def _summary_job_spec(summary_schedule, summary_time, user_tz):
+    """
+    Returns (job_id, func, make_trigger, args) for the bucket serving this summary
+    setting, or None when the setting is invalid. Daily summaries share one job
+    per (timezone, HH:MM); custom summaries share one job per interval in hours.
     """
-    tz = pytz.timezone(user_tz)
-    now = datetime.now(tz)
     if summary_schedule == 'daily':
-        try:
-            # Parse the summary time (HH:MM) as a naive datetime and then localize it
-            summary_time_naive = datetime.strptime(summary_time, "%H:%M")
-            summary_dt = tz.localize(datetime(
-                year=now.year, month=now.month, day=now.day,
-                hour=summary_time_naive.hour, minute=summary_time_naive.minute))
-        except Exception as e:
-            print("Error parsing summary time:", e)
-            return
-        if summary_dt < now:
-            summary_dt += timedelta(days=1)
-        # Convert to UTC for scheduling
-        summary_dt_utc = summary_dt.astimezone(pytz.utc)
-        trigger = DateTrigger(run_date=summary_dt_utc)
-        job_id = f"summary_daily_{user_id}"
-        scheduler.add_job(func=send_summary, trigger=trigger, id=job_id,
-                          args=[bot, chat_id, user_id])
-        print(f"Scheduled daily summary for user {user_id} at {summary_dt} (local), {summary_dt_utc} (UTC)")
-    elif summary_schedule == 'custom':
+        parsed = _parse_hhmm(summary_time)
+        if parsed is None:
+            print("Error parsing summary time:", summary_time)
+            return None
+        hour, minute = parsed
+        trigger = partial(CronTrigger, hour=hour, minute=minute, timezone=pytz.timezone(user_tz))
+        return (f"summary_daily_{user_tz}_{summary_time}", dispatch_daily_summaries, trigger,
+                [user_tz, summary_time])
+    if summary_schedule == 'custom':
         try:
             interval_hours = int(summary_time)
-        except ValueError:
-            return
-        start_date = now + timedelta(hours=interval_hours)
-        start_date_utc = start_date.astimezone(pytz.utc)
-        trigger = IntervalTrigger(hours=interval_hours, start_date=start_date_utc, timezone=pytz.utc)
-        job_id = f"summary_custom_{user_id}"
-        scheduler.add_job(func=send_summary, trigger=trigger, id=job_id,
-                          args=[bot, chat_id, user_id])
-        print(f"Scheduled custom summary for user {user_id} every {interval_hours} hours, starting at {start_date} (local)")
-    else:
-        remove_job(f"summary_daily_{user_id}")
-        remove_job(f"summary_custom_{user_id}")
+        except (TypeError, ValueError):
+            return None
+        if interval_hours <= 0:
+            return None
+        trigger = partial(IntervalTrigger, hours=interval_hours, timezone=pytz.utc)
+        return (f"summary_custom_{interval_hours}", dispatch_custom_summaries, trigger,
+                [summary_time])
+    return None
+
+
+def schedule_summary(summary_schedule, summary_time, user_tz):
+    """Makes sure the bucket job serving this summary setting exists."""
+    _ensure_spec(_summary_job_spec(summary_schedule, summary_time, user_tz))
+
 
+@timed_job('summary_daily')
+def dispatch_daily_summaries(user_tz, summary_time):
+    """Sends the daily summary to every user whose daily slot is (user_tz, summary_time)."""
+    with db_connection() as conn:
+        users = conn.execute("""
+            SELECT user_id, language FROM users
+            WHERE onboarded = 1 AND summary_schedule = 'daily' AND summary_time = ? AND timezone = ?
+        """, (summary_time, user_tz)).fetchall()
+    for user in users:
+        _safe_send(send_summary, BOT, user["user_id"], user["user_id"], user["language"])
 
-def schedule_random_checkins(bot, user_id, chat_id, random_checkin_max, user_tz):
+
+@timed_job('summary_custom')
+def dispatch_custom_summaries(summary_time):
+    """Sends the summary to every user on the given "every X hours" interval."""
+    with db_connection() as conn:
+        users = conn.execute("""
+            SELECT user_id, language FROM users
+            WHERE onboarded = 1 AND summary_schedule = 'custom' AND summary_time = ?
+        """, (summary_time,)).fetchall()
+    for user in users:
+        _safe_send(send_summary, BOT, user["user_id"], user["user_id"], user["language"])
+
+
+def _safe_send(func, *args):
     """
-    Schedules random check-in jobs for the user during the period 8:00 to 21:00 in the user's timezone.
-    
-    - If current time is before 8:00: schedules for today (8:00 to 21:00).
-    - If current time is between 8:00 and 21:00: schedules for the remaining time today.
-    - If current time is after 21:00: schedules for tomorrow (8:00 to 21:00).
-    
-    The available time window is divided into equal intervals, and one random check-in is
-    scheduled within each interval.
+    Runs one fan-out delivery so that a single failing user does not stop the bucket.
+    Messages are only queued here; delivery errors are logged by the outbound dispatcher.
     """
-    import pytz  # ensure pytz is imported
-    tz = pytz.timezone(user_tz)
-    now = datetime.now(tz)
-    
-    # Define today's start and end (8:00 and 21:00)
-    today_start = now.replace(hour=8, minute=0, second=0, microsecond=0)
-    today_end = now.replace(hour=21, minute=0, second=0, microsecond=0)
-    
-    if now < today_start:
-        # Before 8 AM: schedule for today
-        start_time = today_start
-        end_time = today_end
-    elif now > today_end:
-        # After 9 PM: schedule for tomorrow
-        tomorrow = now + timedelta(days=1)
-        start_time = tomorrow.replace(hour=8, minute=0, second=0, microsecond=0)
-        end_time = tomorrow.replace(hour=21, minute=0, second=0, microsecond=0)
-    else:
-        # Now is between 8:00 and 21:00: schedule for the remaining time today.
-        start_time = now
-        end_time = today_end
+    try:
+        func(*args)
+    except Exception as e:
+        print(f"Delivery via {func.__name__} failed for {args[1:3]}: {e}")
 
+
+# -------------------------------
+# Random Check-Ins
+# -------------------------------
+def _checkin_window(now):
+    """
+    Returns the (start, end) local window left today for random check-ins,
+    or None outside 8:00–21:00. Check-ins for later days are planned by the
+    timezone's 08:00 planning job.
+    """
+    today_start = now.replace(hour=CHECKIN_START_HOUR, minute=0, second=0, microsecond=0)
+    today_end = now.replace(hour=CHECKIN_END_HOUR, minute=0, second=0, microsecond=0)
+    if now < today_start or now >= today_end:
+        return None
+    return now, today_end
+
+
+def _plan_checkins(user_id, language, random_checkin_max, start_time, end_time):
+    """
+    Divides the window into equal intervals and files one random check-in per
+    interval into its UTC minute slot, creating slot jobs as needed.
+    """
     total_seconds = (end_time - start_time).total_seconds()
     if total_seconds <= 0 or random_checkin_max <= 0:
         return
-
-    # Divide the available period into equal intervals.
     interval_length = total_seconds / random_checkin_max
-
     for i in range(random_checkin_max):
-        # Each interval starts at:
         interval_start = start_time + timedelta(seconds=i * interval_length)
-        # Pick a random offset within the interval:
-        random_offset_seconds = random.randint(0, int(interval_length))
-        run_date = interval_start + timedelta(seconds=random_offset_seconds)
-        run_date_utc = run_date.astimezone(pytz.utc)
-        job_id = f"random_checkin_{user_id}_{i}"
-        scheduler.add_job(
-            func=send_random_checkin,
-            trigger=DateTrigger(run_date=run_date_utc),
-            id=job_id,
-            args=[bot, chat_id, user_id]
-        )
-        print(f"Scheduled random check-in {i} for user {user_id} at {run_date} (local), {run_date_utc} (UTC)")
-
-def schedule_weekly_event_reminders(bot, user_id, chat_id, user_tz):
-    """
-    Schedules reminders for all weekly events for the user.
-    Each reminder is set 30 minutes before the next occurrence,
-    using the user's chosen timezone.
+        run_date = interval_start + timedelta(seconds=random.randint(0, int(interval_length)))
+        slot = run_date.astimezone(pytz.utc).replace(second=0, microsecond=0, tzinfo=None)
+        with _checkin_lock:
+            _checkin_slots.setdefault(slot, []).append((user_id, language))
+        slot_key = slot.strftime("%Y%m%d%H%M")
+        _ensure_job(f"checkin_slot_{slot_key}", dispatch_checkin_slot,
+                    DateTrigger(run_date=pytz.utc.localize(slot)), [slot_key], jobstore='volatile')
+
+
+def _checkin_plan_job_spec(user_tz):
+    """Returns the spec of the timezone's 08:00 check-in planning job."""
+    trigger = partial(CronTrigger, hour=CHECKIN_START_HOUR, minute=0, timezone=pytz.timezone(user_tz))
+    return f"checkin_plan_{user_tz}", plan_random_checkins, trigger, [user_tz]
+
+
+def schedule_random_checkins(user_id, random_checkin_max, user_tz, language='en'):
+    """
+    Plans random check-ins for one user in what is left of today's 8:00–21:00
+    window in their timezone and ensures the daily planning job for that timezone.
     """
     tz = pytz.timezone(user_tz)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, day_of_week, time_of_day FROM weekly_schedule WHERE user_id = ?", (user_id,))
-    events = cursor.fetchall()
-    conn.close()
-    
-    now = datetime.now(tz)
-    weekdays = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3,
-                "Friday": 4, "Saturday": 5, "Sunday": 6}
-    for event in events:
-        event_id = event["id"]
-        title = event["title"]
-        day_str = event["day_of_week"]  # e.g., "Monday"
-        time_str = event["time_of_day"]  # Expected "HH:MM"
-        
-        event_weekday = weekdays.get(day_str, None)
-        if event_weekday is None:
-            continue
-        try:
-            hour, minute = map(int, time_str.split(":"))
-        except Exception:
-            continue
-        
-        # Compute the next occurrence date
-        days_ahead = event_weekday - now.weekday()
-        next_date = now + timedelta(days=days_ahead)
-        next_event_naive = datetime(year=next_date.year, month=next_date.month, day=next_date.day, hour=hour, minute=minute)
-        next_event_date = tz.localize(next_event_naive)
-        if days_ahead < 0 or (days_ahead == 0 and now >= next_event_date):
-            next_date = now + timedelta(days=days_ahead + 7)
-            next_event_naive = datetime(year=next_date.year, month=next_date.month, day=next_date.day, hour=hour, minute=minute)
-            next_event_date = tz.localize(next_event_naive)
-        
-        trigger_time = next_event_date - timedelta(minutes=30)
-        if trigger_time < now:
-            trigger_time += timedelta(days=7)
-        trigger_time_utc = trigger_time.astimezone(pytz.utc)
-        job_id = f"weekly_event_{event_id}_{user_id}"
-        scheduler.add_job(func=send_weekly_event_reminder, trigger=DateTrigger(run_date=trigger_time_utc),
-                          id=job_id, args=[bot, user_id, chat_id, event_id, title, next_event_date.strftime('%H:%M')])
-        print(f"Scheduled weekly event reminder for event {event_id} for user {user_id} at {trigger_time} (local), {trigger_time_utc} (UTC)")
-
-
-def send_weekly_event_reminder(bot, user_id, chat_id, event_id, title, event_time_str):
-    """
-    Sends a reminder message for a weekly event.
-    """
-    bot.send_message(chat_id,
-                     f"Reminder: Your weekly event '{title}' is scheduled to start at {event_time_str} (in 30 minutes).")
-
-
-def schedule_nightly_tomorrow_summary(bot, user_id, chat_id, user_tz):
-    """
-    Schedules a daily job at 21:00 (user's local time) that sends a summary of tomorrow's weekly events.
-    """
-    # CronTrigger accepts a timezone parameter, so we pass the user's tz.
-    trigger = CronTrigger(hour=21, minute=0, timezone=pytz.timezone(user_tz))
-    job_id = f"nightly_tomorrow_summary_{user_id}"
-    scheduler.add_job(func=send_tomorrow_weekly_summary, trigger=trigger, id=job_id,
-                      args=[bot, user_id, chat_id])
-    print(f"Scheduled nightly summary for user {user_id} at 21:00 {user_tz}")
-
-
-def send_tomorrow_weekly_summary(bot, user_id, chat_id):
-    """
-    Retrieves weekly events for tomorrow and sends a summary message.
-    (Assumes that events are stored in a format consistent with the user’s local time.)
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    tomorrow = datetime.now() + timedelta(days=1)
-    tomorrow_weekday = tomorrow.strftime("%A")
-    cursor.execute("SELECT title, time_of_day FROM weekly_schedule WHERE user_id = ? AND day_of_week = ?",
-                   (user_id, tomorrow_weekday))
-    events = cursor.fetchall()
-    conn.close()
-    
+    window = _checkin_window(datetime.now(tz))
+    if window:
+        _plan_checkins(user_id, language, random_checkin_max, *window)
+    _ensure_spec(_checkin_plan_job_spec(user_tz))
+
+
+@timed_job('checkin_plan')
+def plan_random_checkins(user_tz):
+    """Plans the rest of today's random check-ins for every user in the timezone."""
+    window = _checkin_window(datetime.now(pytz.timezone(user_tz)))
+    if window is None:
+        return
+    with db_connection() as conn:
+        users = conn.execute("""
+            SELECT user_id, language, random_checkin_max FROM users
+            WHERE onboarded = 1 AND timezone = ? AND random_checkin_max > 0
+        """, (user_tz,)).fetchall()
+    for user in users:
+        _plan_checkins(user["user_id"], user["language"], user["random_checkin_max"], *window)
+
+
+@timed_job('checkin_slot')
+def dispatch_checkin_slot(slot_key):
+    """Sends every random check-in planned for the given UTC minute."""
+    slot = datetime.strptime(slot_key, "%Y%m%d%H%M")
+    with _checkin_lock:
+        entries = _checkin_slots.pop(slot, [])
+    for user_id, language in entries:
+        _safe_send(send_random_checkin, BOT, user_id, user_id, language)
+
+
+# -------------------------------
+# Weekly Schedule
+# -------------------------------
+def _weekly_event_poll_job_spec():
+    """
+    Returns the spec of the job that sends the 30-minute heads-up for weekly
+    events, found by next_fire_utc across all users (see modules.weekly_schedule).
+    """
+    trigger = partial(IntervalTrigger, seconds=REMINDER_POLL_SECONDS, timezone=pytz.utc)
+    return "weekly_event_poll", dispatch_weekly_event_reminders, trigger, []
+
+
+@timed_job('weekly_event_poll')
+def dispatch_weekly_event_reminders():
+    """Sends the heads-up for every weekly event starting within the next 30 minutes."""
+    queued = process_due_weekly_events(TIMELY_BOT)
+    if queued:
+        print(f"Queued {queued} weekly event reminders")
+
+
+def _nightly_job_spec(user_tz):
+    """
+    Returns the spec of the per-timezone job that sends, at 21:00 local time,
+    every onboarded user a summary of tomorrow's weekly events.
+    """
+    trigger = partial(CronTrigger, hour=21, minute=0, timezone=pytz.timezone(user_tz))
+    return f"nightly_weekly_{user_tz}", dispatch_nightly_tomorrow_summaries, trigger, [user_tz]
+
+
+def schedule_nightly_tomorrow_summary(user_tz):
+    """Ensures the nightly tomorrow-summary job for the timezone."""
+    _ensure_spec(_nightly_job_spec(user_tz))
+
+
+@timed_job('nightly_weekly')
+def dispatch_nightly_tomorrow_summaries(user_tz):
+    """Sends tomorrow's weekly events to every onboarded user in the timezone."""
+    tomorrow_weekday, events = tomorrow_weekly_events(user_tz)
+    with db_connection() as conn:
+        users = conn.execute("SELECT user_id FROM users WHERE onboarded = 1 AND timezone = ?",
+                             (user_tz,)).fetchall()
+    for user in users:
+        _safe_send(send_tomorrow_weekly_summary, BOT, user["user_id"], user["user_id"], tomorrow_weekday,
+                   events.get(user["user_id"], []))
+
+
+def send_tomorrow_weekly_summary(bot, user_id, chat_id, tomorrow_weekday, events):
+    """
+    Sends a summary of the user's weekly events for tomorrow (tomorrow_weekday,
+    e.g. "Tuesday", in the user's timezone); events come from
+    modules.weekly_schedule.tomorrow_weekly_events().
+    """
     if events:
         message_lines = [f"Tomorrow's Weekly Events ({tomorrow_weekday}):"]
         for event in events:
@@ -243,74 +415,84 @@ def remove_job(job_id):
         pass
 
 
+def _format_time(value):
+    """Formats a DATETIME column (returned as an ISO string) as HH:MM."""
+    if isinstance(value, str):
+        return value[11:16]
+    return value.strftime('%H:%M')
+
+
+def _today_window(user_tz):
+    """Returns (now, start of today, end of today) in the user's timezone."""
+    now = datetime.now(pytz.timezone(user_tz))
+    return (now, now.replace(hour=0, minute=0, second=0, microsecond=0),
+            now.replace(hour=23, minute=59, second=59, microsecond=999999))
+
+
 def send_due_and_upcoming_summary(bot, user_id, chat_id, user_tz):
     """
     Sends a summary of items due for today and items upcoming in the next 30 minutes.
     Uses the user's timezone for determining today’s window.
     """
-    tz = pytz.timezone(user_tz)
-    now = datetime.now(tz)
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    now, today_start, today_end = _today_window(user_tz)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    # Query tasks due today
-    cursor.execute("SELECT title, due_date FROM tasks WHERE user_id = ? AND due_date BETWEEN ? AND ?",
-                   (user_id, today_start, today_end))
-    tasks = cursor.fetchall()
+        # Query tasks due today
+        cursor.execute("SELECT title, due_date FROM tasks WHERE user_id = ? AND due_date BETWEEN ? AND ?",
+                       (user_id, today_start, today_end))
+        tasks = cursor.fetchall()
     
-    # Query reminders due today
-    cursor.execute("SELECT title, next_trigger_time FROM reminders WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ?",
-                   (user_id, today_start, today_end))
-    reminders = cursor.fetchall()
+        # Query reminders due today
+        cursor.execute("SELECT title, next_trigger_time FROM reminders WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ?",
+                       (user_id, today_start, today_end))
+        reminders = cursor.fetchall()
     
-    # Query countdowns with event_datetime today
-    cursor.execute("SELECT title, event_datetime FROM countdowns WHERE user_id = ? AND event_datetime BETWEEN ? AND ?",
-                   (user_id, today_start, today_end))
-    countdowns = cursor.fetchall()
+        # Query countdowns with event_datetime today
+        cursor.execute("SELECT title, event_datetime FROM countdowns WHERE user_id = ? AND event_datetime BETWEEN ? AND ?",
+                       (user_id, today_start, today_end))
+        countdowns = cursor.fetchall()
     
-    # Query upcoming items in the next 30 minutes
-    upcoming_end = now + timedelta(minutes=30)
-    cursor.execute("SELECT title, due_date FROM tasks WHERE user_id = ? AND due_date BETWEEN ? AND ?",
-                   (user_id, now, upcoming_end))
-    tasks_upcoming = cursor.fetchall()
-    cursor.execute("SELECT title, next_trigger_time FROM reminders WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ?",
-                   (user_id, now, upcoming_end))
-    reminders_upcoming = cursor.fetchall()
-    cursor.execute("SELECT title, event_datetime FROM countdowns WHERE user_id = ? AND event_datetime BETWEEN ? AND ?",
-                   (user_id, now, upcoming_end))
-    countdowns_upcoming = cursor.fetchall()
-    conn.close()
+        # Query upcoming items in the next 30 minutes
+        upcoming_end = now + timedelta(minutes=30)
+        cursor.execute("SELECT title, due_date FROM tasks WHERE user_id = ? AND due_date BETWEEN ? AND ?",
+                       (user_id, now, upcoming_end))
+        tasks_upcoming = cursor.fetchall()
+        cursor.execute("SELECT title, next_trigger_time FROM reminders WHERE user_id = ? AND next_trigger_time BETWEEN ? AND ?",
+                       (user_id, now, upcoming_end))
+        reminders_upcoming = cursor.fetchall()
+        cursor.execute("SELECT title, event_datetime FROM countdowns WHERE user_id = ? AND event_datetime BETWEEN ? AND ?",
+                       (user_id, now, upcoming_end))
+        countdowns_upcoming = cursor.fetchall()
     
     summary_lines = ["Summary for Today:"]
     if tasks:
         summary_lines.append("Tasks due today:")
         for row in tasks:
-            summary_lines.append(f"- {row[0]} at {row[1].strftime('%H:%M')}")
+            summary_lines.append(f"- {row[0]} at {_format_time(row[1])}")
     if reminders:
         summary_lines.append("Reminders due today:")
         for row in reminders:
-            summary_lines.append(f"- {row[0]} at {row[1].strftime('%H:%M')}")
+            summary_lines.append(f"- {row[0]} at {_format_time(row[1])}")
     if countdowns:
         summary_lines.append("Countdown events today:")
         for row in countdowns:
-            summary_lines.append(f"- {row[0]} at {row[1].strftime('%H:%M')}")
+            summary_lines.append(f"- {row[0]} at {_format_time(row[1])}")
     
     summary_lines.append("\nUpcoming in next 30 minutes:")
     if tasks_upcoming:
         summary_lines.append("Tasks:")
         for row in tasks_upcoming:
-            summary_lines.append(f"- {row[0]} at {row[1].strftime('%H:%M')}")
+            summary_lines.append(f"- {row[0]} at {_format_time(row[1])}")
     if reminders_upcoming:
         summary_lines.append("Reminders:")
         for row in reminders_upcoming:
-            summary_lines.append(f"- {row[0]} at {row[1].strftime('%H:%M')}")
+            summary_lines.append(f"- {row[0]} at {_format_time(row[1])}")
     if countdowns_upcoming:
         summary_lines.append("Countdowns:")
         for row in countdowns_upcoming:
-            summary_lines.append(f"- {row[0]} at {row[1].strftime('%H:%M')}")
+            summary_lines.append(f"- {row[0]} at {_format_time(row[1])}")
     
     if len(summary_lines) == 1:
         summary_lines.append("No items due today or upcoming in the next 30 minutes.")
@@ -319,13 +501,179 @@ def send_due_and_upcoming_summary(bot, user_id, chat_id, user_tz):
     bot.send_message(chat_id, summary_message)
 
 
-def schedule_due_and_upcoming_summary(bot, user_id, chat_id, user_tz):
+def _due_upcoming_job_spec():
     """
-    Schedules a job that every 30 minutes sends a summary of items due and upcoming.
+    Returns the spec of the single job that every 30 minutes sends each
+    onboarded user with something due a summary of items due and upcoming.
     """
     # The interval trigger is independent of timezone.
-    trigger = IntervalTrigger(minutes=30, timezone=pytz.utc)
-    job_id = f"due_upcoming_summary_{user_id}"
-    scheduler.add_job(func=send_due_and_upcoming_summary, trigger=trigger, id=job_id,
-                      args=[bot, user_id, chat_id, user_tz])
-    print(f"Scheduled due/upcoming summary for user {user_id} every 30 minutes")
+    trigger = partial(IntervalTrigger, minutes=30, timezone=pytz.utc)
+    return "due_upcoming_summary", dispatch_due_and_upcoming_summaries, trigger, []
+
+
+def schedule_due_and_upcoming_summary():
+    """Ensures the due/upcoming digest job exists."""
+    _ensure_spec(_due_upcoming_job_spec())
+
+
+# Users with something due, one keyset page of a timezone at a time.
+DUE_USERS_QUERY = """
+    SELECT u.user_id FROM users u
+    WHERE u.onboarded = 1 AND u.timezone = :tz AND u.user_id > :after
+      AND (EXISTS (SELECT 1 FROM tasks t WHERE t.user_id = u.user_id
+                   AND t.due_date BETWEEN :start AND :end)
+           OR EXISTS (SELECT 1 FROM reminders r WHERE r.user_id = u.user_id
+                      AND r.next_trigger_time BETWEEN :start AND :end)
+           OR EXISTS (SELECT 1 FROM countdowns c WHERE c.user_id = u.user_id
+                      AND c.event_datetime BETWEEN :start AND :end))
+    ORDER BY u.user_id
+    LIMIT :limit
+"""
+
+
+@timed_job('due_upcoming_summary')
+def dispatch_due_and_upcoming_summaries(batch_size=DUE_SUMMARY_BATCH_SIZE):
+    """
+    Sends the due/upcoming digest, in their own timezone, to every onboarded
+    user with a task, reminder or countdown between the start of their today
+    and the end of the 30-minute look-ahead. Users are paged per timezone in
+    keyset batches over the (onboarded, timezone, user_id) index, so the job
+    only reads the users it sends to.
+    """
+    with db_connection() as conn:
+        timezones = [row[0] for row in conn.execute(
+            "SELECT DISTINCT timezone FROM users WHERE onboarded = 1")]
+    for user_tz in timezones:
+        now, today_start, today_end = _today_window(user_tz)
+        params = {'tz': user_tz, 'after': 0, 'start': today_start,
+                  'end': max(today_end, now + timedelta(minutes=30)), 'limit': batch_size}
+        while True:
+            with db_connection() as conn:
+                user_ids = [row[0] for row in conn.execute(DUE_USERS_QUERY, params)]
+            for user_id in user_ids:
+                _safe_send(send_due_and_upcoming_summary, BOT, user_id, user_id, user_tz)
+            if len(user_ids) < batch_size:
+                break
+            params['after'] = user_ids[-1]
+
+
+# -------------------------------
+# Reminders
+# -------------------------------
+def _reminder_poll_job_spec():
+    """Returns the spec of the job that polls the reminders table for due reminders."""
+    trigger = partial(IntervalTrigger, seconds=REMINDER_POLL_SECONDS, timezone=pytz.utc)
+    return "reminder_poll", dispatch_due_reminders, trigger, []
+
+
+@timed_job('reminder_poll')
+def dispatch_due_reminders():
+    """Sends every due reminder; recurring ones are advanced by the reminders module."""
+    queued = process_due_reminders(TIMELY_BOT)
+    if queued:
+        print(f"Queued {queued} due reminders")
+
+
+# -------------------------------
+# Countdown Alerts
+# -------------------------------
+def _countdown_alert_poll_job_spec():
+    """Returns the spec of the job that sends due daily/weekly countdown alerts."""
+    trigger = partial(IntervalTrigger, seconds=COUNTDOWN_ALERT_POLL_SECONDS, timezone=pytz.utc)
+    return "countdown_alert_poll", dispatch_countdown_alerts, trigger, []
+
+
+@timed_job('countdown_alert_poll')
+def dispatch_countdown_alerts():
+    """Sends every due countdown alert and retires countdowns whose event has passed."""
+    queued = process_due_countdown_alerts(BOT)
+    if queued:
+        print(f"Queued {queued} countdown alerts")
+
+
+# -------------------------------
+# Goal Check-Ins
+# -------------------------------
+def _goal_checkin_poll_job_spec():
+    """Returns the spec of the job that sends check-in prompts for due goals."""
+    trigger = partial(IntervalTrigger, seconds=GOAL_CHECKIN_POLL_SECONDS, timezone=pytz.utc)
+    return "goal_checkin_poll", dispatch_goal_checkins, trigger, []
+
+
+@timed_job('goal_checkin_poll')
+def dispatch_goal_checkins():
+    """Sends a check-in prompt for every in-progress goal whose next_check_date has passed."""
+    queued = process_due_goal_checkins(BOT)
+    if queued:
+        print(f"Queued {queued} goal check-ins")
+
+
+def schedule_user_jobs(user_id):
+    """
+    Ensures every bucket the user belongs to exists and plans their random
+    check-ins for the rest of today. Called once onboarding completes.
+    """
+    user = get_user_profile(user_id)
+    if user is None:
+        return
+    user_tz = user.timezone or "UTC"
+    if user.summary_schedule in ("daily", "custom"):
+        schedule_summary(user.summary_schedule, user.summary_time, user_tz)
+    if user.random_checkin_max and int(user.random_checkin_max) > 0:
+        schedule_random_checkins(user_id, int(user.random_checkin_max), user_tz, user.language)
+    schedule_due_and_upcoming_summary()
+    schedule_nightly_tomorrow_summary(user_tz)
+
+
+# -------------------------------
+# Startup rehydration
+# -------------------------------
+def bucket_job_specs():
+    """
+    Returns (job_specs, timezones) for every bucket implied by the users
+    table. Each query returns one row per distinct slot.
+    """
+    with db_connection() as conn:
+        timezones = [row[0] for row in conn.execute(
+            "SELECT DISTINCT timezone FROM users WHERE onboarded = 1")]
+        summary_slots = conn.execute("""
+            SELECT DISTINCT summary_schedule, summary_time, timezone FROM users
+            WHERE onboarded = 1 AND summary_schedule IN ('daily', 'custom')
+        """).fetchall()
+    specs = [_due_upcoming_job_spec(), _reminder_poll_job_spec(), _weekly_event_poll_job_spec(),
+             _countdown_alert_poll_job_spec(), _goal_checkin_poll_job_spec()]
+    for summary_schedule, summary_time, user_tz in summary_slots:
+        specs.append(_summary_job_spec(summary_schedule, summary_time, user_tz))
+    for user_tz in timezones:
+        specs.append(_nightly_job_spec(user_tz))
+        specs.append(_checkin_plan_job_spec(user_tz))
+    # custom summaries from different timezones share one bucket
+    unique = {}
+    for spec in specs:
+        if spec:
+            unique.setdefault(spec[0], spec)
+    return list(unique.values()), timezones
+
+
+def rehydrate_jobs():
+    """
+    Rebuilds the persistent schedule at startup. Only bucket jobs missing from
+    the store are built (triggers are the expensive part) and they are written
+    with one executemany; jobs already stored keep their pending next_run_time,
+    and stored jobs whose slot no longer has any user are removed. Today's random check-ins are then planned again, since
+    those plans only live in memory. Returns the number of new jobs.
+    """
+    started = time.perf_counter()
+    specs, timezones = bucket_job_specs()
+    now = datetime.now(pytz.utc)
+    with _ensure_lock:
+        stored_ids = job_store.get_job_ids()
+        inserted = job_store.add_jobs(_build_job(*spec, now) for spec in specs if spec[0] not in stored_ids)
+        removed = job_store.remove_stale_jobs({spec[0] for spec in specs})
+    for user_tz in timezones:
+        plan_random_checkins(user_tz)
+    scheduler.wakeup()
+    elapsed = time.perf_counter() - started
+    print(f"Rehydrated {len(specs)} bucket jobs for {len(timezones)} timezones "
+          f"({inserted} new, {removed} stale removed) in {elapsed:.3f}s")
+    return inserted
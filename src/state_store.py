@@ -0,0 +1,373 @@
+"""
+state_store.py
+
+Bounded store for in-progress conversation flows (onboarding, add task, add
+goal, ...), replacing the per-module state dicts.
+
+Each StateStore is a namespace (e.g. 'tasks') mapping user_id -> FlowState.
+It keeps the dict-style API the modules already use:
+
+    tasks_states[user_id] = {'state': 'awaiting_title', 'data': {}}
+    if user_id in tasks_states: ...
+    tasks_states[user_id]['state'] = 'awaiting_due_date'
+    tasks_states[user_id]['data']['title'] = text
+    tasks_states.pop(user_id, None)
+
+but only holds flows that are actually in progress:
+  - FlowState uses __slots__ (state name, data dict, last update time);
+  - flows idle for longer than FLOW_STATE_TTL are dropped, and each store keeps
+    at most FLOW_STATE_MAX_FLOWS flows (least recently updated evicted first);
+  - once attach_state_stores() has run (after init_db()), every change is
+    written through to the flow_states table and in-progress flows are loaded
+    back on startup, so they survive restarts. Set FLOW_STATE_BACKEND=memory
+    to keep flows in memory only. Row writes go through the write-behind
+    queue (database.queue_write), outside the store's lock, and several
+    changes to one user's flow before the next commit are written once.
+
+active_flow(user_id) returns the flow the user most recently started across
+all stores, so an incoming text message needs only one lookup to find its
+handler (see router.py).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+
+from database import db_connection, queue_write
+
+load_dotenv()
+
+FLOW_STATE_TTL = int(os.getenv('FLOW_STATE_TTL', str(24 * 60 * 60)))
+FLOW_STATE_MAX_FLOWS = int(os.getenv('FLOW_STATE_MAX_FLOWS', '100000'))
+FLOW_STATE_BACKEND = os.getenv('FLOW_STATE_BACKEND', 'sqlite')
+
+# Expired flows are swept at most this often (seconds).
+SWEEP_INTERVAL = 60
+
+_stores = {}   # { namespace: StateStore }
+_active = {}   # { user_id: StateStore holding the user's most recently started flow }
+
+
+# -------------------------------
+# Serialization of flow data
+# -------------------------------
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in flow state")
+
+
+def _decode(obj):
+    if '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    if '$date' in obj:
+        return date.fromisoformat(obj['$date'])
+    return obj
+
+
+class FlowData(dict):
+    """A flow's data dict; every change is reported to the owning FlowState."""
+    __slots__ = ('_flow',)
+
+    def __init__(self, flow, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._flow = flow
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._flow.touch()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._flow.touch()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._flow.touch()
+        return value
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._flow.touch()
+
+    def clear(self):
+        super().clear()
+        self._flow.touch()
+
+
+class FlowState:
+    """
+    One user's in-progress flow. Supports item access for the keys the modules
+    use ('state' and 'data'), so existing handler code works unchanged.
+    """
+    __slots__ = ('state', 'data', 'updated_at', '_store', '_user_id')
+
+    def __init__(self, store, user_id, state, data=None, updated_at=None):
+        self._store = store
+        self._user_id = user_id
+        self.state = state
+        self.data = FlowData(self, data or {})
+        self.updated_at = updated_at or time.time()
+
+    def touch(self):
+        """Records a change: refreshes the TTL and writes the flow through."""
+        self.updated_at = time.time()
+        self._store._changed(self._user_id, self)
+
+    def __getitem__(self, key):
+        if key == 'state':
+            return self.state
+        if key == 'data':
+            return self.data
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'state':
+            self.state = value
+        elif key == 'data':
+            self.data = FlowData(self, value)
+        else:
+            raise KeyError(key)
+        self.touch()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"FlowState({self.state!r}, {dict(self.data)!r})"
+
+
+class StateStore:
+    """Per-namespace map of user_id -> FlowState with TTL, capacity and SQLite write-through."""
+
+    def __init__(self, namespace, ttl=FLOW_STATE_TTL, max_flows=FLOW_STATE_MAX_FLOWS):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_flows = max_flows
+        self._flows = OrderedDict()   # least recently updated first
+        self._lock = threading.RLock()
+        self._persistent = False
+        # Rows to write on the next flush: { user_id: (state, data, updated_at), or None to delete }.
+        self._dirty = {}
+        self._flush_queued = False
+        self._last_sweep = time.time()
+        _stores[namespace] = self
+
+    # -------------------------------
+    # Dict-style API
+    # -------------------------------
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id):
+        flow = self.get(user_id)
+        if flow is None:
+            raise KeyError(user_id)
+        return flow
+
+    def get(self, user_id, default=None):
+        with self._lock:
+            flow = self._flows.get(user_id)
+            if flow is None:
+                return default
+            if not self._expired(flow, time.time()):
+                return flow
+            self._remove(user_id)
+        self._queue_flush()
+        return default
+
+    def __setitem__(self, user_id, value):
+        self.start(user_id, value['state'], value.get('data'))
+
+    def start(self, user_id, state, data=None):
+        """Starts (or restarts) the user's flow in `state` and returns it."""
+        flow = FlowState(self, user_id, state, data)
+        self._changed(user_id, flow, new=True)
+        _active[user_id] = self
+        return flow
+
+    def pop(self, user_id, default=None):
+        with self._lock:
+            flow = self._flows.get(user_id)
+            if flow is None:
+                return default
+            self._remove(user_id)
+        self._queue_flush()
+        return flow
+
+    def __len__(self):
+        return len(self._flows)
+
+    # -------------------------------
+    # Internals
+    # -------------------------------
+    def _expired(self, flow, now):
+        return self.ttl and now - flow.updated_at > self.ttl
+
+    def _changed(self, user_id, flow, new=False):
+        with self._lock:
+            if not new and self._flows.get(user_id) is not flow:
+                return   # the flow was finished, evicted or replaced meanwhile
+            self._flows[user_id] = flow
+            self._flows.move_to_end(user_id)
+            while len(self._flows) > self.max_flows:
+                evicted, _ = self._flows.popitem(last=False)
+                self._delete_row(evicted)
+                if _active.get(evicted) is self:
+                    _reindex(evicted)
+            if self._persistent:
+                # Serialized now, while the data matches this change; written by the next flush.
+                self._dirty[user_id] = (flow.state, json.dumps(flow.data, default=_encode), flow.updated_at)
+            sweep = flow.updated_at - self._last_sweep > SWEEP_INTERVAL
+        self._queue_flush()
+        if sweep:
+            self.sweep(flow.updated_at)
+
+    def _remove(self, user_id):
+        self._flows.pop(user_id, None)
+        self._delete_row(user_id)
+        if _active.get(user_id) is self:
+            _reindex(user_id)
+
+    def _delete_row(self, user_id):
+        if self._persistent:
+            self._dirty[user_id] = None
+
+    def _queue_flush(self):
+        """Queues one write of every dirty row, unless one is already queued. Call without _lock."""
+        with self._lock:
+            if self._flush_queued or not self._dirty:
+                return
+            self._flush_queued = True
+        queue_write(self._flush)
+
+    def _flush(self, conn):
+        """Writes the dirty rows (run by the write-behind queue); returns how many."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._flush_queued = False
+        upserts = [(self.namespace, user_id) + row for user_id, row in dirty.items() if row is not None]
+        deletes = [(self.namespace, user_id) for user_id, row in dirty.items() if row is None]
+        if upserts:
+            conn.executemany("""
+                INSERT OR REPLACE INTO flow_states (namespace, user_id, state, data, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, upserts)
+        if deletes:
+            conn.executemany("DELETE FROM flow_states WHERE namespace = ? AND user_id = ?", deletes)
+        return len(dirty)
+
+    def sweep(self, now=None):
+        """Drops every flow idle for longer than the TTL. Returns the number dropped."""
+        now = now or time.time()
+        dropped = 0
+        with self._lock:
+            self._last_sweep = now
+            if not self.ttl:
+                return 0
+            # Flows are ordered by last update, so expired ones are at the front.
+            while self._flows:
+                user_id, flow = next(iter(self._flows.items()))
+                if not self._expired(flow, now):
+                    break
+                self._flows.popitem(last=False)
+                if _active.get(user_id) is self:
+                    _reindex(user_id)
+                dropped += 1
+            persistent = self._persistent
+        if persistent:
+            queue_write("DELETE FROM flow_states WHERE namespace = ? AND updated_at < ?",
+                        (self.namespace, now - self.ttl))
+        return dropped
+
+    def attach(self):
+        """Loads this namespace's unexpired flows from SQLite and enables write-through."""
+        cutoff = time.time() - self.ttl if self.ttl else 0
+        with db_connection() as conn:
+            rows = conn.execute("""
+                SELECT user_id, state, data, updated_at FROM flow_states
+                WHERE namespace = ? AND updated_at >= ?
+                ORDER BY updated_at
+            """, (self.namespace, cutoff)).fetchall()
+        with self._lock:
+            for row in rows[-self.max_flows:]:
+                flow = FlowState(self, row["user_id"], row["state"],
+                                 json.loads(row["data"], object_hook=_decode), row["updated_at"])
+                self._flows[row["user_id"]] = flow
+                self._flows.move_to_end(row["user_id"])
+                current = _active.get(row["user_id"])
+                current_flow = current._flows.get(row["user_id"]) if current else None
+                if current_flow is None or current_flow.updated_at <= flow.updated_at:
+                    _active[row["user_id"]] = self
+            self._persistent = True
+        return len(rows)
+
+
+def _reindex(user_id):
+    """Points the active-flow index at the user's most recently updated remaining flow, if any."""
+    latest = None
+    now = time.time()
+    for store in _stores.values():
+        # Read without the store's lock: this may run under another store's lock.
+        flow = store._flows.get(user_id)
+        if flow is None or store._expired(flow, now):
+            continue
+        if latest is None or flow.updated_at > latest[0]:
+            latest = (flow.updated_at, store)
+    if latest is None:
+        _active.pop(user_id, None)
+    else:
+        _active[user_id] = latest[1]
+    return latest[1] if latest else None
+
+
+def active_flow(user_id):
+    """
+    Returns (namespace, FlowState) for the flow the user most recently started
+    in any store, or (None, None). A single index lookup in the common case;
+    used by the router to send a text message to exactly one flow handler.
+    """
+    store = _active.get(user_id)
+    if store is None:
+        return None, None
+    flow = store.get(user_id)
+    if flow is None:
+        # Expired or evicted since it was indexed; fall back to any other flow.
+        store = _reindex(user_id)
+        if store is None:
+            return None, None
+        flow = store.get(user_id)
+    return store.namespace, flow
+
+
+def attach_state_stores():
+    """
+    Restores in-progress flows for every store and turns on SQLite write-through.
+    Call after init_db() has created the flow_states table.
+    """
+    if FLOW_STATE_BACKEND != 'sqlite':
+        return 0
+    restored = sum(store.attach() for store in _stores.values())
+    print(f"Restored {restored} in-progress flows")
+    return restored
+
+
+def state_store_stats():
+    """Returns {namespace: number of in-progress flows}."""
+    return {namespace: len(store) for namespace, store in _stores.items()}
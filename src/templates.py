@@ -0,0 +1,165 @@
+"""
+templates.py
+
+Precompiled localized templates and cached keyboard markups.
+
+Templates: the string tables (messages.MESSAGES, menu.MENU_LABELS,
+summaries.SUMMARY_LABELS, random_checkins.CHECKIN_LABELS) are parsed once by
+load_templates(), which bot.py calls at startup. Every string must parse as a
+format string, and every language must define the same keys with the same
+placeholders as English; anything else fails startup with one ValueError
+listing every problem. Strings without placeholders are stored already
+unescaped, so render() returns them without calling str.format at all.
+
+Keyboards: static inline keyboards (main menu, reminder/countdown/goal
+prompts, time zone choices, ...) are registered with @keyboard(name) by the
+module that owns them. keyboard_markup(name, lang) builds each
+(keyboard, lang) pair once and returns the serialized reply_markup JSON,
+which TeleBot passes to the Bot API as-is instead of re-serializing a fresh
+InlineKeyboardMarkup on every send. Keyboards whose buttons depend on the
+user's data (Manage Items pages, goal check-ins) are built per message.
+"""
+
+import threading
+from collections import namedtuple
+from string import Formatter
+
+from messages import MESSAGES
+
+DEFAULT_LANGUAGE = 'en'
+
+# text: the string to format (unescaped literal text when there are no placeholders)
+# fields: placeholder names ('0', '1', ... for positional ones)
+Template = namedtuple('Template', 'text fields')
+
+_compiled = {}          # { catalog: { lang: { key: Template } } }
+_keyboards = {}         # { name: builder(lang) -> InlineKeyboardMarkup }
+_markup_cache = {}      # { (name, lang): reply_markup JSON }
+_lock = threading.Lock()
+
+def _catalog_sources():
+    """The string tables covered by the template layer (imported lazily: their modules use this one)."""
+    from modules.menu import MENU_LABELS
+    from modules.summaries import SUMMARY_LABELS
+    from modules.random_checkins import CHECKIN_LABELS
+    return {
+        'messages': MESSAGES,
+        'menu': MENU_LABELS,
+        'summary': SUMMARY_LABELS,
+        'checkin': CHECKIN_LABELS,
+    }
+
+def compile_template(source):
+    """
+    Parses one format string into a Template.
+    Raises ValueError for malformed strings (e.g. an unmatched brace).
+    """
+    literal, fields, auto = [], set(), 0
+    for text, field_name, _, _ in Formatter().parse(source):
+        literal.append(text)
+        if field_name is None:
+            continue
+        name = field_name.split('.', 1)[0].split('[', 1)[0]
+        if name == '':
+            name, auto = str(auto), auto + 1
+        fields.add(name)
+    if not fields:
+        return Template(''.join(literal), frozenset())
+    return Template(source, frozenset(fields))
+
+def _compile_catalog(catalog, table, problems):
+    compiled = {}
+    for lang, strings in table.items():
+        compiled[lang] = {}
+        for key, source in strings.items():
+            try:
+                compiled[lang][key] = compile_template(source)
+            except ValueError as e:
+                problems.append(f"{catalog}[{lang}][{key}]: {e}")
+
+    reference = compiled.get(DEFAULT_LANGUAGE, {})
+    for lang, templates in compiled.items():
+        if lang == DEFAULT_LANGUAGE:
+            continue
+        for key in reference.keys() - templates.keys():
+            problems.append(f"{catalog}[{lang}]: missing key '{key}'")
+        for key in templates.keys() - reference.keys():
+            problems.append(f"{catalog}[{lang}]: key '{key}' is not defined for '{DEFAULT_LANGUAGE}'")
+        for key in templates.keys() & reference.keys():
+            if templates[key].fields != reference[key].fields:
+                problems.append(
+                    f"{catalog}[{lang}][{key}]: placeholders {sorted(templates[key].fields)} "
+                    f"!= {sorted(reference[key].fields)} in '{DEFAULT_LANGUAGE}'")
+    return compiled
+
+def load_templates():
+    """
+    Compiles and validates every catalog, then builds every registered keyboard
+    for every language (so a keyboard naming a missing label fails here too).
+    Raises ValueError listing all problems found.
+    """
+    problems = []
+    compiled = {catalog: _compile_catalog(catalog, table, problems)
+                for catalog, table in _catalog_sources().items()}
+    if problems:
+        raise ValueError("Invalid message templates:\n  " + "\n  ".join(problems))
+    with _lock:
+        _compiled.clear()
+        _compiled.update(compiled)
+        _markup_cache.clear()
+    for name in list(_keyboards):
+        for lang in MESSAGES:
+            keyboard_markup(name, lang)
+    print(f"Loaded {sum(len(t) for c in compiled.values() for t in c.values())} templates, "
+          f"{len(_markup_cache)} cached keyboards.")
+
+def _template(catalog, lang, key):
+    if not _compiled:
+        load_templates()
+    strings = _compiled[catalog]
+    return strings.get(lang, strings[DEFAULT_LANGUAGE])[key]
+
+def render(lang, key, *args, catalog='messages', **kwargs):
+    """
+    Returns the localized string `key`, formatted with the given arguments.
+    Unknown languages fall back to English.
+    """
+    template = _template(catalog, lang, key)
+    if not template.fields:
+        return template.text
+    return template.text.format(*args, **kwargs)
+
+def label(lang, key, default=None, catalog='messages'):
+    """Returns a placeholder-free string, or `default` when the catalog has no such key."""
+    try:
+        return _template(catalog, lang, key).text
+    except KeyError:
+        return default
+
+# -------------------------------
+# Cached Keyboard Markups
+# -------------------------------
+def keyboard(name):
+    """Registers builder(lang) -> InlineKeyboardMarkup as the static keyboard `name`."""
+    def register(builder):
+        _keyboards[name] = builder
+        return builder
+    return register
+
+def keyboard_markup(name, lang=DEFAULT_LANGUAGE):
+    """
+    Returns the serialized reply_markup of keyboard `name` in `lang`,
+    building and caching it on first use.
+    """
+    if lang not in MESSAGES:
+        lang = DEFAULT_LANGUAGE
+    markup = _markup_cache.get((name, lang))
+    if markup is None:
+        markup = _keyboards[name](lang).to_json()
+        with _lock:
+            _markup_cache[(name, lang)] = markup
+    return markup
+
+def markup_cache_stats():
+    """Counters for monitoring: registered keyboards and cached (keyboard, lang) pairs."""
+    return {'keyboards': len(_keyboards), 'cached': len(_markup_cache)}
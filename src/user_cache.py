@@ -0,0 +1,188 @@
+"""
+user_cache.py
+
+Write-through, bounded LRU cache of user profiles (language, timezone, summary
+settings and the pytz timezone object), shared by bot.py and every module.
+
+Reads go through get_user_profile()/get_user_language(), so a button press
+costs at most one users-table lookup. Every change to a user's settings goes
+through update_user(), which writes the row and refreshes the cached profile
+once the write has committed; create_user() and invalidate_user() cover the
+remaining paths. Cache misses read the row without holding the cache lock.
+"""
+
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+import pytz
+from dotenv import load_dotenv
+
+from database import db_connection, queue_write
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+
+# Columns that update_user() may change (and that the cache keeps).
+PROFILE_FIELDS = ('language', 'timezone', 'summary_schedule', 'summary_time', 'random_checkin_max', 'onboarded')
+
+UserProfile = namedtuple('UserProfile', ('user_id',) + PROFILE_FIELDS + ('tz',))
+
+_PROFILE_QUERY = f"SELECT user_id, {', '.join(PROFILE_FIELDS)} FROM users WHERE user_id = ?"
+
+_cache = OrderedDict()   # { user_id: UserProfile }, least recently used first
+# Loads in progress: { user_id: token }. update_user() and invalidate_user()
+# drop the user's token, so a load that read the row before the change does
+# not cache it.
+_loads = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _timezone(name):
+    try:
+        return pytz.timezone(name or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
+
+def _profile_from_row(row):
+    return UserProfile(*row, tz=_timezone(row["timezone"]))
+
+
+def _store(profile):
+    """Caches a profile, evicting the least recently used ones. Call under _lock."""
+    _cache[profile.user_id] = profile
+    _cache.move_to_end(profile.user_id)
+    while len(_cache) > USER_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def get_user_profile(user_id):
+    """
+    Returns the user's UserProfile, loading it on a cache miss.
+    Returns None for unknown users (which are not cached).
+    """
+    with _lock:
+        profile = _cache.get(user_id)
+        if profile is not None:
+            _cache.move_to_end(user_id)
+            _stats['hits'] += 1
+            return profile
+        _stats['misses'] += 1
+    while True:
+        token = object()
+        with _lock:
+            _loads[user_id] = token
+        # Read without the lock, so a cold read does not stall lookups on other lanes.
+        with db_connection() as conn:
+            row = conn.execute(_PROFILE_QUERY, (user_id,)).fetchone()
+        with _lock:
+            current = _loads.get(user_id) is token
+            if current:
+                del _loads[user_id]
+            if row is None:
+                return None
+            profile = _profile_from_row(row)
+            if current:
+                _store(profile)
+                return profile
+            cached = _cache.get(user_id)
+            if cached is not None:
+                return cached
+        # The user changed while the row was read; read it again.
+
+
+def get_user_language(user_id):
+    """Returns the user's language code, 'en' for unknown users."""
+    profile = get_user_profile(user_id)
+    return profile.language if profile else 'en'
+
+
+def get_user_timezone(user_id):
+    """Returns the user's pytz timezone, UTC for unknown users."""
+    profile = get_user_profile(user_id)
+    return profile.tz if profile else pytz.utc
+
+
+def _apply_update(user_id, fields, applied, write):
+    """
+    Done-callback of update_user()'s write: on commit, updates the cached
+    profile (if cached); on failure, drops it so the next read reloads the row.
+    """
+    try:
+        with _lock:
+            _loads.pop(user_id, None)
+            profile = _cache.get(user_id)
+            if profile is None:
+                return
+            if write.exception() is not None:
+                del _cache[user_id]
+                return
+            if 'timezone' in fields:
+                fields = dict(fields, tz=_timezone(fields['timezone']))
+            _cache[user_id] = profile._replace(**fields)
+    finally:
+        applied.set()
+
+
+def update_user(user_id, **fields):
+    """
+    Writes the given profile fields to the users table. The UPDATE is
+    group-committed (see database.queue_write) and the cached profile is only
+    changed once it has committed (dropped if it failed). Waits for that, so
+    the caller's next read sees its own write; raises the write's error.
+    Returns the write's Future.
+    """
+    unknown = set(fields) - set(PROFILE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown user profile field(s): {', '.join(sorted(unknown))}")
+    if not fields:
+        return
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    write = queue_write(f"UPDATE users SET {assignments} WHERE user_id = ?", tuple(fields.values()) + (user_id,))
+    applied = threading.Event()
+    write.add_done_callback(partial(_apply_update, user_id, fields, applied))
+    # The writer thread runs the callback after waking waiters, so wait for the callback itself.
+    applied.wait()
+    write.result()
+    return write
+
+
+def create_user(user_id, language='en', timezone='UTC', summary_schedule='disabled', summary_time=None,
+                random_checkin_max=0):
+    """
+    Inserts the users row if it does not exist yet. Returns True when a new
+    row was created.
+    """
+    with db_connection() as conn:
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO users (user_id, language, timezone, summary_schedule, summary_time, random_checkin_max)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, language, timezone, summary_schedule, summary_time, random_checkin_max))
+        created = cursor.rowcount == 1
+    if created:
+        invalidate_user(user_id)
+    return created
+
+
+def invalidate_user(user_id):
+    """Drops the user's cached profile; the next read reloads it."""
+    with _lock:
+        _cache.pop(user_id, None)
+        _loads.pop(user_id, None)
+
+
+def clear_user_cache():
+    """Drops every cached profile."""
+    with _lock:
+        _cache.clear()
+        _loads.clear()
+
+
+def user_cache_stats():
+    """Returns {'hits', 'misses', 'size', 'capacity'}."""
+    with _lock:
+        return dict(_stats, size=len(_cache), capacity=USER_CACHE_SIZE)
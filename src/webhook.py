@@ -0,0 +1,222 @@
+"""
+webhook.py
+
+Webhook ingress, an alternative to bot.infinity_polling() (BOT_MODE=webhook).
+
+A ThreadingHTTPServer accepts Telegram's update POSTs on WEBHOOK_PATH:
+  - the X-Telegram-Bot-Api-Secret-Token header must match WEBHOOK_SECRET
+    (403 otherwise);
+  - the body must be a JSON object (400 otherwise); it is put on a bounded
+    queue and the request is answered with 200 right away, so Telegram's
+    delivery is never held up by handlers;
+  - when the queue is full the server answers 503 and Telegram redelivers later.
+
+WEBHOOK_WORKERS threads take updates off the queue, decode them and pass them
+to bot.process_new_updates(), which hands each one to its user's update lane
+(see lanes.py) where the handlers run.
+
+If WEBHOOK_URL is set, start_webhook() registers WEBHOOK_URL + WEBHOOK_PATH
+with Telegram (setWebhook) along with the secret; leave it unset when the
+webhook is registered some other way.
+"""
+
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+from telebot import types
+
+from metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '8'))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '10000'))
+# Upper bound on connections Telegram opens to the webhook (setWebhook max_connections).
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def parse_update(body):
+    """Decodes a webhook body into an update dict; raises ValueError for anything else."""
+    update = json.loads(body)
+    if not isinstance(update, dict):
+        raise ValueError("update must be a JSON object")
+    return update
+
+
+def warn_if_unauthenticated(secret=WEBHOOK_SECRET):
+    """Logs a warning when the webhook accepts updates without a secret token."""
+    if not secret:
+        logger.warning("WEBHOOK_SECRET is not set: anyone who can reach the webhook port can post updates")
+
+
+class _IngressHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 makes bursts of connections wait on SYN retries.
+    request_queue_size = 256
+
+
+class WebhookServer:
+    """HTTP ingress for Telegram updates plus the worker pool that processes them."""
+
+    def __init__(self, bot, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret=WEBHOOK_SECRET, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.updates = queue.Queue(maxsize=queue_size)
+        self.server = _IngressHTTPServer((host, port), self._handler_class())
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = {'received': 0, 'processed': 0, 'failed': 0, 'rejected': 0, 'dropped': 0}
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def start(self):
+        """Starts the worker pool and serves HTTP on a background thread."""
+        self._start_workers()
+        thread = threading.Thread(target=self.server.serve_forever, name="webhook-http", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def serve_forever(self):
+        """Starts the worker pool and serves HTTP on the calling thread."""
+        self._start_workers()
+        self.server.serve_forever()
+
+    def stop(self, timeout=10.0):
+        """Stops accepting updates, waits up to `timeout` seconds for the queue to drain, stops the workers."""
+        self.server.shutdown()
+        self.server.server_close()
+        deadline = time.monotonic() + timeout
+        while self.updates.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for _ in range(self.workers):
+            self.updates.put(None)
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def stats(self):
+        """Returns request/processing counters and the current queue depth."""
+        with self._lock:
+            return dict(self._counters, queued=self.updates.qsize())
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # -------------------------------
+    # Ingress
+    # -------------------------------
+    def _accept(self, headers, body):
+        """Validates and queues one POST; returns the HTTP status to answer with."""
+        if self.secret and not hmac.compare_digest(headers.get(SECRET_HEADER, ''), self.secret):
+            self._count('rejected')
+            return 403
+        try:
+            update = parse_update(body)
+        except ValueError:
+            self._count('rejected')
+            return 400
+        try:
+            self.updates.put_nowait(update)
+        except queue.Full:
+            self._count('dropped')
+            return 503
+        self._count('received')
+        return 200
+
+    def _handler_class(self):
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split('?', 1)[0] != webhook.path:
+                    self._reply(404)
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_BODY_BYTES:
+                    self._reply(413)
+                    return
+                self._reply(webhook._accept(self.headers, self.rfile.read(length)))
+
+            def do_GET(self):
+                self._reply(405)
+
+            def _reply(self, status):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    # -------------------------------
+    # Worker side
+    # -------------------------------
+    def _start_workers(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            update = self.updates.get()
+            try:
+                if update is None:
+                    return
+                self.bot.process_new_updates([types.Update.de_json(update)])
+                self._count('processed')
+            except Exception as e:
+                self._count('failed')
+                update_id = update.get('update_id') if isinstance(update, dict) else None
+                logger.error(f"Failed to process update {update_id}: {e}")
+            finally:
+                self.updates.task_done()
+
+
+def start_webhook(bot, **kwargs):
+    """
+    Registers the webhook with Telegram (when WEBHOOK_URL is set) and serves
+    updates on the calling thread until interrupted.
+    """
+    server = WebhookServer(bot, **kwargs)
+    register_stats('webhook', server.stats)
+    warn_if_unauthenticated(server.secret)
+    if WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=WEBHOOK_URL.rstrip('/') + server.path, secret_token=WEBHOOK_SECRET or None,
+                        max_connections=WEBHOOK_MAX_CONNECTIONS)
+    print(f"Webhook listening on {server.url} with {server.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return server